@@ -189,6 +189,14 @@ class Beautifier:
 					for path in response[:-1]:
 						msg += "|- " + path + "\n"
 					msg += "`- " + response[-1]
+			elif inC[2] in ("logglob", "addlogglob", "dellogglob"):
+				if len(response) == 0:
+					msg = "No glob is currently monitored"
+				else:
+					msg = "Current monitored log glob(s):\n"
+					for path in response[:-1]:
+						msg += "|- " + path + "\n"
+					msg += "`- " + response[-1]
 			elif inC[2] == "logencoding":
 				msg = "Current log encoding is set to:\n"
 				msg += response
@@ -253,6 +261,22 @@ class Beautifier:
 					if sep == "--with-time":
 						sep = "\n"
 					msg = sep.join(response)
+			elif inC[2] == "stats" and inC[0] == "get":
+				if len(response) == 0:
+					msg = "No bans found"
+				else:
+					msg = "Statistic %s for %s:\n" % (inC[3],
+						"all jails" if inC[1] == "--all" else "the jail %s" % inC[1])
+					rows = []
+					for r in response:
+						if inC[3] == "jail-overlap":
+							rows.append("%s + %s:\t%s IP(s)" % tuple(r))
+						else:
+							rows.append("%s:\t%s ban(s), %s IP(s)" % tuple(r))
+					msg += "\n".join("|- " + r for r in rows[:-1])
+					if len(rows) > 1:
+						msg += "\n"
+					msg += "`- " + rows[-1]
 		except Exception:
 			logSys.warning("Beautifier error. Please report the error")
 			logSys.error("Beautify %r with %r failed", response, self.__inputCmd,
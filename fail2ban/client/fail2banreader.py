@@ -56,7 +56,9 @@ class Fail2banReader(ConfigReader):
 				["string", "allowipv6", "auto"],
 				["string", "dbfile", "/var/lib/fail2ban/fail2ban.sqlite3"],
 				["int",    "dbmaxmatches", None],
-				["string", "dbpurgeage", "1d"]]
+				["string", "dbpurgeage", "1d"],
+				["int",    "dbcheckpointbytes", None],
+				["string", "dbcheckpointtime", None]]
 		self.__opts = ConfigReader.getOptions(self, "Definition", opts)
 		if updateMainOpt:
 			self.__opts.update(updateMainOpt)
@@ -76,7 +78,8 @@ class Fail2banReader(ConfigReader):
 		# So adding order indices into items, to be stripped after sorting, upon return
 		order = {"thread":0, "syslogsocket":11, "loglevel":12, "logtarget":13,
 			"allowipv6": 14,
-			"dbfile":50, "dbmaxmatches":51, "dbpurgeage":51}
+			"dbfile":50, "dbmaxmatches":51, "dbpurgeage":51,
+			"dbcheckpointbytes":51, "dbcheckpointtime":51}
 		stream = list()
 		for opt in self.__opts:
 			if opt in order:
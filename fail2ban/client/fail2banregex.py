@@ -271,6 +271,8 @@ class Fail2banRegex(object):
 		if opts.timezone:
 			self._filter.setLogTimeZone(opts.timezone)
 		self._filter.checkFindTime = False
+		# time of each line is needed (statistics, output of not matched lines):
+		self._filter.lazyDate = False
 		if True: # not opts.out:
 			MyTime.setAlternateNow(0); # accept every date (years from 19xx up to end of current century, '%ExY' and 'Exy' patterns)
 			from ..server.strptime import _updateTimeRE
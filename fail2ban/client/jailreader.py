@@ -116,6 +116,7 @@ class JailReader(ConfigReader):
 		"logtimezone": ["string", None],
 		"logencoding": ["string", None],
 		"logpath": ["string", None],
+		"globwatch": ["bool", False],
 		"skip_if_nologs": ["bool", False],
 		"systemd_if_nologs": ["bool", True],
 		"action": ["string", ""]
@@ -123,7 +124,7 @@ class JailReader(ConfigReader):
 	_configOpts.update(FilterReader._configOpts)
 
 	_ignoreOpts = set(
-		['action', 'filter', 'enabled', 'backend', 'skip_if_nologs', 'systemd_if_nologs'] +
+		['action', 'filter', 'enabled', 'backend', 'globwatch', 'skip_if_nologs', 'systemd_if_nologs'] +
 		list(FilterReader._configOpts.keys())
 	)
 
@@ -266,9 +267,16 @@ class JailReader(ConfigReader):
 			if opt == "logpath":
 				if backend.startswith("systemd"): continue
 				found_files = 0
+				globwatch = self.__opts.get('globwatch', False)
 				for path in value.split("\n"):
 					path = path.rsplit(" ", 1)
 					path, tail = path if len(path) > 1 else (path[0], "head")
+					# glob is watched by server (new files are discovered at runtime):
+					if globwatch and glob.has_magic(path):
+						found_files += 1
+						stream2.append(
+							["set", self.__name, "addlogglob", path, tail])
+						continue
 					pathList = JailReader._glob(path)
 					if len(pathList) == 0:
 						logSys.notice("No file(s) found for glob %s" % path)
@@ -79,6 +79,10 @@ protocol = [
 ["get dbmaxmatches", "gets the max number of matches stored in database per ticket"], 
 ["set dbpurgeage <SECONDS>", "sets the max age in <SECONDS> that history of bans will be kept"], 
 ["get dbpurgeage", "gets the max age in seconds that history of bans will be kept"], 
+["set dbcheckpointbytes <INT>", "sets the count of bytes a log position should move to be written to database by next checkpoint"], 
+["get dbcheckpointbytes", "gets the count of bytes a log position should move to be written to database by next checkpoint"], 
+["set dbcheckpointtime <SECONDS>", "sets the max time in <SECONDS> a moved log position remains unwritten to database"], 
+["get dbcheckpointtime", "gets the max time in seconds a moved log position remains unwritten to database"], 
 ['', "JAIL CONTROL", ""],
 ["add <JAIL> <BACKEND>", "creates <JAIL> using <BACKEND>"], 
 ["start <JAIL>", "starts the jail <JAIL>"], 
@@ -93,6 +97,8 @@ protocol = [
 ["set <JAIL> ignorecache <VALUE>", "sets ignorecache of <JAIL>"],
 ["set <JAIL> addlogpath <FILE> ['tail']", "adds <FILE> to the monitoring list of <JAIL>, optionally starting at the 'tail' of the file (default 'head')."], 
 ["set <JAIL> dellogpath <FILE>", "removes <FILE> from the monitoring list of <JAIL>"],
+["set <JAIL> addlogglob <GLOB> ['tail']", "adds files matching <GLOB> to the monitoring list of <JAIL> (new matching files are discovered at runtime), optionally starting at the 'tail' of files found initially (default 'head')."],
+["set <JAIL> dellogglob <GLOB>", "removes <GLOB> (and files found by it) from the monitoring list of <JAIL>"],
 ["set <JAIL> logencoding <ENCODING>", "sets the <ENCODING> of the log files for <JAIL>"],
 ["set <JAIL> addjournalmatch <MATCH>", "adds <MATCH> to the journal filter of <JAIL>"],
 ["set <JAIL> deljournalmatch <MATCH>", "removes <MATCH> from the journal filter of <JAIL>"],
@@ -126,6 +132,7 @@ protocol = [
 ["get <JAIL> banned", "return banned IPs of <JAIL>"],
 ["get <JAIL> banned <IP> ... <IP>]", "return 1 if IP is banned in <JAIL> otherwise 0, or a list of 1/0 for multiple IPs"],
 ["get <JAIL> logpath", "gets the list of the monitored files for <JAIL>"],
+["get <JAIL> logglob", "gets the list of the monitored globs for <JAIL>"],
 ["get <JAIL> logencoding", "gets the encoding of the log files for <JAIL>"],
 ["get <JAIL> journalmatch", "gets the journal filter match for <JAIL>"],
 ["get <JAIL> ignoreself", "gets the current value of the ignoring the own IP addresses"],
@@ -138,6 +145,7 @@ protocol = [
 ["get <JAIL> datepattern", "gets the pattern used to match date/times for <JAIL>"],
 ["get <JAIL> usedns", "gets the usedns setting for <JAIL>"],
 ["get <JAIL> banip [<SEP>|--with-time]", "gets the list of of banned IP addresses for <JAIL>. Optionally the separator character ('<SEP>', default is space) or the option '--with-time' (printing the times of ban) may be specified. The IPs are ordered by end of ban."],
+["get <JAIL>|--all stats <STAT> [<ARGS>] [--since <TIME>] [--limit <N>]", "gets aggregated statistic of bans stored in database for <JAIL> (or all jails). <STAT> is 'bans-by-prefix [<BITS4> [<BITS6>]]' (bans per network, default prefix length 24 and 64), 'bans-per-day' or 'jail-overlap' (IPs banned in multiple jails); optionally restricted to bans of last <TIME> or first <N> rows"],
 ["get <JAIL> maxretry", "gets the number of failures allowed for <JAIL>"],
 ["get <JAIL> maxmatches", "gets the max number of matches stored in memory per ticket in <JAIL>"], 
 ["get <JAIL> maxlines", "gets the number of lines to buffer for <JAIL>"],
@@ -0,0 +1,569 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: t -*-
+# vi: set ft=python sts=4 ts=4 sw=4 noet :
+
+# This file is part of Fail2Ban.
+#
+# Fail2Ban is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Fail2Ban is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fail2Ban; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = "Fail2Ban Developers"
+__copyright__ = "Copyright (c) 2013-2026 Fail2Ban Developers"
+__license__ = "GPL"
+
+import json
+from abc import ABCMeta, abstractmethod
+
+from .ipdns import IPAddr
+from .mytime import MyTime
+from .ticket import FailTicket
+from ..helpers import getLogger, uni_string, PREFER_ENC
+
+# Gets the instance of the logger.
+logSys = getLogger(__name__)
+
+
+def _json_default(x):
+	"""Avoid errors on types unknown in json-adapters."""
+	if isinstance(x, set):
+		x = list(x)
+	return uni_string(x)
+
+def _json_dumps_safe(x):
+	try:
+		x = json.dumps(x, ensure_ascii=False, default=_json_default).encode(
+			PREFER_ENC, 'replace')
+	except Exception as e:
+		# adapter handler should be exception-safe
+		logSys.error('json dumps failed: %r', e, exc_info=logSys.getEffectiveLevel() <= 4)
+		x = '{}'
+	return x
+
+def _json_loads_safe(x):
+	try:
+		x = json.loads(x.decode(PREFER_ENC, 'replace'))
+	except Exception as e:
+		# converter handler should be exception-safe
+		logSys.error('json loads failed: %r', e, exc_info=logSys.getEffectiveLevel() <= 4)
+		x = {}
+	return x
+
+
+def _ipNetwork(ip, bits4, bits6):
+	"""Returns network (as string) of the IP with prefix length bits4 or bits6
+	(for IPv4 or IPv6 respectively), used to aggregate bans by prefix.
+	"""
+	addr = IPAddr(ip)
+	if not addr.isValid:
+		return ip
+	return str(IPAddr(ip, bits4 if addr.isIPv4 else bits6))
+
+
+class BanStore(object, metaclass=ABCMeta):
+	"""An abstract base class for persistent storage of bans and log positions.
+
+	Ban store is used by jails (via `Jail.database`), filters (log or journal
+	positions), actions (merged ban info) and observer (ban time increment,
+	purge).  Implementations should provide the primitives below, whereas
+	merging of bans into tickets (`getBans`, `getBansMerged`, `getCurrentBans`)
+	is common and implemented in this class.
+
+	Implementations:
+
+	- `Fail2BanDb` - SQLite3 database (default);
+	- `MemoryBanStore` - in-memory store with snapshot file and append-only log.
+
+	Attributes
+	----------
+	filename
+	purgeage
+	maxMatches : int
+		Max count of matches stored per ticket.
+	"""
+
+	@classmethod
+	def __subclasshook__(cls, C):
+		required = (
+			"addJail", "delJail", "delAllJails",
+			"addLog", "updateLog", "getJournalPos", "updateJournal",
+			"addBan", "delBan", "getBan", "getBansMerged", "getCurrentBans",
+			"purge", "close",
+		)
+		for method in required:
+			if not callable(getattr(C, method, None)):
+				return NotImplemented
+		return True
+
+	# interval (in seconds) between checkpoints of pending log positions:
+	CHECKPOINT_INTERVAL = 10
+
+	def __init__(self):
+		# thresholds to write log position by checkpoint (moved bytes or elapsed seconds):
+		self.checkpointBytes = 1024*1024
+		self._checkpointTime = 60
+		# pending log positions (jail name, path) -> (jail, path, pos, hash, time index):
+		self._pendLogs = {}
+		# last written log positions (jail name, path) -> (pos, hash, time):
+		self._lastLogs = {}
+		self._nextCheckpointTM = 0
+
+	@property
+	@abstractmethod
+	def filename(self): # pragma: no cover - abstract
+		"""File name (or specification) of the store.
+		"""
+		pass
+
+	@property
+	def purgeage(self):
+		"""Purge age in seconds.
+		"""
+		return self._purgeAge
+
+	@purgeage.setter
+	def purgeage(self, value):
+		self._purgeAge = MyTime.str2seconds(value)
+
+	@abstractmethod
+	def close(self): # pragma: no cover - abstract
+		"""Closes the store (flushes pending data if needed).
+		"""
+		pass
+
+	@abstractmethod
+	def addJail(self, jail): # pragma: no cover - abstract
+		"""Adds (or enables) a jail.
+		"""
+		pass
+
+	@abstractmethod
+	def delJail(self, jail): # pragma: no cover - abstract
+		"""Disables a jail (deleted by purge as appropriate).
+		"""
+		pass
+
+	@abstractmethod
+	def delAllJails(self): # pragma: no cover - abstract
+		"""Disables all jails (deleted by purge as appropriate).
+		"""
+		pass
+
+	@abstractmethod
+	def getJailNames(self, enabled=None): # pragma: no cover - abstract
+		"""Set of jail names (currently only used for testing purposes).
+		"""
+		pass
+
+	@abstractmethod
+	def addLog(self, jail, container): # pragma: no cover - abstract
+		"""Adds a log, returns last position if it is known (and the hash is not changed).
+		"""
+		pass
+
+	@abstractmethod
+	def getLogPaths(self, jail=None): # pragma: no cover - abstract
+		"""Set of log paths (currently only used for testing purposes).
+		"""
+		pass
+
+	@abstractmethod
+	def updateLog(self, jail, container): # pragma: no cover - abstract
+		"""Updates hash and last position in log file.
+		"""
+		pass
+
+	@abstractmethod
+	def _updateLogs(self, logs): # pragma: no cover - abstract
+		"""Updates hash and last position of several logs `(jail, path, pos, hash, index)`
+		in single transaction (index is sparse time index of the file or None if unknown).
+		"""
+		pass
+
+	@abstractmethod
+	def getLogTimeIndex(self, container): # pragma: no cover - abstract
+		"""Gets stored time index `[(pos, time), ...]` of log file (written by any jail),
+		or None if unknown or the hash is changed.
+		"""
+		pass
+
+	@abstractmethod
+	def getJournalPos(self, jail, name, time=0, iso=None): # pragma: no cover - abstract
+		"""Gets last position (as time) of journal.
+		"""
+		pass
+
+	@abstractmethod
+	def updateJournal(self, jail, name, time, iso): # pragma: no cover - abstract
+		"""Updates last position (as time) of journal.
+		"""
+		pass
+
+	@abstractmethod
+	def addBan(self, jail, ticket): # pragma: no cover - abstract
+		"""Adds a ban of the ticket in jail.
+		"""
+		pass
+
+	@abstractmethod
+	def delBan(self, jail, *args): # pragma: no cover - abstract
+		"""Deletes bans of IPs given in args (or all bans of jail if no args).
+		"""
+		pass
+
+	@abstractmethod
+	def getBan(self, ip, jail=None, forbantime=None, overalljails=None, fromtime=None): # pragma: no cover - abstract
+		"""Gets list of `(bancount, timeofban, bantime)` of the bad IP
+		(aggregated if overalljails), used by ban time increment.
+		"""
+		pass
+
+	@abstractmethod
+	def _getBans(self, jail=None, bantime=None, ip=None): # pragma: no cover - abstract
+		"""Gets list of `(ip, timeofban, data)` ordered by ip and timeofban descending.
+		"""
+		pass
+
+	@abstractmethod
+	def _getCurrentBansRows(self, jail=None, ip=None, forbantime=None, fromtime=None): # pragma: no cover - abstract
+		"""Gets list of `(ip, timeofban, bantime, bancount, data)` of bans currently
+		active at `fromtime` (the latest per ip, ordered by ip).
+		"""
+		pass
+
+	@abstractmethod
+	def purge(self): # pragma: no cover - abstract
+		"""Purge old bans, jails and log files, returns statistic of the purge.
+		"""
+		pass
+
+	@abstractmethod
+	def _getBansByPrefix(self, jail, since, limit, bits4, bits6): # pragma: no cover - abstract
+		"""Gets list of `(network, bans, ips)` ordered by count of bans descending.
+		"""
+		pass
+
+	@abstractmethod
+	def _getBansPerDay(self, jail, since, limit): # pragma: no cover - abstract
+		"""Gets list of `(day, bans, ips)` ordered by day (local time) descending.
+		"""
+		pass
+
+	@abstractmethod
+	def _getJailOverlap(self, jail, since, limit): # pragma: no cover - abstract
+		"""Gets list of `(jail, other-jail, ips)` ordered by count of common IPs descending.
+		"""
+		pass
+
+	@property
+	def checkpointTime(self):
+		"""Max time in seconds a moved log position remains unwritten.
+		"""
+		return self._checkpointTime
+
+	@checkpointTime.setter
+	def checkpointTime(self, value):
+		self._checkpointTime = MyTime.str2seconds(value)
+
+	def pendLog(self, jail, container):
+		"""Notes current position of the log to be written by next checkpoint.
+		"""
+		name = container.getFileName()
+		with self._lock:
+			self._pendLogs[(jail.name, name)] = (jail, name, container.getPos(), container.getHash(),
+				container.getTimeIndex())
+
+	def delLog(self, jail, name):
+		"""Writes pending position of the log removed from jail and forgets its checkpoint state.
+		"""
+		key = (jail.name, name)
+		with self._lock:
+			pend = self._pendLogs.pop(key, None)
+			last = self._lastLogs.pop(key, None)
+			if pend and not (last and last[0] == pend[2] and last[1] == pend[3]):
+				self._updateLogs([pend])
+
+	def _forgetLogs(self, jail=None):
+		"""Forgets checkpoint state of logs of the jail (or of all jails).
+		"""
+		with self._lock:
+			for logs in (self._pendLogs, self._lastLogs):
+				for key in [key for key in logs if jail is None or key[0] == jail.name]:
+					del logs[key]
+
+	def checkpointLogs(self, force=False, jail=None):
+		"""Writes pending log positions (of all jails) in single transaction.
+
+		Invoked by filters after each processing of logs, but does nothing
+		until `CHECKPOINT_INTERVAL` elapsed since last checkpoint (unless force).
+		A position is written only if the log is rotated (hash changed), or
+		the position moved by `checkpointBytes` or is older than `checkpointTime`.
+		If force (e. g. stop of filter), all pending logs (of jail if specified)
+		are written regardless the thresholds.
+
+		Returns
+		-------
+		int
+			Count of written log positions.
+		"""
+		now = MyTime.time()
+		with self._lock:
+			if not force:
+				if now < self._nextCheckpointTM:
+					return 0
+				self._nextCheckpointTM = now + self.CHECKPOINT_INTERVAL
+			logs = []
+			for key, (j, name, pos, md5, index) in list(self._pendLogs.items()):
+				if jail is not None and key[0] != jail.name:
+					continue
+				last = self._lastLogs.get(key)
+				if last:
+					if last[0] == pos and last[1] == md5:
+						# not changed - nothing to write:
+						del self._pendLogs[key]
+						continue
+					if (not force and last[1] == md5 and abs(pos - last[0]) < self.checkpointBytes
+						and now - last[2] < self._checkpointTime
+					):
+						continue
+				del self._pendLogs[key]
+				self._lastLogs[key] = (pos, md5, now)
+				logs.append((j, name, pos, md5, index))
+			if logs:
+				self._updateLogs(logs)
+			return len(logs)
+
+	def getBans(self, **kwargs):
+		"""Get bans from the database.
+
+		Parameters
+		----------
+		jail : Jail
+			Jail that the ban belongs to. Default `None`; all jails.
+		bantime : int
+			Ban time in seconds, such that bans returned would still be
+			valid now.  Negative values are equivalent to `None`.
+			Default `None`; no limit.
+		ip : str
+			IP Address to filter bans by. Default `None`; all IPs.
+
+		Returns
+		-------
+		list
+			List of `Ticket`s for bans stored in database.
+		"""
+		tickets = []
+		for ip, timeofban, data in self._getBans(**kwargs):
+			#TODO: Implement data parts once arbitrary match keys completed
+			tickets.append(FailTicket(ip, timeofban))
+			tickets[-1].setData(data)
+		return tickets
+
+	# kinds of aggregated statistics supported by getBanStats:
+	BAN_STATS = ('bans-by-prefix', 'bans-per-day', 'jail-overlap')
+
+	def getBanStats(self, kind, jail=None, since=None, limit=None, prefix=None):
+		"""Get aggregated statistic of bans stored in database.
+
+		The statistic is computed by the store itself (without creation of
+		tickets), so it is suitable also for large amount of stored bans.
+
+		Parameters
+		----------
+		kind : str
+			One of `BAN_STATS`:
+			`bans-by-prefix` - count of bans and IPs per network;
+			`bans-per-day` - count of bans and IPs per day;
+			`jail-overlap` - count of IPs banned in jail and other jail.
+		jail : Jail
+			Jail that the bans belong to. Default `None`; all jails.
+		since : float
+			Consider bans newer than this time only. Default `None`; all bans.
+		limit : int
+			Max count of rows returned. Default `None`; no limit.
+		prefix : list
+			Prefix length for IPv4 and IPv6 networks (`bans-by-prefix` only),
+			default is 24 and 64.
+
+		Returns
+		-------
+		list
+			List of rows as `(key, bans, ips)` or `(jail, other-jail, ips)`.
+		"""
+		if limit is not None and limit < 0:
+			raise ValueError("Invalid limit %r" % (limit,))
+		if kind == 'bans-by-prefix':
+			bits = list(prefix) if prefix else []
+			if len(bits) > 2:
+				raise ValueError("Too many prefix lengths %r" % (prefix,))
+			bits4 = int(bits[0]) if len(bits) > 0 else 24
+			bits6 = int(bits[1]) if len(bits) > 1 else 64
+			if not 0 <= bits4 <= 32 or not 0 <= bits6 <= 128:
+				raise ValueError("Invalid prefix length %r" % (prefix,))
+			return self._getBansByPrefix(jail, since, limit, bits4, bits6)
+		if prefix:
+			raise ValueError("Unexpected arguments %r for statistic %r" % (prefix, kind))
+		if kind == 'bans-per-day':
+			return self._getBansPerDay(jail, since, limit)
+		if kind == 'jail-overlap':
+			return self._getJailOverlap(jail, since, limit)
+		raise ValueError("Unknown statistic %r, expected one of %s" % (kind, ', '.join(self.BAN_STATS)))
+
+	def getBansMerged(self, ip=None, jail=None, bantime=None):
+		"""Get bans from the database, merged into single ticket.
+
+		This is the same as `getBans`, but bans merged into single
+		ticket.
+
+		Parameters
+		----------
+		jail : Jail
+			Jail that the ban belongs to. Default `None`; all jails.
+		bantime : int
+			Ban time in seconds, such that bans returned would still be
+			valid now. Negative values are equivalent to `None`.
+			Default `None`; no limit.
+		ip : str
+			IP Address to filter bans by. Default `None`; all IPs.
+
+		Returns
+		-------
+		list or Ticket
+			Single ticket representing bans stored in database per IP
+			in a list. When `ip` argument passed, a single `Ticket` is
+			returned.
+		"""
+		with self._lock:
+			cacheKey = None
+			if bantime is None or bantime < 0:
+				cacheKey = (ip, jail)
+				if cacheKey in self._bansMergedCache:
+					return self._bansMergedCache[cacheKey]
+
+			tickets = []
+			ticket = None
+
+			results = list(self._getBans(ip=ip, jail=jail, bantime=bantime))
+			if results:
+				prev_banip = results[0][0]
+				matches = []
+				failures = 0
+				tickdata = {}
+				for banip, timeofban, data in results:
+					#TODO: Implement data parts once arbitrary match keys completed
+					if banip != prev_banip:
+						ticket = FailTicket(prev_banip, prev_timeofban, matches)
+						ticket.setAttempt(failures)
+						tickets.append(ticket)
+						# Reset variables
+						prev_banip = banip
+						matches = []
+						failures = 0
+						tickdata = {}
+					m = data.get('matches', [])
+					# pre-insert "maxadd" entries (because tickets are ordered desc by time)
+					maxadd = self.maxMatches - len(matches)
+					if maxadd > 0:
+						if len(m) <= maxadd:
+							matches = m + matches
+						else:
+							matches = m[-maxadd:] + matches
+					failures += data.get('failures', 1)
+					data['failures'] = failures
+					data['matches'] = matches
+					tickdata.update(data)
+					prev_timeofban = timeofban
+				ticket = FailTicket(banip, prev_timeofban, data=tickdata)
+				tickets.append(ticket)
+
+			if cacheKey:
+				self._bansMergedCache[cacheKey] = tickets if ip is None else ticket
+			return tickets if ip is None else ticket
+
+	def _invalidateBansMerged(self, ip, jail):
+		"""Removes merged tickets of ip from cache (e. g. ban added).
+		"""
+		try:
+			del self._bansMergedCache[(ip, jail)]
+		except KeyError:
+			pass
+		try:
+			del self._bansMergedCache[(ip, None)]
+		except KeyError:
+			pass
+
+	def getCurrentBans(self, jail=None, ip=None, forbantime=None, fromtime=None,
+		correctBanTime=True, maxmatches=None
+	):
+		"""Reads tickets (with merged info) currently affected from ban from the database.
+
+		There are all the tickets corresponding parameters jail/ip, forbantime,
+		fromtime (normally now).
+
+		If correctBanTime specified (default True) it will fix the restored ban-time
+		(and therefore endOfBan) of the ticket (normally it is ban-time of jail as maximum)
+		for all tickets with ban-time greater (or persistent).
+		"""
+		if fromtime is None:
+			fromtime = MyTime.time()
+		tickets = []
+		ticket = None
+		if correctBanTime is True:
+			correctBanTime = jail.getMaxBanTime() if jail is not None else None
+			# don't change if persistent allowed:
+			if correctBanTime == -1: correctBanTime = None
+
+		bans = self._getCurrentBansRows(jail=jail, ip=ip,
+			forbantime=forbantime, fromtime=fromtime
+		)
+		for ticket in bans:
+			# can produce unpack error (database may return sporadical wrong-empty row):
+			try:
+				banip, timeofban, bantime, bancount, data = ticket
+				# additionally check for empty values:
+				if banip is None or banip == "": # pragma: no cover
+					raise ValueError('unexpected value %r' % (banip,))
+				# if bantime unknown (after upgrade-db from earlier version), just use min known ban-time:
+				if bantime == -2: # todo: remove it in future version
+					bantime = jail.actions.getBanTime() if jail is not None else (
+						correctBanTime if correctBanTime else 600)
+				elif correctBanTime and correctBanTime >= 0:
+					# if persistent ban (or greater as max), use current max-bantime of the jail:
+					if bantime == -1 or bantime > correctBanTime:
+						bantime = correctBanTime
+				# after correction check the end of ban again:
+				if bantime != -1 and timeofban + bantime <= fromtime:
+					# not persistent and too old - ignore it:
+					logSys.debug("ignore ticket (with new max ban-time %r): too old %r <= %r, ticket: %r",
+						bantime, timeofban + bantime, fromtime, ticket)
+					continue
+			except ValueError as e: # pragma: no cover
+				logSys.debug("get current bans: ignore row %r - %s", ticket, e)
+				continue
+			# logSys.debug('restore ticket   %r, %r, %r', banip, timeofban, data)
+			ticket = FailTicket(banip, timeofban, data=data)
+			# filter matches if expected (current count > as maxmatches specified):
+			if maxmatches is None:
+				maxmatches = self.maxMatches
+			if maxmatches:
+				matches = ticket.getMatches()
+				if matches and len(matches) > maxmatches:
+					ticket.setMatches(matches[-maxmatches:])
+			else:
+				ticket.setMatches(None)
+			# logSys.debug('restored ticket: %r', ticket)
+			ticket.setBanTime(bantime)
+			ticket.setBanCount(bancount)
+			if ip is not None: return ticket
+			tickets.append(ticket)
+
+		return tickets
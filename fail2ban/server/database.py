@@ -22,6 +22,7 @@ __copyright__ = "Copyright (c) 2013 Steven Hiscocks"
 __license__ = "GPL"
 
 import json
+import logging
 import os
 import shutil
 import sqlite3
@@ -30,44 +31,46 @@ import time
 from functools import wraps
 from threading import RLock
 
+from .banstore import BanStore, _ipNetwork, _json_dumps_safe, _json_loads_safe
 from .mytime import MyTime
-from .ticket import FailTicket
 from .utils import Utils
-from ..helpers import getLogger, uni_string, PREFER_ENC
+from ..helpers import getLogger
 
 # Gets the instance of the logger.
 logSys = getLogger(__name__)
 
 
-def _json_default(x):
-	"""Avoid errors on types unknown in json-adapters."""
-	if isinstance(x, set):
-		x = list(x)
-	return uni_string(x)
-
-def _json_dumps_safe(x):
-	try:
-		x = json.dumps(x, ensure_ascii=False, default=_json_default).encode(
-			PREFER_ENC, 'replace')
-	except Exception as e:
-		# adapter handler should be exception-safe
-		logSys.error('json dumps failed: %r', e, exc_info=logSys.getEffectiveLevel() <= 4)
-		x = '{}'
-	return x
-
-def _json_loads_safe(x):
-	try:
-		x = json.loads(x.decode(PREFER_ENC, 'replace'))
-	except Exception as e:
-		# converter handler should be exception-safe
-		logSys.error('json loads failed: %r', e, exc_info=logSys.getEffectiveLevel() <= 4)
-		x = {}
-	return x
-
 sqlite3.register_adapter(dict, _json_dumps_safe)
 sqlite3.register_converter("JSON", _json_loads_safe)
 
 
+def _buildGetBanQueries():
+	"""Build all statements used by `Fail2BanDb.getBan`."""
+	queries = {}
+	for overalljails in (False, True):
+		for byJail in ((False, True) if not overalljails else (False,)):
+			for forbantime in (False, True):
+				for fromtime in (False, True):
+					if not overalljails:
+						query = "SELECT bancount, timeofban, bantime FROM bips"
+					else:
+						query = "SELECT sum(bancount), max(timeofban), sum(bantime) FROM bips"
+					query += " WHERE ip = ?"
+					if byJail:
+						query += " AND jail=?"
+					if forbantime:
+						query += " AND timeofban > ?"
+					if fromtime:
+						query += " AND timeofban > ?"
+					if overalljails:
+						# single group (by ip), so no order needed:
+						query += " GROUP BY ip"
+					elif not byJail:
+						query += " GROUP BY ip ORDER BY timeofban DESC LIMIT 1"
+					queries[(overalljails, byJail, forbantime, fromtime)] = query
+	return queries
+
+
 def commitandrollback(f):
 	@wraps(f)
 	def wrapper(self, *args, **kwargs):
@@ -81,7 +84,7 @@ def commitandrollback(f):
 	return wrapper
 
 
-class Fail2BanDb(object):
+class Fail2BanDb(BanStore):
 	"""Fail2Ban database for storing persistent data.
 
 	This allows after Fail2Ban is restarted to reinstated bans and
@@ -111,7 +114,7 @@ class Fail2BanDb(object):
 	filename
 	purgeage
 	"""
-	__version__ = 4
+	__version__ = 7
 	# Note all SCRIPTS strings must end in ';' for py26 compatibility
 	_CREATE_SCRIPTS = (
 		 ('fail2banDb', "CREATE TABLE IF NOT EXISTS fail2banDb(version INTEGER);")
@@ -125,6 +128,7 @@ class Fail2BanDb(object):
 			"path TEXT, " \
 			"firstlinemd5 TEXT, " \
 			"lastfilepos INTEGER DEFAULT 0, " \
+			"timeindex TEXT, " \
 			"FOREIGN KEY(jail) REFERENCES jails(name) ON DELETE CASCADE, " \
 			"UNIQUE(jail, path)," \
 			"UNIQUE(jail, path, firstlinemd5)" \
@@ -145,6 +149,7 @@ class Fail2BanDb(object):
 			"FOREIGN KEY(jail) REFERENCES jails(name) " \
 			");" \
 			"CREATE INDEX IF NOT EXISTS bans_jail_timeofban_ip ON bans(jail, timeofban);" \
+			"CREATE INDEX IF NOT EXISTS bans_timeofban ON bans(timeofban);" \
 			"CREATE INDEX IF NOT EXISTS bans_jail_ip ON bans(jail, ip);" \
 			"CREATE INDEX IF NOT EXISTS bans_ip ON bans(ip);")
 		,('bips', "CREATE TABLE IF NOT EXISTS bips(" \
@@ -158,13 +163,18 @@ class Fail2BanDb(object):
 			"FOREIGN KEY(jail) REFERENCES jails(name) " \
 			");" \
 			"CREATE INDEX IF NOT EXISTS bips_timeofban ON bips(timeofban);" \
-			"CREATE INDEX IF NOT EXISTS bips_ip ON bips(ip);")
+			"CREATE INDEX IF NOT EXISTS bips_ip_jail_timeofban ON bips(ip, jail, timeofban, bantime, bancount);")
 	)
 	_CREATE_TABS = dict(_CREATE_SCRIPTS)
 
 
 	def __init__(self, filename, purgeAge=24*60*60, outDatedFactor=3):
+		BanStore.__init__(self)
 		self.maxMatches = 10
+		# max count of rows deleted in single transaction by purge:
+		self.purgeChunkSize = 1000
+		# statistic of last purge (rows removed, time spent):
+		self.purgeStats = {}
 		self._lock = RLock()
 		self._dbFilename = filename
 		self._purgeAge = purgeAge
@@ -179,8 +189,12 @@ class Fail2BanDb(object):
 				detect_types=sqlite3.PARSE_DECLTYPES)
 			# # to allow use multi-byte utf-8
 			# self._db.text_factory = str
+			# network of IP, used to aggregate bans by prefix (statistic):
+			self._db.create_function("f2b_ipnet", 3, _ipNetwork)
 
 			self._bansMergedCache = {}
+			# cache of getBan results (per ip, time independent queries only):
+			self._banCache = Utils.Cache(maxCount=10000, maxTime=5*60)
 
 			logSys.info(
 				"Connected to fail2ban persistent database '%s'", filename)
@@ -306,19 +320,12 @@ class Fail2BanDb(object):
 		"""
 		return self._dbFilename
 
-	@property
-	def purgeage(self):
-		"""Purge age in seconds.
-		"""
-		return self._purgeAge
-
-	@purgeage.setter
-	def purgeage(self, value):
-		self._purgeAge = MyTime.str2seconds(value)
-
 	def _createDb(self, cur, incremental=False):
 		"""Creates a new database, called during initialisation.
 		"""
+		# allow to shrink database file by purge (works for new empty database only):
+		if not incremental:
+			cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
 		# create all (if not exists):
 		for (n, s) in Fail2BanDb._CREATE_SCRIPTS:
 			cur.executescript(s)
@@ -339,6 +346,10 @@ class Fail2BanDb(object):
 		res = cur.fetchone()
 		return res is not None and res[0]
 
+	def _columnExists(self, cur, table, column):
+		cur.execute("PRAGMA table_info(%s)" % (table,))
+		return any(row[1] == column for row in cur.fetchall())
+
 	@commitandrollback
 	def updateDb(self, cur, version):
 		"""Update an existing database, called during initialisation.
@@ -359,7 +370,7 @@ class Fail2BanDb(object):
 							"CREATE TEMPORARY TABLE logs_temp AS SELECT * FROM logs;"
 							"DROP TABLE logs;"
 							"%s;"
-							"INSERT INTO logs SELECT * from logs_temp;"
+							"INSERT INTO logs(jail, path, firstlinemd5, lastfilepos) SELECT * from logs_temp;"
 							"DROP TABLE logs_temp;"
 							"UPDATE fail2banDb SET version = 2;"
 							"COMMIT;" % Fail2BanDb._CREATE_TABS['logs'])
@@ -382,6 +393,26 @@ class Fail2BanDb(object):
 					cur.execute(
 							"INSERT OR REPLACE INTO bips(ip, jail, timeofban, bantime, bancount, data)"
 							"  SELECT ip, jail, timeofban, bantime, bancount, data FROM bans order by timeofban")
+			if version < 5 and self._tableExists(cur, "bans"):
+				# index used by purge of old bans:
+				cur.executescript("BEGIN TRANSACTION;"
+							"CREATE INDEX IF NOT EXISTS bans_timeofban ON bans(timeofban);"
+							"UPDATE fail2banDb SET version = 5;"
+							"COMMIT;")
+			if version < 6 and self._tableExists(cur, "bips"):
+				# covering index for getBan (replaces bips_ip), so the rewritten getBan queries
+				# (filter by ip and jail, order/aggregate by timeofban) are served from index only;
+				# downgrade to older version requires re-creation of bips_ip:
+				cur.executescript("BEGIN TRANSACTION;"
+							"CREATE INDEX IF NOT EXISTS bips_ip_jail_timeofban ON bips(ip, jail, timeofban, bantime, bancount);"
+							"DROP INDEX IF EXISTS bips_ip;"
+							"UPDATE fail2banDb SET version = 6;"
+							"COMMIT;")
+			if version < 7 and self._tableExists(cur, "logs"):
+				# sparse time index of log files (used by seek to start time):
+				if not self._columnExists(cur, "logs", "timeindex"):
+					cur.execute("ALTER TABLE logs ADD COLUMN timeindex TEXT")
+				cur.execute("UPDATE fail2banDb SET version = 7")
 
 			cur.execute("SELECT version FROM fail2banDb LIMIT 1")
 			return cur.fetchone()[0]
@@ -418,6 +449,7 @@ class Fail2BanDb(object):
 		jail : Jail
 			Jail to be removed from the database.
 		"""
+		self._forgetLogs(jail)
 		# Will be deleted by purge as appropriate
 		cur.execute(
 			"UPDATE jails SET enabled=0 WHERE name=?", (jail.name, ))
@@ -426,6 +458,7 @@ class Fail2BanDb(object):
 	def delAllJails(self, cur):
 		"""Deletes all jails from the database.
 		"""
+		self._forgetLogs()
 		# Will be deleted by purge as appropriate
 		cur.execute("UPDATE jails SET enabled=0")
 
@@ -520,17 +553,58 @@ class Fail2BanDb(object):
 		container : FileContainer
 			File container of the log file being updated.
 		"""
-		self._updateLog(cur, jail, container.getFileName(), container.getPos(), container.getHash())
+		self._updateLog(cur, jail, container.getFileName(), container.getPos(), container.getHash(),
+			container.getTimeIndex())
 
-	def _updateLog(self, cur, jail, name, pos, md5):
+	@commitandrollback
+	def _updateLogs(self, cur, logs):
+		for jail, name, pos, md5, index in logs:
+			self._updateLog(cur, jail, name, pos, md5, index)
+
+	def _updateLog(self, cur, jail, name, pos, md5, index=None):
+		if index is not None:
+			index = json.dumps(index)
 		cur.execute(
-			"UPDATE logs SET firstlinemd5=?, lastfilepos=? "
-				"WHERE jail=? AND path=?", (md5, pos, jail.name, name))
+			"UPDATE logs SET firstlinemd5=?, lastfilepos=?, timeindex=? "
+				"WHERE jail=? AND path=?", (md5, pos, index, jail.name, name))
 		# be sure it is set (if not available):
 		if not cur.rowcount:
 			cur.execute(
-					"INSERT OR REPLACE INTO logs(jail, path, firstlinemd5, lastfilepos) "
-						"VALUES(?, ?, ?, ?)", (jail.name, name, md5, pos))
+					"INSERT OR REPLACE INTO logs(jail, path, firstlinemd5, lastfilepos, timeindex) "
+						"VALUES(?, ?, ?, ?, ?)", (jail.name, name, md5, pos, index))
+
+	@commitandrollback
+	def getLogTimeIndex(self, cur, container):
+		"""Gets sparse time index of log file.
+
+		The index is shared between jails monitoring the same file (the largest
+		one is used), it is valid only if the hash of the file is not changed.
+
+		Parameters
+		----------
+		container : FileContainer
+			File container of the log file.
+
+		Returns
+		-------
+		list
+			List of `(pos, time)` if known; else `None`
+		"""
+		md5 = container.getHash()
+		if not md5:
+			return None
+		cur.execute(
+			"SELECT timeindex FROM logs "
+				"WHERE path=? AND firstlinemd5=? AND timeindex IS NOT NULL "
+				"ORDER BY length(timeindex) DESC LIMIT 1",
+			(container.getFileName(), md5))
+		row = cur.fetchone()
+		if not row:
+			return None
+		try:
+			return [tuple(e) for e in json.loads(row[0])]
+		except (ValueError, TypeError): # pragma: no cover - damaged
+			return None
 
 	@commitandrollback
 	def getJournalPos(self, cur, jail, name, time=0, iso=None):
@@ -575,14 +649,8 @@ class Fail2BanDb(object):
 			Ticket of the ban to be added.
 		"""
 		ip = str(ticket.getID())
-		try:
-			del self._bansMergedCache[(ip, jail)]
-		except KeyError:
-			pass
-		try:
-			del self._bansMergedCache[(ip, None)]
-		except KeyError:
-			pass
+		self._invalidateBansMerged(ip, jail)
+		self._invalidateBan(ip, jail)
 		#TODO: Implement data parts once arbitrary match keys completed
 		data = ticket.getData()
 		matches = data.get('matches')
@@ -617,6 +685,7 @@ class Fail2BanDb(object):
 		query2 = "DELETE FROM bans WHERE jail = ?"
 		queryArgs = [jail.name];
 		if not len(args):
+			self._banCache.clear()
 			cur.execute(query1, queryArgs);
 			cur.execute(query2, queryArgs);
 			return
@@ -625,6 +694,7 @@ class Fail2BanDb(object):
 		queryArgs.append('');
 		for ip in args:
 			queryArgs[1] = str(ip);
+			self._invalidateBan(queryArgs[1], jail)
 			cur.execute(query1, queryArgs);
 			cur.execute(query2, queryArgs);
 
@@ -647,126 +717,56 @@ class Fail2BanDb(object):
 		# repack iterator as long as in lock:
 		return list(cur.execute(query, queryArgs))
 
-	def getBans(self, **kwargs):
-		"""Get bans from the database.
-
-		Parameters
-		----------
-		jail : Jail
-			Jail that the ban belongs to. Default `None`; all jails.
-		bantime : int
-			Ban time in seconds, such that bans returned would still be
-			valid now.  Negative values are equivalent to `None`.
-			Default `None`; no limit.
-		ip : str
-			IP Address to filter bans by. Default `None`; all IPs.
-
-		Returns
-		-------
-		list
-			List of `Ticket`s for bans stored in database.
-		"""
-		tickets = []
-		for ip, timeofban, data in self._getBans(**kwargs):
-			#TODO: Implement data parts once arbitrary match keys completed
-			tickets.append(FailTicket(ip, timeofban))
-			tickets[-1].setData(data)
-		return tickets
-
-	def getBansMerged(self, ip=None, jail=None, bantime=None):
-		"""Get bans from the database, merged into single ticket.
-
-		This is the same as `getBans`, but bans merged into single
-		ticket.
-
-		Parameters
-		----------
-		jail : Jail
-			Jail that the ban belongs to. Default `None`; all jails.
-		bantime : int
-			Ban time in seconds, such that bans returned would still be
-			valid now. Negative values are equivalent to `None`.
-			Default `None`; no limit.
-		ip : str
-			IP Address to filter bans by. Default `None`; all IPs.
-
-		Returns
-		-------
-		list or Ticket
-			Single ticket representing bans stored in database per IP
-			in a list. When `ip` argument passed, a single `Ticket` is
-			returned.
-		"""
-		with self._lock:
-			cacheKey = None
-			if bantime is None or bantime < 0:
-				cacheKey = (ip, jail)
-				if cacheKey in self._bansMergedCache:
-					return self._bansMergedCache[cacheKey]
-
-			tickets = []
-			ticket = None
-
-			results = list(self._getBans(ip=ip, jail=jail, bantime=bantime))
-			if results:
-				prev_banip = results[0][0]
-				matches = []
-				failures = 0
-				tickdata = {}
-				for banip, timeofban, data in results:
-					#TODO: Implement data parts once arbitrary match keys completed
-					if banip != prev_banip:
-						ticket = FailTicket(prev_banip, prev_timeofban, matches)
-						ticket.setAttempt(failures)
-						tickets.append(ticket)
-						# Reset variables
-						prev_banip = banip
-						matches = []
-						failures = 0
-						tickdata = {}
-					m = data.get('matches', [])
-					# pre-insert "maxadd" entries (because tickets are ordered desc by time)
-					maxadd = self.maxMatches - len(matches)
-					if maxadd > 0:
-						if len(m) <= maxadd:
-							matches = m + matches
-						else:
-							matches = m[-maxadd:] + matches
-					failures += data.get('failures', 1)
-					data['failures'] = failures
-					data['matches'] = matches
-					tickdata.update(data)
-					prev_timeofban = timeofban
-				ticket = FailTicket(banip, prev_timeofban, data=tickdata)
-				tickets.append(ticket)
-
-			if cacheKey:
-				self._bansMergedCache[cacheKey] = tickets if ip is None else ticket
-			return tickets if ip is None else ticket
+	# pre-built statements of getBan (stable SQL, so prepared statement is reused by sqlite3 module),
+	# key is (overalljails, byJail, forbantime, fromtime):
+	_GETBAN_QUERIES = _buildGetBanQueries()
 
 	@commitandrollback
-	def getBan(self, cur, ip, jail=None, forbantime=None, overalljails=None, fromtime=None):
-		ip = str(ip)
-		if not overalljails:
-			query = "SELECT bancount, timeofban, bantime FROM bips"
-		else:
-			query = "SELECT sum(bancount), max(timeofban), sum(bantime) FROM bips"
-		query += " WHERE ip = ?"
+	def _getBan(self, cur, ip, jail=None, forbantime=None, overalljails=None, fromtime=None):
+		overalljails = bool(overalljails)
+		byJail = not overalljails and jail is not None
 		queryArgs = [ip]
-		if not overalljails and jail is not None:
-			query += " AND jail=?"
+		if byJail:
 			queryArgs.append(jail.name)
 		if forbantime is not None:
-			query += " AND timeofban > ?"
 			queryArgs.append(MyTime.time() - forbantime)
 		if fromtime is not None:
-			query += " AND timeofban > ?"
 			queryArgs.append(fromtime)
-		if overalljails or jail is None:
-			query += " GROUP BY ip ORDER BY timeofban DESC LIMIT 1"
+		query = self._GETBAN_QUERIES[(overalljails, byJail, forbantime is not None, fromtime is not None)]
 		# repack iterator as long as in lock:
 		return list(cur.execute(query, queryArgs))
 
+	def getBan(self, ip, jail=None, forbantime=None, overalljails=None, fromtime=None):
+		"""Get ban count, time and ban time of bad IP (used by ban time increment).
+
+		The result is cached per IP (invalidated by addBan, delBan and purge), if
+		it is time independent (forbantime and fromtime are not specified).
+
+		Returns
+		-------
+		list
+			List of `(bancount, timeofban, bantime)`, sums over all jails if
+			overalljails (at most single entry).
+		"""
+		ip = str(ip)
+		if forbantime is not None or fromtime is not None:
+			return self._getBan(ip, jail, forbantime, overalljails, fromtime)
+		cacheKey = (ip, jail.name if not overalljails and jail is not None else None, bool(overalljails))
+		with self._lock:
+			res = self._banCache.get(cacheKey)
+			if res is None:
+				res = self._getBan(ip, jail, forbantime, overalljails, fromtime)
+				self._banCache.set(cacheKey, res)
+			return res
+
+	def _invalidateBan(self, ip, jail):
+		"""Removes cached getBan results of ip affected by jail.
+		"""
+		cache = self._banCache
+		cache.unset((ip, jail.name, False))
+		cache.unset((ip, None, False))
+		cache.unset((ip, None, True))
+
 	def _getCurrentBans(self, cur, jail = None, ip = None, forbantime=None, fromtime=None):
 		queryArgs = []
 		if jail is not None:
@@ -788,77 +788,53 @@ class Fail2BanDb(object):
 			query += " ORDER BY timeofban DESC LIMIT 1"
 		return cur.execute(query, queryArgs)
 
-	def getCurrentBans(self, jail=None, ip=None, forbantime=None, fromtime=None,
-		correctBanTime=True, maxmatches=None
-	):
-		"""Reads tickets (with merged info) currently affected from ban from the database.
-		
-		There are all the tickets corresponding parameters jail/ip, forbantime,
-		fromtime (normally now).
-		
-		If correctBanTime specified (default True) it will fix the restored ban-time 
-		(and therefore endOfBan) of the ticket (normally it is ban-time of jail as maximum)
-		for all tickets with ban-time greater (or persistent).
-		"""
-		cur = self._db.cursor()
-		try:
-			if fromtime is None:
-				fromtime = MyTime.time()
-			tickets = []
-			ticket = None
-			if correctBanTime is True:
-				correctBanTime = jail.getMaxBanTime() if jail is not None else None
-				# don't change if persistent allowed:
-				if correctBanTime == -1: correctBanTime = None
-
-			with self._lock:
-				bans = self._getCurrentBans(cur, jail=jail, ip=ip, 
-					forbantime=forbantime, fromtime=fromtime
-				)
-			for ticket in bans:
-				# can produce unpack error (database may return sporadical wrong-empty row):
-				try:
-					banip, timeofban, bantime, bancount, data = ticket
-					# additionally check for empty values:
-					if banip is None or banip == "": # pragma: no cover
-						raise ValueError('unexpected value %r' % (banip,))
-					# if bantime unknown (after upgrade-db from earlier version), just use min known ban-time:
-					if bantime == -2: # todo: remove it in future version
-						bantime = jail.actions.getBanTime() if jail is not None else (
-							correctBanTime if correctBanTime else 600)
-					elif correctBanTime and correctBanTime >= 0:
-						# if persistent ban (or greater as max), use current max-bantime of the jail:
-						if bantime == -1 or bantime > correctBanTime:
-							bantime = correctBanTime
-					# after correction check the end of ban again:
-					if bantime != -1 and timeofban + bantime <= fromtime:
-						# not persistent and too old - ignore it:
-						logSys.debug("ignore ticket (with new max ban-time %r): too old %r <= %r, ticket: %r",
-							bantime, timeofban + bantime, fromtime, ticket)
-						continue
-				except ValueError as e: # pragma: no cover
-					logSys.debug("get current bans: ignore row %r - %s", ticket, e)
-					continue
-				# logSys.debug('restore ticket   %r, %r, %r', banip, timeofban, data)
-				ticket = FailTicket(banip, timeofban, data=data)
-				# filter matches if expected (current count > as maxmatches specified):
-				if maxmatches is None:
-					maxmatches = self.maxMatches
-				if maxmatches:
-					matches = ticket.getMatches()
-					if matches and len(matches) > maxmatches:
-						ticket.setMatches(matches[-maxmatches:])
-				else:
-					ticket.setMatches(None)
-				# logSys.debug('restored ticket: %r', ticket)
-				ticket.setBanTime(bantime)
-				ticket.setBanCount(bancount)
-				if ip is not None: return ticket
-				tickets.append(ticket)
-		finally:
-			cur.close() 
+	@commitandrollback
+	def _getCurrentBansRows(self, cur, jail=None, ip=None, forbantime=None, fromtime=None):
+		# repack iterator as long as in lock:
+		return list(self._getCurrentBans(cur, jail=jail, ip=ip,
+			forbantime=forbantime, fromtime=fromtime))
 
-		return tickets
+	@staticmethod
+	def _banStatsFilter(alias, jail, since, queryArgs):
+		query = ""
+		if jail is not None:
+			query += " AND %s.jail=?" % alias
+			queryArgs.append(jail.name)
+		if since is not None:
+			query += " AND %s.timeofban > ?" % alias
+			queryArgs.append(since)
+		return query
+
+	@commitandrollback
+	def _getBansByPrefix(self, cur, jail, since, limit, bits4, bits6):
+		queryArgs = [bits4, bits6]
+		query = ("SELECT f2b_ipnet(b.ip, ?, ?) AS net, count(*) AS cnt, count(DISTINCT b.ip)"
+			" FROM bans b WHERE 1" + self._banStatsFilter("b", jail, since, queryArgs) +
+			" GROUP BY net ORDER BY cnt DESC, net LIMIT ?")
+		queryArgs.append(limit if limit is not None else -1)
+		# aggregated in sqlite, repack iterator as long as in lock:
+		return list(cur.execute(query, queryArgs))
+
+	@commitandrollback
+	def _getBansPerDay(self, cur, jail, since, limit):
+		queryArgs = []
+		query = ("SELECT date(b.timeofban, 'unixepoch', 'localtime') AS day, count(*), count(DISTINCT b.ip)"
+			" FROM bans b WHERE 1" + self._banStatsFilter("b", jail, since, queryArgs) +
+			" GROUP BY day ORDER BY day DESC LIMIT ?")
+		queryArgs.append(limit if limit is not None else -1)
+		return list(cur.execute(query, queryArgs))
+
+	@commitandrollback
+	def _getJailOverlap(self, cur, jail, since, limit):
+		queryArgs = []
+		# pairs of different jails (each pair once if all jails):
+		query = ("SELECT a.jail, b.jail, count(DISTINCT a.ip) AS cnt"
+			" FROM bans a JOIN bans b ON b.ip = a.ip AND b.jail " + ("!=" if jail is not None else ">") + " a.jail"
+			" WHERE 1" + self._banStatsFilter("a", jail, since, queryArgs) +
+			self._banStatsFilter("b", None, since, queryArgs) +
+			" GROUP BY a.jail, b.jail ORDER BY cnt DESC, a.jail, b.jail LIMIT ?")
+		queryArgs.append(limit if limit is not None else -1)
+		return list(cur.execute(query, queryArgs))
 
 	def _cleanjails(self, cur):
 		"""Remove empty jails jails and log files from database.
@@ -868,23 +844,84 @@ class Fail2BanDb(object):
 				"AND NOT EXISTS(SELECT * FROM bans WHERE jail = jails.name) "
 				"AND NOT EXISTS(SELECT * FROM bips WHERE jail = jails.name)")
 
-	def _purge_bips(self, cur):
-		"""Purge old bad ips (jails and log files from database).
+	@commitandrollback
+	def _purgeChunk(self, cur, query, queryArgs):
+		cur.execute(query, queryArgs)
+		return cur.rowcount
+
+	def _purgeChunked(self, query, queryArgs):
+		"""Executes purge query (bounded with LIMIT) repeatedly until nothing left.
+
+		Each chunk is deleted in its own transaction, the lock gets released between
+		chunks, so other threads (e. g. adding a ban) don't wait for the whole purge.
+		"""
+		queryArgs = tuple(queryArgs) + (self.purgeChunkSize,)
+		count = chunks = 0
+		while True:
+			n = self._purgeChunk(query, queryArgs)
+			chunks += 1
+			count += max(0, n)
+			if n < self.purgeChunkSize:
+				break
+			# yield to other threads waiting for the lock:
+			time.sleep(0)
+		return count, chunks
+
+	def _purge_bans(self, purgeTime):
+		"""Purge old bans (in chunks).
+		"""
+		return self._purgeChunked(
+			"DELETE FROM bans WHERE rowid IN ("
+				"SELECT rowid FROM bans WHERE timeofban < ? LIMIT ?)",
+			(purgeTime,))
+
+	def _purge_bips(self, purgeTime):
+		"""Purge old bad ips (in chunks).
 		Currently it is timed out IP, whose time since last ban is several times out-dated (outDatedFactor is default 3).
 		Permanent banned ips will be never removed.
 		"""
-		cur.execute(
-			"DELETE FROM bips WHERE timeofban < ? and bantime != -1 and (timeofban + (bantime * ?)) < ?",
-			(int(MyTime.time()) - self._purgeAge, self._outDatedFactor, int(MyTime.time()) - self._purgeAge))
+		purgeTime = int(purgeTime)
+		return self._purgeChunked(
+			"DELETE FROM bips WHERE rowid IN ("
+				"SELECT rowid FROM bips WHERE timeofban < ? and bantime != -1"
+				" and (timeofban + (bantime * ?)) < ? LIMIT ?)",
+			(purgeTime, self._outDatedFactor, purgeTime))
 
 	@commitandrollback
-	def purge(self, cur):
-		"""Purge old bans, jails and log files from database.
-		"""
-		self._bansMergedCache = {}
-		cur.execute(
-			"DELETE FROM bans WHERE timeofban < ?",
-			(MyTime.time() - self._purgeAge, ))
-		self._purge_bips(cur)
+	def _cleanjailsAndVacuum(self, cur, vacuum=True):
 		self._cleanjails(cur)
+		jails = max(0, cur.rowcount)
+		# release free pages (if database supports incremental vacuum):
+		if vacuum:
+			cur.execute("PRAGMA auto_vacuum")
+			if cur.fetchone()[0] == 2:
+				cur.execute("PRAGMA incremental_vacuum")
+				cur.fetchall()
+		return jails
+
+	def purge(self):
+		"""Purge old bans, jails and log files from database.
 
+		The rows are deleted incrementally in chunks of `purgeChunkSize`,
+		afterwards free pages are released with incremental vacuum.
+		The statistic of the purge is stored in `purgeStats`.
+		"""
+		stime = time.time()
+		purgeTime = MyTime.time() - self._purgeAge
+		bans, chunks = self._purge_bans(purgeTime)
+		bips, n = self._purge_bips(purgeTime)
+		chunks += n
+		# reset caches after the last chunk is committed (the lock is released between
+		# chunks, so concurrent getBan could cache rows that are purged hereafter):
+		with self._lock:
+			self._bansMergedCache = {}
+			self._banCache.clear()
+		jails = self._cleanjailsAndVacuum(vacuum=(bans or bips))
+		stats = self.purgeStats = {
+			'bans': bans, 'bips': bips, 'jails': jails, 'chunks': chunks,
+			'time': time.time() - stime
+		}
+		logSys.log(logging.INFO if (bans or bips or jails) else logging.DEBUG,
+			"Purge database: removed %(bans)d ban(s), %(bips)d bad ip(s),"
+			" %(jails)d jail(s) in %(chunks)d chunk(s), %(time).3f sec", stats)
+		return stats
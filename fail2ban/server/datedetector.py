@@ -27,8 +27,10 @@ import time
 from threading import Lock
 
 from .datetemplate import re, DateTemplate, DatePatternRegex, DateTai64n, DateEpoch, \
-	RE_EPOCH_PATTERN
-from .strptime import validateTimeZone
+	RE_EPOCH_PATTERN, RE_GLOBALFLAGS
+from .mytime import MyTime
+from .strptime import validateTimeZone, YearContext, \
+	fastStrptimeISO, fastStrptimeApache, fastStrptimeSyslog
 from .utils import Utils
 from ..helpers import getLogger
 
@@ -38,6 +40,12 @@ logSys = getLogger(__name__)
 logLevel = 5
 
 RE_DATE_PREMATCH = re.compile(r"(?<!\\)\{DATE\}", re.IGNORECASE)
+# named group, its back-reference or conditional (to rename groups by combining of templates):
+RE_NAMED_GROUP = re.compile(r"(?<!\\)\(\?(P<|P=|\()(\w+)(>?)")
+RE_CAPTURING_GROUP = re.compile(r"(?<![\\?])\((?!\?)")
+RE_PAREN_IN_CHARSET = re.compile(r"(?<!\\)\[[^\]]*\(")
+RE_NUMERIC_BACKREF = re.compile(r"(?<!\\)\\[1-9]")
+RE_LEADING_FLAGS = re.compile(r"^\(\?([a-z]+)\)")
 DD_patternCache = Utils.Cache(maxCount=1000, maxTime=60*60)
 
 
@@ -82,10 +90,66 @@ def _getAnchoredTemplate(template, wrap=lambda s: '{^LN-BEG}' + s):
 				template2 = _getPatternTemplate(name)
 			else:
 				template2 = _getPatternTemplate(regex)
+	# wrapped pattern has the same fields - inherit fast converter:
+	fastParser = getattr(template, 'fastParser', None)
+	if fastParser:
+		template2.fastParser = fastParser
 	return template2
 
 
 
+def _combineTemplates(templates):
+	"""Compiles templates to regex with alternation of templates.
+
+	Each template is a named branch `_t<N>`, so `lastgroup` of match identifies the
+	template; its groups are non-capturing (or renamed with suffix `_<N>` if referenced)
+	and global flags are scoped to the branch.  Line-begin anchored templates get own
+	regex (matched at begin of line only, so it is cheap).
+	Returns (anchored regex, regex, dict branch -> template), where regex is None if
+	no such templates, or None if some template cannot be combined.  Compiled regexs
+	are cached (same for all detectors with default templates).
+	"""
+	regexs = tuple(getattr(ddtempl.template, 'regex', None) for ddtempl in templates)
+	key = ('combined',) + regexs
+	combined = DD_patternCache.get(key)
+	if combined is None:
+		combined = _compileCombined(regexs)
+		DD_patternCache.set(key, combined)
+	if not combined:
+		return None
+	names = dict(('_t%d' % i, ddtempl) for i, ddtempl in enumerate(templates))
+	return combined + (names,)
+
+def _compileCombined(regexs):
+	branches = [], []
+	for i, regex in enumerate(regexs):
+		if not regex or RE_NUMERIC_BACKREF.search(regex):
+			return False
+		flags = RE_LEADING_FLAGS.search(regex)
+		if flags:
+			regex = regex[flags.end():]
+			flags = flags.group(1).replace('u', '')
+		if RE_GLOBALFLAGS.search(regex):
+			return False
+		# rename groups referenced by back-reference or conditional, other are non-capturing:
+		refs = set(m.group(2) for m in RE_NAMED_GROUP.finditer(regex) if m.group(1) != 'P<')
+		if any(n.isdigit() for n in refs):
+			return False
+		regex = RE_NAMED_GROUP.sub(lambda m: '(?%s%s_%d%s' % (m.group(1), m.group(2), i, m.group(3))
+			if m.group(2) in refs else '(?:', regex)
+		if not RE_PAREN_IN_CHARSET.search(regex):
+			regex = RE_CAPTURING_GROUP.sub('(?:', regex)
+		anchored = regex.startswith('^')
+		if flags:
+			regex = '(?%s:%s)' % (flags, regex)
+		branches[0 if anchored else 1].append('(?P<_t%d>%s)' % (i, regex))
+	try:
+		return tuple((re.compile('|'.join(b)) if b else None) for b in branches)
+	except Exception as e: # pragma: no cover
+		logSys.debug("Combine date templates failed: %r", e)
+		return False
+
+
 class DateDetectorCache(object):
 	"""Implements the caching of the default templates list.
 	"""
@@ -176,11 +240,22 @@ class DateDetectorCache(object):
 		r"TAI64N",
 	]
 
+	# fast-path converters of the most common default templates (fixed field set,
+	# integer arithmetic; anything unusual falls back to the generic conversion):
+	FAST_PARSERS = {
+		DEFAULT_TEMPLATES[0]: fastStrptimeISO,
+		DEFAULT_TEMPLATES[1]: fastStrptimeSyslog,
+		DEFAULT_TEMPLATES[4]: fastStrptimeApache,
+	}
+
 	@property
 	def defaultTemplates(self):
 		if isinstance(DateDetectorCache.DEFAULT_TEMPLATES[0], str):
 			for i, dt in enumerate(DateDetectorCache.DEFAULT_TEMPLATES):
+				fastParser = self.FAST_PARSERS.get(dt)
 				dt = _getPatternTemplate(dt)
+				if fastParser:
+					dt.fastParser = fastParser
 				DateDetectorCache.DEFAULT_TEMPLATES[i] = dt
 		return DateDetectorCache.DEFAULT_TEMPLATES
 
@@ -216,6 +291,9 @@ class DateDetectorTemplate(object):
 	def __getattr__(self, name):
 		""" Returns attribute of template (called for parameters not in slots)
 		"""
+		# not initialized yet (e. g. by unpickle in worker of parallel catch-up):
+		if name == 'template':
+			raise AttributeError(name)
 		return getattr(self.template, name)
 
 
@@ -228,6 +306,15 @@ class DateDetector(object):
 	"""
 	_defCache = DateDetectorCache()
 
+	## count of matched lines to learn the template before freezing (0 - disable learning):
+	LEARN_LINES = 100
+	## min part of learned lines the template must hit to be frozen:
+	LEARN_RATE = 0.95
+	## count of lines (in a row) found by other templates to fallback from frozen template:
+	FROZEN_MAX_MISSES = 3
+	## search with templates combined to single regex (if more than 2 templates):
+	COMBINED_SEARCH = True
+
 	def __init__(self):
 		self.__templates = list()
 		self.__known_names = set()
@@ -243,6 +330,63 @@ class DateDetector(object):
 		self.__preMatch = None
 		# default TZ (if set, treat log lines without explicit time zone to be in this time zone):
 		self.__default_tz = None
+		# combined regex of templates (built by first usage, False if not possible):
+		self.__combined = None
+		# time cache (key of last minute prefix, now by creation, epoch of second 0):
+		self.__timeCache = None
+		# context to assume the year of dates without year (by last date):
+		self.__yearCtx = YearContext()
+		# learning of template (by multiple templates) and frozen template:
+		self._resetLearning()
+
+	def _resetLearning(self):
+		"""Starts learning of template (profile hits and offsets by next lines).
+		"""
+		self.__learnCnt = 0
+		self.__learnStats = {}
+		self.__frozen = None
+		self.__frozenMisses = 0
+
+	def _getCombinedRegex(self):
+		"""Returns templates combined to single regex (see _combineTemplates).
+		"""
+		combined = self.__combined
+		if combined is None:
+			combined = self.__combined = _combineTemplates(self.__templates) or False
+		return combined
+
+	@property
+	def frozenTemplate(self):
+		"""Template frozen after learning (None if searching in all templates).
+		"""
+		return self.__frozen[0].template if self.__frozen else None
+
+	def _learnTemplate(self, ddtempl, distance):
+		"""Profiles template hits and offsets, freezes template if it is unique enough.
+		"""
+		st = self.__learnStats.get(ddtempl)
+		if st is None:
+			st = self.__learnStats[ddtempl] = [0, set()]
+		st[0] += 1
+		st[1].add(distance)
+		self.__learnCnt += 1
+		if self.__learnCnt < self.LEARN_LINES:
+			return
+		# learning ends - find the winner:
+		ddtempl, st = max(self.__learnStats.items(), key=lambda v: v[1][0])
+		# freeze if the template hits almost all lines and always at the same offset:
+		if st[0] >= self.__learnCnt * self.LEARN_RATE and len(st[1]) == 1:
+			distance = st[1].pop()
+			self.__frozen = ddtempl, distance
+			self.__frozenMisses = 0
+			logSys.info("  date template frozen after %d lines: %s (at %d)", self.__learnCnt,
+				ddtempl.name, distance)
+		else:
+			logSys.debug("  date template not frozen (%d templates hit by %d lines)",
+				len(self.__learnStats), self.__learnCnt)
+		# learning is done (resp. until fallback from frozen template):
+		self.__learnCnt = None
+		self.__learnStats = {}
 
 	def _appendTemplate(self, template, ignoreDup=False):
 		name = template.name
@@ -252,6 +396,8 @@ class DateDetector(object):
 				"There is already a template with name %s" % name)
 		self.__known_names.add(name)
 		self.__templates.append(DateDetectorTemplate(template))
+		self.__combined = None
+		self._resetLearning()
 		logSys.debug("  date pattern regex for `%s`: `%s`",
 			getattr(template, 'pattern', ''), template.regex)
 
@@ -348,6 +494,19 @@ class DateDetector(object):
 		log = logSys.log if logSys.getEffectiveLevel() <= logLevel else lambda *args: None
 		log(logLevel-1, "try to match time for line: %.120s", line)
 
+		# frozen template (after learning) - single search from learned offset:
+		frozen = self.__frozen
+		if frozen:
+			ddtempl, distance = frozen
+			template = ddtempl.template
+			match = template.matchDate(line, distance)
+			if match and match.start() == distance:
+				log(logLevel, "  matched frozen template %s", template.name)
+				ddtempl.hits += 1
+				self.__frozenMisses = 0
+				return (match, template)
+			log(logLevel, "  ** frozen template not found, search ...")
+
 		# first try to use last template with same start/end position:
 		match = None
 		found = None, 0x7fffffff, 0x7fffffff, -1
@@ -400,7 +559,29 @@ class DateDetector(object):
 			else:
 				log(logLevel, "  ** last pattern not found - pattern change, search ...")
 		# search template and better match:
-		if not match:
+		searchAll = not match
+		if not match and self.COMBINED_SEARCH and len(self.__templates) > 2:
+			# single scan using all templates combined, winner is template of leftmost match:
+			combined = self._getCombinedRegex()
+			if combined:
+				log(logLevel, " search combined templates (%i) ...", len(self.__templates))
+				cm = (combined[0] and combined[0].match(line)) or (combined[1] and combined[1].search(line))
+				if cm:
+					ddtempl = combined[2][cm.lastgroup]
+					template = ddtempl.template
+					distance = cm.start()
+					match = template.matchDate(line, distance)
+					if match and match.start() == distance:
+						endpos = match.end()
+						i = self.__templates.index(ddtempl)
+						log(logLevel, "  matched time template #%02i (at %r) %s", i, distance, template.name)
+						searchAll = False
+					else: # pragma: no cover - should not happen
+						match = None
+				else:
+					# no template matches:
+					searchAll = False
+		if searchAll:
 			log(logLevel, " search template (%i) ...", len(self.__templates))
 			i = 0
 			for ddtempl in self.__templates:
@@ -457,6 +638,16 @@ class DateDetector(object):
 			if i and i != self.__lastTemplIdx:
 				i = self._reorderTemplate(i)
 			self.__lastTemplIdx = i
+			if frozen:
+				# found by other template - fallback from frozen template if it misses too often:
+				if ddtempl is not frozen[0] or distance != frozen[1]:
+					self.__frozenMisses += 1
+					if self.__frozenMisses >= self.FROZEN_MAX_MISSES:
+						logSys.info("  frozen date template %s misses %d lines, fallback to search in all templates",
+							frozen[0].name, self.__frozenMisses)
+						self._resetLearning()
+			elif self.__learnCnt is not None and len(self.__templates) > 1 and self.LEARN_LINES:
+				self._learnTemplate(ddtempl, distance)
 			# return tuple with match and template reference used for parsing:
 			return (match, template)
 
@@ -498,7 +689,15 @@ class DateDetector(object):
 		template = timeMatch[1]
 		if template is not None:
 			try:
-				date = template.getDate(line, timeMatch[0], default_tz=self.__default_tz)
+				date = None
+				if isinstance(template, DatePatternRegex):
+					if timeMatch[0]:
+						date = self._getCachedTime(template, timeMatch[0])
+					if date is None:
+						date = template.getDate(line, timeMatch[0], default_tz=self.__default_tz,
+							year_ctx=self.__yearCtx)
+				else:
+					date = template.getDate(line, timeMatch[0], default_tz=self.__default_tz)
 				if date is not None:
 					if logSys.getEffectiveLevel() <= logLevel: # pragma: no cover - heavy debug
 						logSys.log(logLevel, "  got time %f for %r using template %s",
@@ -508,6 +707,44 @@ class DateDetector(object):
 				pass
 		return None
 
+	def _getCachedTime(self, template, match):
+		"""Returns time using the epoch of the last seen minute (cached by time text
+		without seconds), so only the seconds will be added to it.
+
+		Consecutive lines mostly share the date up to the minute, so the building of
+		datetime, zone offset and mktime/timegm is done once per minute (the offset
+		of time zone and DST can change on minute boundary only).  Returns None if
+		date is not cacheable (no seconds, day or month, leap second), the conversion
+		of template is used then.
+		"""
+		fd = match.groupdict()
+		sec = fd.get('S')
+		if sec is None or fd.get('d') is None or (
+			fd.get('m') is None and fd.get('b') is None and fd.get('B') is None
+		):
+			return None
+		sec = int(sec)
+		if sec >= 60:
+			return None
+		# key is the matched text without seconds (and fraction) + template + tz:
+		b, e = match.span('S')
+		f = match.span('f') if fd.get('f') is not None else (e, e)
+		txt = match.string
+		key = (template, self.__default_tz,
+			txt[match.start():b] + '\0' + txt[e:f[0]] + txt[f[1]:match.end()])
+		now = MyTime.time()
+		c = self.__timeCache
+		if c is not None and c[0] == key and now >= c[1]:
+			return (c[2] + sec, match)
+		date = template.getDate(txt, match, default_tz=self.__default_tz, year_ctx=self.__yearCtx)
+		base = date[0] - sec
+		# assumed year depends on now (rollover to last year if date is in the future,
+		# compared as naive time, so the zone offset shifts it), don't cache future dates:
+		if fd.get('Y') is None and fd.get('y') is None and base + 60 > now + 3600:
+			return date
+		self.__timeCache = (key, now, base)
+		return date
+
 	def _reorderTemplate(self, num):
 		"""Reorder template (bubble up) in template list if hits grows enough.
 
@@ -286,6 +286,9 @@ class DatePatternRegex(DateTemplate):
 	_patternRE, _patternName = getTimePatternRE()
 	_patternRE = re.compile(_patternRE)
 
+	# optional fast converter of match (returns None to fallback to generic conversion):
+	fastParser = None
+
 	def __init__(self, pattern=None, **kwargs):
 		super(DatePatternRegex, self).__init__()
 		self._pattern = None
@@ -331,7 +334,7 @@ class DatePatternRegex(DateTemplate):
 		except Exception as e:
 			raise TypeError("Failed to set datepattern '%s' (may be an invalid format or unescaped percent char): %s" % (pattern, e))
 
-	def getDate(self, line, dateMatch=None, default_tz=None):
+	def getDate(self, line, dateMatch=None, default_tz=None, year_ctx=None):
 		"""Method to return the date for a log line.
 
 		This uses a custom version of strptime, using the named groups
@@ -342,6 +345,7 @@ class DatePatternRegex(DateTemplate):
 		line : str
 			Log line, of which the date should be extracted from.
 		default_tz: optionally used to correct timezone
+		year_ctx: optionally used to assume the year (YearContext of date detector)
 
 		Returns
 		-------
@@ -352,7 +356,11 @@ class DatePatternRegex(DateTemplate):
 		if not dateMatch:
 			dateMatch = self.matchDate(line)
 		if dateMatch:
-			return (reGroupDictStrptime(dateMatch.groupdict(), default_tz=default_tz),
+			if self.fastParser:
+				tm = self.fastParser(dateMatch, default_tz, year_ctx)
+				if tm is not None:
+					return (tm, dateMatch)
+			return (reGroupDictStrptime(dateMatch.groupdict(), default_tz=default_tz, year_ctx=year_ctx),
 				dateMatch)
 
 
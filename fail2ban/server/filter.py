@@ -24,15 +24,21 @@ __license__ = "GPL"
 import codecs
 import datetime
 import fcntl
+import fnmatch
+import glob
+import gzip
 import logging
+import multiprocessing
 import os
 import re
 import sys
 import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 
 from .actions import Actions
 from .failmanager import FailManagerEmpty, FailManager
-from .ipdns import DNSUtils, IPAddr, FileIPAddrSet
+from .ipdns import DNSUtils, IPAddr, IPAddrSet, FileIPAddrSet
 from .observer import Observers
 from .ticket import FailTicket
 from .jailthread import JailThread
@@ -41,7 +47,7 @@ from .mytime import MyTime
 from .failregex import FailRegex, Regex, RegexException
 from .action import CommandAction
 from .utils import Utils
-from ..helpers import getLogger, PREFER_ENC
+from ..helpers import getLogger, PREFER_ENC, _as_bool
 
 # Gets the instance of the logger.
 logSys = getLogger(__name__)
@@ -83,6 +89,16 @@ class Filter(JailThread):
 		## The ignore IP list.
 		self.__ignoreIpSet = set()
 		self.__ignoreIpList = []
+		## Subnets of ignore list (indexed by prefix) and other entries (DNS, file-sets):
+		self.__ignoreNetSet = IPAddrSet()
+		self.__ignoreIpOther = []
+		## Verdict cache of static ignore rules by IP, [lookups, hits] and file-sets (with sum of versions
+		## and time of next check for update):
+		self.__ignoreVerdict = Utils.Cache(maxCount=10000, maxTime=5*60)
+		self.__ignoreVerdictStat = [0, 0]
+		self.__ignoreFileSets = []
+		self.__ignoreFileVer = 0
+		self.__ignoreFileNextCheck = 0
 		## External command
 		self.__ignoreCommand = False
 		## Cache for ignoreip:
@@ -94,6 +110,10 @@ class Filter(JailThread):
 		## Store last time stamp, applicable for multi-line
 		self.__lastTimeText = ""
 		self.__lastDate = None
+		## Located but not yet converted time stamp (lazy date), pair of (timeText, timeMatch):
+		self.__pendDate = None
+		## Whether lazy date is applicable (None - to be checked, see _canLazyDate):
+		self.__lazyDate = None
 		## Next service (cleanup) time
 		self.__nextSvcTime = -(1<<63)
 		## if set, treat log lines without explicit time zone to be in this time zone
@@ -119,6 +139,8 @@ class Filter(JailThread):
 		self.onIgnoreRegex = None
 		## if true ignores obsolete failures (failure time < now - findTime):
 		self.checkFindTime = True
+		## if true the time found in line gets converted on demand only (if some failregex matched):
+		self.lazyDate = True
 		## shows that filter is in operation mode (processing new messages):
 		self.inOperation = True
 		## Ticks counter
@@ -175,6 +197,7 @@ class Filter(JailThread):
 			self.__prefRegex = Regex(value, useDns=self.__useDns)
 		else:
 			self.__prefRegex = None
+		self.__lazyDate = None
 
 	##
 	# Add a regular expression which matches the failure.
@@ -189,11 +212,13 @@ class Filter(JailThread):
 			regex = FailRegex(value, prefRegex=self.__prefRegex, multiline=multiLine,
 				useDns=self.__useDns)
 			self.__failRegex.append(regex)
+			self.__lazyDate = None
 		except RegexException as e:
 			logSys.error(e)
 			raise e
 
 	def delFailRegex(self, index=None):
+		self.__lazyDate = None
 		try:
 			# clear all:
 			if index is None:
@@ -375,6 +400,7 @@ class Filter(JailThread):
 		if int(value) <= 0:
 			raise ValueError("maxlines must be integer greater than zero")
 		self.__lineBufferSize = int(value)
+		self.__lazyDate = None
 		logSys.info("  maxLines: %i", self.__lineBufferSize)
 
 	##
@@ -501,6 +527,7 @@ class Filter(JailThread):
 	@ignoreSelf.setter
 	def ignoreSelf(self, value):
 		self.__ignoreSelf = value
+		self._resetIgnoreVerdict()
 
 	##
 	# Add an IP/DNS to the ignore list.
@@ -518,6 +545,8 @@ class Filter(JailThread):
 		if ip:
 			ip = DNSUtils.getIPsFromFile(ip.group(1)) # FileIPAddrSet
 			self.__ignoreIpList.append(ip)
+			self.__ignoreIpOther.append(ip)
+			self._resetIgnoreVerdict()
 			return
 		# Create IP address object
 		ip = IPAddr(ipstr)
@@ -532,24 +561,40 @@ class Filter(JailThread):
 			self.__ignoreIpSet.add(ip)
 		else:
 			self.__ignoreIpList.append(ip)
+			if ip.isValid:
+				self.__ignoreNetSet.add(ip)
+			else:
+				self.__ignoreIpOther.append(ip)
+		self._resetIgnoreVerdict()
 
 	def delIgnoreIP(self, ip=None):
 		# clear all:
 		if ip is None:
 			self.__ignoreIpSet.clear()
 			del self.__ignoreIpList[:]
+			self.__ignoreNetSet.set([])
+			del self.__ignoreIpOther[:]
+			self._resetIgnoreVerdict()
 			return
 		# delete by ip:
 		logSys.debug("  Remove %r from ignore list", ip)
 		# File?
 		if FileIPAddrSet.RE_FILE_IGN_IP.match(ip):
 			self.__ignoreIpList.remove(ip)
+			self.__ignoreIpOther.remove(ip)
+			self._resetIgnoreVerdict()
 			return
 		# IP / DNS
 		if ip in self.__ignoreIpSet:
 			self.__ignoreIpSet.remove(ip)
 		else:
 			self.__ignoreIpList.remove(ip)
+			ip = IPAddr(ip)
+			if ip.isValid:
+				self.__ignoreNetSet.discard(ip)
+			else:
+				self.__ignoreIpOther.remove(ip)
+		self._resetIgnoreVerdict()
 
 	def logIgnoreIp(self, ip, log_ignore, ignore_source="unknown source"):
 		if log_ignore:
@@ -575,7 +620,61 @@ class Filter(JailThread):
 			ip = IPAddr(ip)
 		return self._inIgnoreIPList(ip, ticket, log_ignore)
 
+	def _getIgnoreVerdict(self, ip):
+		"""Return source ignoring the IP by static rules (ignoreself, ignoreip) or False.
+
+		The verdict is cached by IP (bounded, expires together with DNS resolution), so
+		repeated offenders don't redo the checks.  Cache gets reset on modification of
+		the ignore list and by reload of some file-set.
+		"""
+		# reload modified file-sets (check their versions, only if check of some set is due):
+		if self.__ignoreFileSets and MyTime.time() > self.__ignoreFileNextCheck:
+			ver = 0
+			for fs in self.__ignoreFileSets:
+				fs.load()
+				ver += fs.version
+			self.__ignoreFileNextCheck = min(fs._nextCheck for fs in self.__ignoreFileSets)
+			if ver != self.__ignoreFileVer:
+				self.__ignoreFileVer = ver
+				self.__ignoreVerdict.clear()
+		stat = self.__ignoreVerdictStat
+		stat[0] += 1
+		src = self.__ignoreVerdict.get(ip)
+		if src is not None:
+			stat[1] += 1
+			return src
+		src = False
+		# check own IPs should be ignored and 'ip' is self IP:
+		if self.__ignoreSelf and ip in DNSUtils.getSelfIPs():
+			src = "ignoreself rule"
+		# check if the IP is covered by ignore IP (in set or in subnet/dns):
+		elif ip in self.__ignoreIpSet:
+			src = "ip"
+		# subnets (prefix index):
+		elif self.__ignoreNetSet.hasSubNet and ip in self.__ignoreNetSet:
+			src = "ip"
+		else:
+			for net in self.__ignoreIpOther:
+				if ip.isInNet(net):
+					src = net.instanceType
+					break
+		self.__ignoreVerdict.set(ip, src)
+		return src
+
+	def _resetIgnoreVerdict(self):
+		self.__ignoreVerdict.clear()
+		self.__ignoreFileSets = [fs for fs in self.__ignoreIpOther if isinstance(fs, FileIPAddrSet)]
+		self.__ignoreFileNextCheck = 0
+
 	def _inIgnoreIPList(self, ip, ticket, log_ignore=True):
+		# static rules (cached verdict by IP):
+		src = self._getIgnoreVerdict(ip)
+		if src:
+			self.logIgnoreIp(ip, log_ignore, ignore_source=src)
+			return True
+		if not self.__ignoreCommand:
+			return False
+
 		aInfo = None
 		# cached ?
 		if self.__ignoreCache:
@@ -590,59 +689,77 @@ class Filter(JailThread):
 			if v is not None:
 				return v
 
-		# check own IPs should be ignored and 'ip' is self IP:
-		if self.__ignoreSelf and ip in DNSUtils.getSelfIPs():
-			self.logIgnoreIp(ip, log_ignore, ignore_source="ignoreself rule")
-			if self.__ignoreCache: c.set(key, True)
-			return True
-
-		# check if the IP is covered by ignore IP (in set or in subnet/dns):
-		if ip in self.__ignoreIpSet:
-			self.logIgnoreIp(ip, log_ignore, ignore_source="ip")
-			return True
-		for net in self.__ignoreIpList:
-			if ip.isInNet(net):
-				self.logIgnoreIp(ip, log_ignore, ignore_source=(net.instanceType))
-				if self.__ignoreCache: c.set(key, True)
-				return True
-
-		if self.__ignoreCommand:
-			if ticket:
-				if not aInfo: aInfo = Actions.ActionInfo(ticket, self.jail)
-				command = CommandAction.replaceDynamicTags(self.__ignoreCommand, aInfo)
-			else:
-				if not aInfo: aInfo = { 'ip': ip }
-				command = CommandAction.replaceTag(self.__ignoreCommand, aInfo)
-			logSys.debug('ignore command: %s', command)
-			ret, ret_ignore = CommandAction.executeCmd(command, success_codes=(0, 1))
-			ret_ignore = ret and ret_ignore == 0
-			self.logIgnoreIp(ip, log_ignore and ret_ignore, ignore_source="command")
-			if self.__ignoreCache: c.set(key, ret_ignore)
-			return ret_ignore
-
-		if self.__ignoreCache: c.set(key, False)
-		return False
-
-	def _logWarnOnce(self, nextLTM, *args):
+		if ticket:
+			if not aInfo: aInfo = Actions.ActionInfo(ticket, self.jail)
+			command = CommandAction.replaceDynamicTags(self.__ignoreCommand, aInfo)
+		else:
+			if not aInfo: aInfo = { 'ip': ip }
+			command = CommandAction.replaceTag(self.__ignoreCommand, aInfo)
+		logSys.debug('ignore command: %s', command)
+		ret, ret_ignore = CommandAction.executeCmd(command, success_codes=(0, 1))
+		ret_ignore = ret and ret_ignore == 0
+		self.logIgnoreIp(ip, log_ignore and ret_ignore, ignore_source="command")
+		if self.__ignoreCache: c.set(key, ret_ignore)
+		return ret_ignore
+
+	def _logWarnOnce(self, nextLTM, *args, now=None):
 		"""Log some issue as warning once per day, otherwise level 7"""
-		if MyTime.time() < getattr(self, nextLTM, 0):
+		if now is None: now = MyTime.time()
+		if now < getattr(self, nextLTM, 0):
 			if logSys.getEffectiveLevel() <= 7: logSys.log(7, *(args[0]))
 		else:
-			setattr(self, nextLTM, MyTime.time() + 24*60*60)
+			setattr(self, nextLTM, now + 24*60*60)
 			for args in args:
 				logSys.warning('[%s] ' + args[0], self.jailName, *args[1:])
 
+	def _canLazyDate(self):
+		"""Check the date can be converted lazy (only if some failregex matched).
+
+		Not applicable for multi-line buffer and failregex with mlfid, where obsolete
+		lines (ignored before search) would affect the state of further lines.
+		"""
+		if not self.lazyDate or self.__lineBufferSize > 1:
+			return False
+		for r in self.__failRegex + ([self.__prefRegex] if self.__prefRegex else []):
+			if 'mlfid' in r._regexObj.groupindex:
+				return False
+		return True
+
+	def _getLastDate(self):
+		"""Return last known time (converts pending lazy date of previous line if needed)
+		"""
+		if self.__pendDate:
+			self._resolvePendDate()
+		return self.__lastDate
+
+	def _resolvePendDate(self):
+		"""Convert located (pending) time stamp of lazy date, returns the time or None
+		"""
+		m, timeMatch = self.__pendDate
+		self.__pendDate = None
+		date = self.dateDetector.getTime(m, timeMatch)
+		if date is not None:
+			date = date[0]
+			self.__lastTimeText = m
+			self.__lastDate = date
+			return date
+		logSys.error("findFailure failed to parse timeText: %s", m)
+		return None
+
 	def processLine(self, line, date=None):
 		"""Split the time portion from log msg and return findFailures on them
 		"""
 		logSys.log(7, "Working on line %r", line)
 
+		# current time (once per line, cached per chunk if in coarse clock block):
+		now = MyTime.coarse()
 		noDate = False
 		if date:
 			tupleLine = line
 			line = "".join(line)
 			self.__lastTimeText = tupleLine[1]
 			self.__lastDate = date
+			self.__pendDate = None
 		else:
 			# try to parse date:
 			timeMatch = self.dateDetector.matchTime(line)
@@ -652,7 +769,13 @@ class Filter(JailThread):
 				e = m.end(1)
 				m = line[s:e]
 				tupleLine = (line[:s], m, line[e:])
-				if m: # found and not empty - retrieve date:
+				lazy = self.__lazyDate
+				if lazy is None:
+					lazy = self.__lazyDate = self._canLazyDate()
+				if m and lazy: # found and not empty - convert on demand only (if matched):
+					self.__pendDate = (m, timeMatch)
+				elif m: # found and not empty - retrieve date:
+					self.__pendDate = None
 					date = self.dateDetector.getTime(m, timeMatch)
 					if date is not None:
 						# Lets get the time part
@@ -662,29 +785,69 @@ class Filter(JailThread):
 					else:
 						logSys.error("findFailure failed to parse timeText: %s", m)
 				# matched empty value - date is optional or not available - set it to last known or now:
-				elif self.__lastDate and self.__lastDate > MyTime.time() - 60:
+				elif self._getLastDate() and self.__lastDate > now - 60:
 					# set it to last known:
 					tupleLine = ("", self.__lastTimeText, line)
 					date = self.__lastDate
 				else:
 					# set it to now:
-					date = MyTime.time()
+					date = now
 			else:
 				tupleLine = ("", "", line)
 			# still no date - try to use last known:
-			if date is None:
+			if date is None and not self.__pendDate:
 				noDate = True
-				if self.__lastDate and self.__lastDate > MyTime.time() - 60:
+				if self._getLastDate() and self.__lastDate > now - 60:
 					tupleLine = ("", self.__lastTimeText, line)
 					date = self.__lastDate
 				elif self.checkFindTime and self.inOperation:
-					date = MyTime.time()
+					date = now
 		
+		if self.__pendDate:
+			# save last line (lazy convert of process line tuple to string on demand):
+			self.processedLine = lambda: "".join(tupleLine[::2])
+			failList = self.findFailure(tupleLine, None)
+			if not failList:
+				return failList
+			# matched - convert the date now:
+			date = self._resolvePendDate()
+			if date is None:
+				# same as not found (try to use last known, simulate now in operation):
+				self._logWarnOnce("_next_noTimeWarn",
+					("Found a match but no valid date/time found for %r.", tupleLine[1]),
+					("Match without a timestamp: %s", line),
+					("Please try setting a custom date pattern (see man page jail.conf(5)).",)
+				)
+				if self.__lastDate and self.__lastDate > now - 60:
+					date = self.__lastDate
+				elif self.checkFindTime and self.inOperation:
+					date = now
+				elif self.checkFindTime:
+					return []
+			date = self._checkLineDate(date, line, now)
+			if date is False:
+				return []
+			for fail in failList:
+				fail[2] = date
+			return failList
+
+		date = self._checkLineDate(date, line, now)
+		if date is False:
+			return []
+
+		# save last line (lazy convert of process line tuple to string on demand):
+		self.processedLine = lambda: "".join(tupleLine[::2])
+		return self.findFailure(tupleLine, date, noDate=noDate)
+
+	def _checkLineDate(self, date, line, now):
+		"""Check the time of line for timing issues, returns the time (simulated now if in operation
+		and too large deviation from now) or False if line is too old (ignored in initialization phase)
+		"""
 		if self.checkFindTime and date is not None:
 			# if in operation (modifications have been really found):
 			if self.inOperation:
 				# if weird date - we'd simulate now for timing issue (too large deviation from now):
-				delta = int(date - MyTime.time())
+				delta = int(date - now)
 				if abs(delta) > 60:
 					# log timing issue as warning once per day:
 					self._logWarnOnce("_next_simByTimeWarn",
@@ -694,54 +857,34 @@ class Filter(JailThread):
 						 "latency" if -3300 <= delta < 0 else "timezone"
 						 ),
 						("Please check a jail for a timing issue. Line with odd timestamp: %s",
-						 line))
+						 line), now=now)
 					# simulate now as date:
-					date = MyTime.time()
+					date = now
 					self.__lastDate = date
 			else:
 				# in initialization (restore) phase, if too old - ignore:
-				if date < MyTime.time() - self.getFindTime():
+				if date < now - self.getFindTime():
 					# log time zone issue as warning once per day:
 					self._logWarnOnce("_next_ignByTimeWarn",
 						("Ignoring all log entries older than %ss; these are probably" +
 						 " messages generated while fail2ban was not running.",
 							self.getFindTime()),
 						("Please check a jail for a timing issue. Line with odd timestamp: %s",
-						 line))
+						 line), now=now)
 					# ignore - too old (obsolete) entry:
-					return []
-
-		# save last line (lazy convert of process line tuple to string on demand):
-		self.processedLine = lambda: "".join(tupleLine[::2])
-		return self.findFailure(tupleLine, date, noDate=noDate)
+					return False
+		return date
 
 	def processLineAndAdd(self, line, date=None):
 		"""Processes the line for failures and populates failManager
 		"""
 		try:
 			for (_, ip, unixTime, fail) in self.processLine(line, date):
-				logSys.debug("Processing line with time:%s and ip:%s", 
-						unixTime, ip)
-				# ensure the time is not in the future, e. g. by some estimated (assumed) time:
-				if self.checkFindTime and unixTime > MyTime.time():
-					unixTime = MyTime.time()
-				tick = FailTicket(ip, unixTime, data=fail)
-				if self._inIgnoreIPList(ip, tick):
-					continue
-				logSys.info(
-					"[%s] Found %s - %s", self.jailName, ip, MyTime.time2str(unixTime)
-				)
-				attempts = self.failManager.addFailure(tick)
-				# avoid RC on busy filter (too many failures) - if attempts for IP/ID reached maxretry,
-				# we can speedup ban, so do it as soon as possible:
-				if attempts >= self.failManager.getMaxRetry():
-					self.performBan(ip)
-				# report to observer - failure was found, for possibly increasing of it retry counter (asynchronous)
-				if Observers.Main is not None:
-					Observers.Main.add('failureFound', self.jail, tick)
+				self._addFailure(ip, unixTime, fail)
 			self.procLines += 1
-			# every 100 lines check need to perform service tasks:
+			# every 100 lines check need to perform service tasks (and refresh coarse clock):
 			if self.procLines % 100 == 0:
+				MyTime.refreshCoarse()
 				self.performSvc()
 			# reset (halve) error counter (successfully processed line):
 			if self._errors:
@@ -752,6 +895,31 @@ class Filter(JailThread):
 			# incr common error counter:
 			self.commonError()
 
+	def _addFailure(self, ip, unixTime, fail):
+		"""Adds found failure to failManager (if not ignored), bans if maxretry reached
+		"""
+		logSys.debug("Processing line with time:%s and ip:%s", 
+				unixTime, ip)
+		# ensure the time is not in the future, e. g. by some estimated (assumed) time:
+		if self.checkFindTime:
+			now = MyTime.coarse()
+			if unixTime > now:
+				unixTime = now
+		tick = FailTicket(ip, unixTime, data=fail)
+		if self._inIgnoreIPList(ip, tick):
+			return
+		logSys.info(
+			"[%s] Found %s - %s", self.jailName, ip, MyTime.time2str(unixTime)
+		)
+		attempts = self.failManager.addFailure(tick)
+		# avoid RC on busy filter (too many failures) - if attempts for IP/ID reached maxretry,
+		# we can speedup ban, so do it as soon as possible:
+		if attempts >= self.failManager.getMaxRetry():
+			self.performBan(ip)
+		# report to observer - failure was found, for possibly increasing of it retry counter (asynchronous)
+		if Observers.Main is not None:
+			Observers.Main.add('failureFound', self.jail, tick)
+
 	def commonError(self, reason="common", exc=None):
 		# incr error counter, stop processing (going idle) after 100th error :
 		self._errors += 1
@@ -999,16 +1167,41 @@ class Filter(JailThread):
 			return (self.failManager.size(), self.failManager.getFailTotal())
 		ret = [("Currently failed", self.failManager.size()),
 		       ("Total failed", self.failManager.getFailTotal())]
+		# hit rate of ignore verdict cache (extended flavors only, if something was checked):
+		lookups, hits = self.__ignoreVerdictStat
+		if lookups and flavor not in ("short", "basic"):
+			ret.append(("Ignore cache hits", "%d of %d (%d%%)" % (hits, lookups, hits * 100 // lookups)))
 		return ret
 
 
 class FileFilter(Filter):
 
-	def __init__(self, jail, **kwargs):
+	## Minimal size of backlog region processed by one worker of parallel catch-up:
+	CATCHUP_MIN_SIZE = 1024*1024
+	## Interval (in seconds) between discovery passes of log globs:
+	GLOB_CHECK_INTERVAL = 5
+
+	def __init__(self, jail, keepopen=False, catchup=0, rotated=False, **kwargs):
 		Filter.__init__(self, jail, **kwargs)
 		## The log file path.
 		self.__logs = dict()
 		self.__autoSeek = dict()
+		## Keep log files open between processing (persistent handles, backend option):
+		self.__keepOpen = _as_bool(keepopen)
+		## Count of worker processes for parallel catch-up of backlog (backend option):
+		catchup = str(catchup).lower()
+		self.__catchup = int(catchup) if catchup.isdigit() else (
+			(os.cpu_count() or 1) if catchup == 'auto' or _as_bool(catchup) else 0)
+		## Read rotated predecessor of log by start (if log is rotated within find time, backend option):
+		self.__readRotated = _as_bool(rotated)
+		## Glob patterns of log files (discovered at runtime), pattern -> [tail, {path: misses}, initial]:
+		self.__logGlobs = dict()
+		self.__nextGlobCheck = 0
+
+	def clearAllParams(self):
+		super(FileFilter, self).clearAllParams()
+		# globs are added again by reload (files found by them remain, if still matching):
+		self.__logGlobs = dict()
 
 	##
 	# Add a log file path
@@ -1022,12 +1215,14 @@ class FileFilter(Filter):
 			else:
 				logSys.error(path + " already exists")
 		else:
-			log = FileContainer(path, self.getLogEncoding(), tail)
+			log = FileContainer(path, self.getLogEncoding(), tail, keepOpen=self.__keepOpen)
 			db = self.jail.database
 			if db is not None:
 				lastpos = db.addLog(self.jail, log)
 				if lastpos and not tail:
 					log.setPos(lastpos)
+				# restore time index of the file (if hash is not changed):
+				log.setTimeIndex(db.getLogTimeIndex(log))
 			self.__logs[path] = log
 			logSys.info("Added logfile: %r (pos = %s, hash = %s)" , path, log.getPos(), log.getHash())
 			if autoSeek and not tail:
@@ -1049,6 +1244,12 @@ class FileFilter(Filter):
 			log = self.__logs.pop(path)
 		except KeyError:
 			return
+		# close persistent handle:
+		log.release()
+		# write pending position and forget checkpoint state of the log:
+		db = self.jail.database
+		if db is not None:
+			db.delLog(self.jail, path)
 		logSys.info("Removed logfile: %r", path)
 		self._delLogPath(path)
 		return
@@ -1058,6 +1259,110 @@ class FileFilter(Filter):
 		# to be overridden by backends
 		pass
 
+	##
+	# Add a glob pattern of log files
+	#
+	# Files matching the pattern are monitored, new files are discovered at runtime
+	# (by service of the filter, see checkLogGlobs).
+	# @param pattern glob pattern of log files
+	# @param tail start at the tail of files found initially (new files are read from begin)
+
+	def addLogGlob(self, pattern, tail=False):
+		if pattern in self.__logGlobs:
+			logSys.error(pattern + " already exists")
+			return
+		self.__logGlobs[pattern] = [tail, {}, True]
+		self.checkLogGlobs(force=True)
+
+	##
+	# Delete a glob pattern of log files (and files found by it)
+	#
+	# @param pattern glob pattern of log files
+
+	def delLogGlob(self, pattern):
+		try:
+			g = self.__logGlobs.pop(pattern)
+		except KeyError:
+			return
+		for path in g[1]:
+			if not any(path in o[1] for o in self.__logGlobs.values()):
+				self.delLogPath(path)
+
+	def getLogGlobs(self):
+		return list(self.__logGlobs.keys())
+
+	def checkLogGlobs(self, force=False):
+		"""Discovers new (and vanished) files matching the log globs.
+
+		Patterns are grouped by directory, each directory is read once per pass
+		(without stat of entries not matching any pattern). A file found by glob is
+		removed if it is missing in two subsequent passes (not by rotation).
+
+		Returns
+		-------
+		int
+			Count of added files.
+		"""
+		if not self.__logGlobs:
+			return 0
+		tm = MyTime.time()
+		if not force and tm < self.__nextGlobCheck:
+			return 0
+		self.__nextGlobCheck = tm + self.GLOB_CHECK_INTERVAL
+		found = {}
+		dirs = {}
+		for pattern in self.__logGlobs:
+			found[pattern] = paths = set()
+			d, name = os.path.split(pattern)
+			if glob.has_magic(d):
+				# wildcard in directory part - expand it completely:
+				paths.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+			else:
+				dirs.setdefault(d, []).append((re.compile(fnmatch.translate(name)).match,
+					name.startswith('.'), paths))
+		for d, pats in dirs.items():
+			try:
+				with os.scandir(d or os.curdir) as it:
+					for e in it:
+						for match, hidden, paths in pats:
+							if match(e.name) and (hidden or e.name[0] != '.') and e.is_file():
+								paths.add(os.path.join(d, e.name))
+			except OSError as e:
+				logSys.debug("[%s] Unable to read directory %r: %s", self.jailName, d, e)
+		added = 0
+		reloading = getattr(self, '_reload_logs', {})
+		for pattern, paths in found.items():
+			g = self.__logGlobs[pattern]
+			tail, known, initial = g
+			for path in paths:
+				if path in known:
+					known[path] = 0
+					continue
+				# other source of the file (logpath or other glob):
+				if path in self.__logs and path not in reloading:
+					continue
+				if not initial:
+					logSys.info("[%s] Found new log file %r matching %r", self.jailName, path, pattern)
+				try:
+					self.addLogPath(path, tail if initial else False)
+				except (IOError, OSError) as e:
+					logSys.error("[%s] Unable to add log file %r: %s", self.jailName, path, e)
+					continue
+				known[path] = 0
+				added += 1
+			g[2] = False
+			for path in [path for path in known if path not in paths]:
+				known[path] += 1
+				if known[path] > 1:
+					del known[path]
+					self.delLogPath(path)
+		return added
+
+	def performSvc(self, force=False):
+		super(FileFilter, self).performSvc(force)
+		# discover new log files matching globs:
+		self.checkLogGlobs(force)
+
 	##
 	# Get the log file names
 	#
@@ -1144,6 +1449,9 @@ class FileFilter(Filter):
 					# if default, seek to "current time" - "find time":
 					if isinstance(startTime, bool):
 						startTime = MyTime.time() - self.getFindTime()
+					# process rotated predecessor (contains failures within find time if rotated recently):
+					if self.__readRotated:
+						self._getFailuresRotated(log, startTime)
 					# prevent completely read of big files first time (after start of service), 
 					# initial seek to start time using half-interval search algorithm:
 					try:
@@ -1154,36 +1462,187 @@ class FileFilter(Filter):
 						logSys.exception(e)
 						return False
 
+			# process backlog in parallel (worker processes), if enabled:
+			if has_content and self.__catchup > 1 and not log.inOperation and inOperation is None:
+				self._catchupLog(log)
+
 			if has_content:
-				while not self.idle:
-					line = log.readline()
-					if not self.active: break; # jail has been stopped
-					if line is None:
-						# The jail reached the bottom, simply set in operation for this log
-						# (since we are first time at end of file, growing is only possible after modifications):
-						log.inOperation = True
-						break
-					# acquire in operation from log and process:
-					self.inOperation = inOperation if inOperation is not None else log.inOperation
-					self.processLineAndAdd(line)
+				# current time is read once per chunk (refreshed every 100 lines):
+				with MyTime.coarseClock():
+					while not self.idle:
+						line = log.readline()
+						if not self.active: break; # jail has been stopped
+						if line is None:
+							# The jail reached the bottom, simply set in operation for this log
+							# (since we are first time at end of file, growing is only possible after modifications):
+							log.inOperation = True
+							break
+						# acquire in operation from log and process:
+						self.inOperation = inOperation if inOperation is not None else log.inOperation
+						self.processLineAndAdd(line)
+						# line starts new step of time index (used by seekToTime):
+						if log.indexPos is not None:
+							self._addTimeIndex(log, line)
 		finally:
 			log.close()
-		if self.jail.database is not None:
-			self._pendDBUpdates[log] = 1
-			if (
-				self.ticks % 100 == 0
-				or MyTime.time() >= self._nextUpdateTM
-				or not self.active
-			):
-				self._updateDBPending()
-				self._nextUpdateTM = MyTime.time() + Utils.DEFAULT_SLEEP_TIME * 5
+		db = self.jail.database
+		if db is not None:
+			# position will be written by next checkpoint (batched for all jails):
+			db.pendLog(self.jail, log)
+			db.checkpointLogs(force=not self.active, jail=None if self.active else self.jail)
+		return True
+
+	def _getLineTime(self, line):
+		(timeMatch, template) = self.dateDetector.matchTime(line)
+		if timeMatch:
+			dateTimeMatch = self.dateDetector.getTime(
+				line[timeMatch.start():timeMatch.end()], (timeMatch, template))
+			if dateTimeMatch:
+				return dateTimeMatch[0]
+		return None
+
+	def _addTimeIndex(self, log, line):
+		pos = log.indexPos
+		unixTime = self._getLineTime(line)
+		if unixTime is not None:
+			log.addTimeIndex(pos, unixTime)
+		log.indexPos = None
+
+	def _getFailuresRotated(self, log, startTime):
+		"""Processes lines newer than startTime of rotated predecessor of the log.
+
+		Invoked by start only, if the log has no known position and its first line
+		is newer than startTime (so the log was rotated within find time).
+		The predecessor (`auth.log.1` or compressed `auth.log.1.gz`, `.bz2`, `.xz`,
+		`.zst`) is decompressed as stream, the start position is found by seekToTime.
+		"""
+		if log.getPos():
+			return False
+		log.seek(0, False)
+		line = log.readline(False)
+		unixTime = self._getLineTime(line) if line else None
+		if unixTime is None or unixTime <= startTime:
+			return False
+		path = _rotatedLogPath(log.getFileName())
+		if path is None:
+			return False
+		rot = None
+		lines = 0
+		try:
+			rot = FileContainer(path, self.getLogEncoding(), doOpen=True)
+			# rotated file is complete (last line may have no new-line):
+			rot.waitForLineEnd = False
+			self.seekToTime(rot, startTime)
+			pos = rot.getPos()
+			self.inOperation = False
+			while self.active:
+				line = rot.readline()
+				if line is None:
+					break
+				self.processLineAndAdd(line)
+				lines += 1
+		except Exception as e:
+			logSys.warning("[%s] Error reading rotated log %r: %r", self.jailName, path, e)
+			return False
+		finally:
+			if rot:
+				rot.release()
+		logSys.info("[%s] Read rotated log %r: %s lines processed (from pos %s)",
+			self.jailName, path, lines, pos)
 		return True
 
+	def _catchupLog(self, log):
+		"""Processes the backlog of log (till current end of file) in worker processes.
+
+		The region is split into chunks (aligned to begin of entry, so a line with time stamp),
+		each chunk is processed in own process, found failures are merged to failManager in
+		timestamp order.  The position of log is set to the end of processed region (or remains
+		unchanged if parallel processing is not applicable, so it'd be processed as usual).
+		"""
+		# multi-line failures can't be split into chunks (buffer and mlfid-cache are not shared):
+		if (self.dateDetector is None or self.getMaxLines() > 1
+			or self.prefRegex and '<mlfid>' in self.prefRegex.getRegex()
+			or any('<mlfid>' in r for r in self.getFailRegex())
+		):
+			return False
+		start = log.tell()
+		size = log.getFileSize()
+		cnt = min(self.__catchup, (size - start) // self.CATCHUP_MIN_SIZE)
+		if cnt < 2:
+			return False
+		# boundaries of chunks (seek to start of next line, inner ones to start of next entry):
+		bounds = [start]
+		for i in range(1, cnt+1):
+			pos = log.seek(start + (size - start) * i // cnt - 1)
+			if i < cnt:
+				pos = self._catchupAlign(log, pos)
+			if pos is not None and pos > bounds[-1]:
+				bounds.append(pos)
+		end = bounds[-1]
+		# the workers are spawned (no fork of multi-threaded server), so filter is recreated there:
+		try:
+			with ProcessPoolExecutor(len(bounds)-1, mp_context=multiprocessing.get_context('spawn'),
+				initializer=_catchupInit, initargs=(self._catchupConfig(),)
+			) as pool:
+				results = list(pool.map(_catchupWorker, 
+					[log.getFileName()] * (len(bounds)-1), bounds[:-1], bounds[1:]))
+		except Exception as e: # pragma: no cover
+			logSys.warning("[%s] Parallel catch-up of %r failed, continue serial: %r",
+				self.jailName, log.getFileName(), e)
+			log.seek(start, False)
+			return False
+		# merge failures in timestamp order:
+		fails = []
+		for lines, chunkFails in results:
+			self.procLines += lines
+			fails.extend(chunkFails)
+		fails.sort(key=lambda f: f[1])
+		self.inOperation = False
+		for ip, unixTime, fail in fails:
+			if isinstance(fail.get('ip'), tuple):
+				fail['ip'] = _catchupUnpackID(fail['ip'])
+			self._addFailure(_catchupUnpackID(ip), unixTime, fail)
+		log.seek(end, False)
+		logSys.info("[%s] Catch-up of %r: %s bytes processed by %s workers, %s failures found",
+			self.jailName, log.getFileName(), end - start, len(bounds)-1, len(fails))
+		return True
+
+	def _catchupAlign(self, log, pos):
+		"""Returns position of the next line with time stamp starting from pos (begin of line).
+
+		Lines without time stamp (continuation of entry, using time of previous line) remain
+		so in the same chunk as the line they belong to.  Returns None if no such line found.
+		"""
+		while True:
+			line = log.readline()
+			if line is None:
+				return None
+			m = self.dateDetector.matchTime(line)[0]
+			if m and m.end(1) > m.start(1):
+				return pos
+			pos = log.tell()
+
+	def _catchupConfig(self):
+		"""Returns configuration of the filter (picklable) to recreate it in a worker process.
+		"""
+		return dict(
+			encoding=self.getLogEncoding(), useDns=self.getUseDns(), findTime=self.getFindTime(),
+			prefRegex=self.prefRegex.getRegex() if self.prefRegex else None,
+			failRegex=self.getFailRegex(), ignoreRegex=self.getIgnoreRegex(),
+			dateDetector=self.dateDetector, returnRawHost=self.returnRawHost,
+			checkAllRegex=self.checkAllRegex, ignorePending=self.ignorePending,
+			checkFindTime=self.checkFindTime, lazyDate=self.lazyDate,
+			myTime=MyTime.myTime
+		)
+
 	##
 	# Seeks to line with date (search using half-interval search algorithm), to start polling from it
 	#
 
 	def seekToTime(self, container, date, accuracy=3):
+		# compressed stream - seek back is expensive (restarts decompression):
+		if container.compressed:
+			return self._seekToTimeStream(container, date)
 		fs = container.getFileSize()
 		if logSys.getEffectiveLevel() <= logging.DEBUG:
 			logSys.debug("Seek to find time %s (%s), file size %s", date, 
@@ -1192,6 +1651,12 @@ class FileFilter(Filter):
 			return
 		minp = container.getPos()
 		maxp = fs
+		# narrow the search region using sparse time index of the file (if known):
+		lo, hi = container.getTimeIndexRange(date, fs)
+		if lo is not None and lo > minp:
+			minp = lo
+		if hi is not None and minp < hi < maxp:
+			maxp = hi
 		tryPos = minp
 		lastPos = -1
 		foundPos = 0
@@ -1270,6 +1735,32 @@ class FileFilter(Filter):
 			logSys.debug("Position %s from %s, found time %s (%s) within %s seeks", lastPos, fs, foundTime, 
 				(MyTime.time2str(foundTime) if foundTime is not None else ''), cntr)
 		
+	def _seekToTimeStream(self, container, date):
+		"""Seeks in compressed stream (forwards only) to the last sample with time
+		before date, sampled each index step (ca. 1MB of decompressed data).
+		"""
+		step = container.TIME_INDEX_STEP
+		minp = pos = 0
+		while True:
+			pos = container.seek(pos + step)
+			# within next 5 lines try to find any legal datetime:
+			unixTime = None
+			for i in range(5):
+				line = container.readline(False)
+				if line is None:
+					break
+				unixTime = self._getLineTime(line)
+				if unixTime is not None:
+					break
+			if unixTime is not None:
+				if unixTime >= date:
+					break
+				minp = pos
+			elif line is None:
+				break
+		container.seek(minp, False)
+		container.setPos(minp)
+
 	def status(self, flavor="basic"):
 		"""Status of Filter plus files being monitored.
 		"""
@@ -1280,26 +1771,82 @@ class FileFilter(Filter):
 		ret.append(("File list", path))
 		return ret
 
-	def _updateDBPending(self):
-		"""Apply pending updates (log position) to database.
-		"""
-		db = self.jail.database
-		while True:
-			try:
-				log, args = self._pendDBUpdates.popitem()
-			except KeyError:
-				break
-			db.updateLog(self.jail, log)
-			
 	def afterStop(self):
 		"""Stop monitoring of log-file(s). Invoked after run method.
 		"""
+		# ensure positions of pending logs are up-to-date:
+		db = self.jail.database
+		if db is not None:
+			db.checkpointLogs(force=True, jail=self.jail)
 		# stop files monitoring:
 		for path in list(self.__logs.keys()):
 			self.delLogPath(path)
-		# ensure positions of pending logs are up-to-date:
-		if self._pendDBUpdates and self.jail.database:
-			self._updateDBPending()
+
+## Filter of parallel catch-up (created in spawned worker process by _catchupInit):
+_catchupFilter = None
+
+def _catchupPackID(ip):
+	# IPAddr is pickled as str, so transfer also its kind (raw or not) to restore it:
+	if isinstance(ip, IPAddr):
+		return (str(ip), ip.family == IPAddr.CIDR_RAW)
+	return (ip, None)
+
+def _catchupUnpackID(ip):
+	ip, raw = ip
+	if raw is None:
+		return ip
+	return IPAddr(ip, IPAddr.CIDR_RAW if raw else IPAddr.CIDR_UNSPEC)
+
+def _catchupInit(cfg):
+	"""Creates the filter from configuration of the jail filter (initializer of worker process).
+	"""
+	global _catchupFilter
+	if cfg['myTime'] is not None:
+		MyTime.setTime(cfg['myTime'])
+	flt = Filter(None, useDns=cfg['useDns'])
+	flt.setLogEncoding(cfg['encoding'])
+	flt.setFindTime(cfg['findTime'])
+	flt.prefRegex = cfg['prefRegex']
+	for r in cfg['failRegex']:
+		flt.addFailRegex(r)
+	for r in cfg['ignoreRegex']:
+		flt.addIgnoreRegex(r)
+	flt.dateDetector = cfg['dateDetector']
+	for k in ('returnRawHost', 'checkAllRegex', 'ignorePending', 'checkFindTime', 'lazyDate'):
+		setattr(flt, k, cfg[k])
+	flt.inOperation = False
+	_catchupFilter = flt
+
+def _catchupWorker(fileName, start, end):
+	"""Processes lines of the log between start and end (worker process of catch-up).
+
+	Returns count of processed lines and found failures as tuples (fid, time, data).
+	"""
+	flt = _catchupFilter
+	log = FileContainer(fileName, flt.getLogEncoding())
+	lines = 0
+	fails = []
+	try:
+		log.open(forcePos=start)
+		with MyTime.coarseClock():
+			while log.tell() < end:
+				line = log.readline()
+				if line is None:
+					break
+				lines += 1
+				if lines % 100 == 0:
+					MyTime.refreshCoarse()
+				try:
+					for (_, ip, unixTime, fail) in flt.processLine(line):
+						if isinstance(fail.get('ip'), IPAddr):
+							fail['ip'] = _catchupPackID(fail['ip'])
+						fails.append((_catchupPackID(ip), unixTime, fail))
+				except Exception as e: # pragma: no cover
+					logSys.error("Failed to process line: %r, caught exception: %r", line, e)
+	finally:
+		log.close()
+	return lines, fails
+
 
 ##
 # FileContainer class.
@@ -1322,22 +1869,84 @@ except ImportError: # pragma: no cover
 	import md5
 	md5sum = md5.new
 
+# openers of compressed (rotated) log files by suffix (streaming decompression):
+_COMPRESSED_OPENERS = {'.gz': gzip.open}
+try:
+	import bz2
+	_COMPRESSED_OPENERS['.bz2'] = bz2.open
+except ImportError: # pragma: no cover
+	pass
+try:
+	import lzma
+	_COMPRESSED_OPENERS['.xz'] = lzma.open
+except ImportError: # pragma: no cover
+	pass
+try:
+	from compression import zstd # python >= 3.14
+	_COMPRESSED_OPENERS['.zst'] = zstd.open
+except ImportError: # pragma: no cover
+	try:
+		import pyzstd
+		_COMPRESSED_OPENERS['.zst'] = pyzstd.open
+	except ImportError:
+		pass
+_COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz', '.zst')
+
+
+def _rotatedLogPath(path):
+	"""Returns path of rotated predecessor of the log (the newest of `path.1`,
+	`path.1.gz` etc or `path-DATE[.gz]`), or None if not found.
+	"""
+	found = None
+	for p in ([path + '.1'] + [path + '.1' + ext for ext in _COMPRESSED_SUFFIXES]
+		+ glob.glob(glob.escape(path) + '-[0-9]*')
+	):
+		ext = os.path.splitext(p)[1]
+		# compressed, but not supported (module is not available):
+		if ext in _COMPRESSED_SUFFIXES and ext not in _COMPRESSED_OPENERS:
+			continue
+		try:
+			mtime = os.stat(p).st_mtime
+		except OSError:
+			continue
+		if found is None or mtime > found[0]:
+			found = (mtime, p)
+	return found[1] if found else None
+
 
 class FileContainer:
 
-	def __init__(self, filename, encoding, tail=False, doOpen=False):
+	# size of block read at once from the log file (lines are split and decoded block-wise):
+	BLOCK_SIZE = 64*1024
+	# distance (in bytes) between entries of sparse time index (doubled if index is full):
+	TIME_INDEX_STEP = 1024*1024
+	# max count of entries in time index (every second entry is dropped if exceeded):
+	TIME_INDEX_SIZE = 256
+
+	def __init__(self, filename, encoding, tail=False, doOpen=False, keepOpen=False):
 		self.__filename = filename
 		self.waitForLineEnd = True
+		self.__handler = None
 		self.setEncoding(encoding)
 		self.__tail = tail
-		self.__handler = None
+		## keep file open between processing (rotation is checked by stat of the path):
+		self.keepOpen = keepOpen
 		self.__pos = 0
 		self.__pos4hash = 0
 		self.__hash = ''
 		self.__hashNextTime = time.time() + 30
+		## sparse time index of the file, list of (pos, time) of lines in ascending order:
+		self.__timeIndex = []
+		self.__indexStep = self.TIME_INDEX_STEP
+		## position of line to be indexed (set if last read line starts a new index step):
+		self.indexPos = None
+		self.__resetBuffer(0)
+		## compressed file (read-only stream, e. g. rotated log `auth.log.1.gz`):
+		opener = _COMPRESSED_OPENERS.get(os.path.splitext(filename)[1]) if doOpen else None
+		self.compressed = opener is not None
 		# Try to open the file. Raises an exception if an error occurred.
-		handler = open(filename, 'rb')
-		if doOpen: # fail2ban-regex only (don't need to reopen it and check for rotation)
+		handler = (opener or open)(filename, 'rb')
+		if doOpen: # fail2ban-regex and rotated logs only (don't need to reopen it and check for rotation)
 			self.__handler = handler
 			return
 		try:
@@ -1379,7 +1988,16 @@ class FileContainer:
 
 	def setEncoding(self, encoding):
 		codecs.lookup(encoding) # Raises LookupError if invalid
+		pos = self.tell() if self.__handler is not None else None
 		self.__encoding = encoding
+		# new-line in log encoding (without BOM) and size of code unit (new-line must be aligned to it):
+		self.__bom = bom = ''.encode(encoding)
+		self.__nl = '\n'.encode(encoding)[len(bom):]
+		self.__unit = len('a'.encode(encoding)) - len(bom)
+		# file is open (persistent handle) - decode from current position with new encoding:
+		if pos is not None:
+			self.__handler.seek(pos)
+			self.__resetBuffer(pos)
 
 	def getEncoding(self):
 		return self.__encoding
@@ -1392,8 +2010,51 @@ class FileContainer:
 
 	def setPos(self, value):
 		self.__pos = value
+		# persistent handle - move it also:
+		if self.__handler is not None and self.tell() != value:
+			self.__handler.seek(value)
+			self.__resetBuffer(value)
+
+	def __isRotated(self):
+		"""Checks the path of opened file (persistent handle) is rotated.
+
+		Rotation is detected by inode (file moved and new one created) or by
+		size smaller than the position (truncated, e. g. copytruncate).
+		"""
+		try:
+			stats = os.stat(self.__filename)
+		except OSError:
+			# file removed (rotation in progress), release handle and propagate error:
+			self.release()
+			raise
+		return stats.st_ino != self.__ino or stats.st_size < self.__pos, stats
 
 	def open(self, forcePos=None):
+		if self.__handler is not None:
+			# persistent handle - continue reading if not rotated:
+			rotated, stats = self.__isRotated()
+			# same inode and not truncated, check first line periodically also (copytruncate
+			# and grown again above position), so it is the same as by reopen of the file:
+			if not rotated and (not self.__hash or time.time() > self.__hashNextTime):
+				with open(self.__filename, 'rb') as h:
+					myHash = self.__firstLineHash(h)
+				if myHash != self.__hash:
+					if self.__hash:
+						rotated = True
+						# enforce check by reopen:
+						self.__hashNextTime = 0
+					else:
+						self.__hash = myHash
+			if not rotated:
+				if forcePos is not None:
+					self.__pos = forcePos
+					self.__handler.seek(forcePos)
+					self.__resetBuffer(forcePos)
+				elif stats.st_size <= self.__pos:
+					return False
+				return True
+			# rotated - release handle, reopen and check it completely (hash, etc):
+			self.release()
 		h = open(self.__filename, 'rb')
 		try:
 			# Set the file descriptor to be FD_CLOEXEC
@@ -1405,12 +2066,7 @@ class FileContainer:
 			stats = os.fstat(h.fileno())
 			rotflg = stats.st_size < self.__pos or stats.st_ino != self.__ino
 			if rotflg or not len(myHash) or time.time() > self.__hashNextTime:
-				myHash = ''
-				firstLine = h.readline()
-				# Computes the MD5 of the first line (if it is complete)
-				if firstLine != firstLine.rstrip(b'\r\n'):
-					myHash = md5sum(firstLine).hexdigest()
-					self.__hashNextTime = time.time() + 30
+				myHash = self.__firstLineHash(h)
 			elif stats.st_size == self.__pos:
 				myHash = self.__hash
 			# Compare size, hash and inode
@@ -1418,9 +2074,13 @@ class FileContainer:
 				if self.__hash != '':
 					logSys.log(logging.MSG, "Log rotation detected for %s, reason: %r", self.__filename,
 						(stats.st_size, self.__pos, stats.st_ino, self.__ino, myHash, self.__hash))
-					self.__ino = stats.st_ino
+				if self.__hash != '' or rotflg:
 					self.__pos = 0
+				# also if no hash yet (empty file), so it is not considered as rotated each time:
+				self.__ino = stats.st_ino
 				self.__hash = myHash
+				# time index belongs to the previous file:
+				self.setTimeIndex(None)
 			# if nothing to read from file yet (empty or no new data):
 			if forcePos is not None:
 				self.__pos = forcePos
@@ -1428,6 +2088,7 @@ class FileContainer:
 				return False
 			# Sets the file pointer to the last position.
 			h.seek(self.__pos)
+			self.__resetBuffer(self.__pos)
 			# leave file open (to read content):
 			self.__handler = h; h = None
 		finally:
@@ -1436,22 +2097,177 @@ class FileContainer:
 				h.close(); h = None
 		return True
 
+	def __firstLineHash(self, h):
+		"""Returns MD5 of the first line (if it is complete, otherwise empty string).
+		"""
+		firstLine = h.readline()
+		if firstLine != firstLine.rstrip(b'\r\n'):
+			self.__hashNextTime = time.time() + 30
+			return md5sum(firstLine).hexdigest()
+		return ''
+
 	def seek(self, offs, endLine=True):
 		h = self.__handler
 		if h is None:
 			self.open(offs)
 			h = self.__handler
+		# new-line is aligned to code unit (e. g. utf-16):
+		offs -= offs % self.__unit
 		# seek to given position
 		h.seek(offs, 0)
+		self.__resetBuffer(offs, lineStart=not offs)
 		# goto end of next line
 		if offs and endLine:
-			h.readline()
+			self.readline(False)
 		# get current real position
-		return h.tell()
+		return self.tell()
 
 	def tell(self):
-		# get current real position
-		return self.__handler.tell()
+		"""Returns position (in bytes) of the next line to read.
+
+		Because the file is read block-wise, the position of the handler may
+		be ahead, so the offset of consumed lines is maintained by readline.
+		"""
+		return self.__linePos
+
+	def getTimeIndex(self):
+		return list(self.__timeIndex)
+
+	def setTimeIndex(self, index):
+		"""Sets sparse time index (e. g. restored from database), None or empty resets it.
+		"""
+		self.__timeIndex = [(int(p), t) for p, t in index] if index else []
+		self.__indexStep = self.TIME_INDEX_STEP
+		while len(self.__timeIndex) > self.TIME_INDEX_SIZE:
+			del self.__timeIndex[1::2]
+			self.__indexStep *= 2
+		self.indexPos = None
+
+	def addTimeIndex(self, pos, unixTime):
+		"""Adds time of line at position pos to the time index.
+
+		Only entries behind the last one are accepted (and with not decreasing time,
+		because the index is used by half-interval search).
+		"""
+		self.indexPos = None
+		idx = self.__timeIndex
+		if idx and (pos <= idx[-1][0] or unixTime < idx[-1][1]):
+			return False
+		idx.append((pos, unixTime))
+		if len(idx) > self.TIME_INDEX_SIZE:
+			del idx[1::2]
+			self.__indexStep *= 2
+		return True
+
+	def getTimeIndexRange(self, unixTime, size=None):
+		"""Returns region (minp, maxp) of the file containing the first line with
+		time unixTime (or newer) according to time index, None if unknown.
+		"""
+		minp = maxp = None
+		for p, t in self.__timeIndex:
+			if size is not None and p >= size:
+				break
+			if t >= unixTime:
+				maxp = p
+				break
+			minp = p
+		return minp, maxp
+
+	def __resetBuffer(self, pos, lineStart=True):
+		# decoded and raw lines (without new-line) of the current block and index of the next line:
+		self.__lines = self.__rawLines = ()
+		self.__lineIdx = 0
+		# position and size of the current block, raw data after it (incomplete line):
+		self.__blockPos = pos
+		self.__blockLen = 0
+		# position of the next line to read (advanced by readline):
+		self.__linePos = pos
+		self.__rest = b''
+		# whether the next block starts at begin of line (so it can be indexed):
+		self.__lineStart = lineStart
+		self.indexPos = None
+		self.__decoder = codecs.getincrementaldecoder(self.__encoding)('strict')
+		# not at begin of file - no BOM expected (prime decoder with default BOM, e. g. for utf-16):
+		if pos and self.__bom:
+			self.__decoder.decode(self.__bom)
+
+	def __findLastNL(self, data):
+		"""Returns offset after last (aligned) new-line in data or -1 if not found.
+		"""
+		nl, unit = self.__nl, self.__unit
+		i = data.rfind(nl)
+		while i > 0 and i % unit:
+			i = data.rfind(nl, 0, i + len(nl) - 1)
+		return i + len(nl) if i >= 0 else -1
+
+	def __splitLines(self, chunk):
+		"""Splits chunk (ending with new-line) into raw lines (without new-lines).
+		"""
+		nl, unit = self.__nl, self.__unit
+		if unit == 1:
+			lines = chunk.split(nl)
+			lines.pop()
+			return lines
+		lines = []
+		p = 0
+		while p < len(chunk):
+			i = chunk.find(nl, p)
+			# skip new-line bytes that are part of other char (e. g. "\u020A" in utf-16):
+			while (i - p) % unit:
+				i = chunk.find(nl, i + 1)
+			lines.append(chunk[p:i])
+			p = i + len(nl)
+		return lines
+
+	def __readBlock(self):
+		"""Reads next block of complete lines into the buffer.
+
+		Returns False if no complete line is available (incomplete line or
+		nothing remains in rest in this case).
+		"""
+		if self.__blockLen:
+			self.__lineStart = True
+		self.__blockPos += self.__blockLen
+		self.__linePos = self.__blockPos
+		self.__lines = self.__rawLines = ()
+		self.__lineIdx = 0
+		self.__blockLen = 0
+		data = self.__rest
+		while True:
+			end = self.__findLastNL(data) if data else -1
+			if end >= 0:
+				break
+			b = self.__handler.read(self.BLOCK_SIZE)
+			if not b:
+				self.__rest = data
+				return False
+			data += b
+		chunk, self.__rest = data[:end], data[end:]
+		rawLines = self.__splitLines(chunk)
+		# decode whole block at once:
+		lines = None
+		try:
+			text = self.__decoder.decode(chunk)
+			lines = text.split('\n')
+		except UnicodeError: # decode/encode errors or missing BOM
+			self.__decoder.reset()
+		if lines is not None and len(lines) == len(rawLines) + 1:
+			lines.pop()
+			if '\r' in text:
+				lines = [l.rstrip('\r') for l in lines]
+		else:
+			# invalid chars - decode line by line (replacing errors, with warning):
+			fn, enc, nl = self.getFileName(), self.getEncoding(), self.__nl
+			lines = [FileContainer.decode_line(fn, enc, l + nl).rstrip('\r\n') for l in rawLines]
+		self.__lines = lines
+		self.__rawLines = rawLines
+		self.__blockLen = end
+		# first line of the block starts new step of time index:
+		if self.__lineStart:
+			idx = self.__timeIndex
+			if not idx or self.__blockPos >= idx[-1][0] + self.__indexStep:
+				self.indexPos = self.__blockPos
+		return True
 
 	@staticmethod
 	def decode_line(filename, enc, line):
@@ -1486,59 +2302,50 @@ class FileContainer:
 		If line is complete (and complete is True), it also shift current known 
 		position to begin of next line.
 
-		Also it is safe against interim new-line bytes (e. g. part of multi-byte char)
-		in given encoding.
+		The file is read in blocks, which are split into lines and decoded at
+		once (new-line is searched in log encoding, so it is safe against
+		interim new-line bytes, e. g. part of multi-byte char).
 		"""
 		if self.__handler is None:
 			return ""
-		# read raw bytes up to \n char:
-		b = self.__handler.readline()
-		if not b:
-			return None
-		bl = len(b)
-		# convert to log-encoding (new-line char could disappear if it is part of multi-byte sequence):
-		r = FileContainer.decode_line(
-			self.getFileName(), self.getEncoding(), b)
-		# trim new-line at end and check the line was written complete (contains a new-line):
-		l = r.rstrip('\r\n')
-		if complete:
-			if l == r:
-				# try to fill buffer in order to find line-end in log encoding:
-				fnd = 0
-				while 1:
-					r = self.__handler.readline()
-					if not r:
-						break
-					b += r
-					bl += len(r)
-					# convert to log-encoding:
-					r = FileContainer.decode_line(
-						self.getFileName(), self.getEncoding(), b)
-					# ensure new-line is not in the middle (buffered 2 strings, e. g. in utf-16le it is "...[0A"+"00]..."):
-					e = r.find('\n')
-					if e >= 0 and e != len(r)-1:
-						l, r = r[0:e], r[0:e+1]
-						# back to bytes and get offset to seek after NL:
-						r = r.encode(self.getEncoding(), 'replace')
-						self.__handler.seek(-bl+len(r), 1)
-						return l
-					# trim new-line at end and check the line was written complete (contains a new-line):
-					l = r.rstrip('\r\n')
-					if l != r:
-						return l
-				if self.waitForLineEnd:
-					# not fulfilled - seek back and return:
-					self.__handler.seek(-bl, 1)
+		i = self.__lineIdx
+		if i >= len(self.__lines):
+			if not self.__readBlock():
+				rest = self.__rest
+				if not rest or (complete and self.waitForLineEnd):
+					# not fulfilled - stay at begin of incomplete line:
 					return None
-		return l
+				# consume incomplete line:
+				self.__rest = b''
+				self.__blockPos += len(rest)
+				self.__linePos = self.__blockPos
+				self.__lineStart = False
+				return FileContainer.decode_line(
+					self.getFileName(), self.getEncoding(), rest).rstrip('\r\n')
+			i = 0
+		elif i:
+			# not first line of block - nothing to index:
+			self.indexPos = None
+		self.__lineIdx = i + 1
+		self.__linePos += len(self.__rawLines[i]) + len(self.__nl)
+		return self.__lines[i]
 
 	def close(self):
 		if self.__handler is not None:
 			# Saves the last real position.
-			self.__pos = self.__handler.tell()
-			# Closes the file.
+			self.__pos = self.tell()
+			# Closes the file (unless persistent handle).
+			if not self.keepOpen:
+				self.release()
+
+	def release(self):
+		"""Closes the file also if persistent handle (keepOpen) is used.
+		"""
+		if self.__handler is not None:
+			self.__pos = self.tell()
 			self.__handler.close()
 			self.__handler = None
+			self.__resetBuffer(self.__pos)
 
 	def __iter__(self):
 		return self
@@ -1559,6 +2366,13 @@ _decode_line_warn = Utils.Cache(maxCount=1000, maxTime=24*60*60);
 
 class JournalFilter(Filter): # pragma: systemd no cover
 
+	## Fields of journal entry used by formatJournalEntry (other fields are not loaded by projection):
+	ENTRY_FIELDS = ('_HOSTNAME', 'SYSLOG_IDENTIFIER', '_COMM', 'SYSLOG_PID', '_PID', 'MESSAGE',
+		'_SOURCE_REALTIME_TIMESTAMP', '_SOURCE_MONOTONIC_TIMESTAMP')
+	## Internals of python-systemd reader needed to load single fields of entry (projection):
+	READER_PROJECTION = ('_next', '_get', '_convert_field', '_get_realtime', '_get_monotonic')
+	_readerProjectionLogged = False
+
 	def clearAllParams(self):
 		super(JournalFilter, self).clearAllParams()
 		self.delJournalMatch()
@@ -1572,3 +2386,95 @@ class JournalFilter(Filter): # pragma: systemd no cover
 	def getJournalMatch(self, match): # pragma: no cover - Base class, not used
 		return []
 
+	@staticmethod
+	def compileJournalMatches(matches):
+		"""Converts journal matches (list of conjunctions) to list of dicts field -> values.
+
+		Same as by journal, matches of different fields are combined with AND,
+		of the same field with OR.  Values are contained as str and bytes, to
+		compare with raw (bytes) and converted (str) field values of entry.
+		"""
+		groups = []
+		for match in matches:
+			group = {}
+			for m in match:
+				f, v = m.split('=', 1)
+				group.setdefault(f, set()).update((v, v.encode('utf-8')))
+			if group:
+				groups.append(group)
+		return groups
+
+	@staticmethod
+	def _journalValueIn(v, vals):
+		if isinstance(v, (str, bytes)):
+			return v in vals
+		if v is None:
+			return False
+		# converted by reader (e. g. int for PRIORITY or _PID, UUID for _BOOT_ID),
+		# compare in journal form (UUID as hex without dashes):
+		return (v.hex if isinstance(v, uuid.UUID) else str(v)) in vals
+
+	@staticmethod
+	def journalEntryMatches(groups, entry):
+		"""Checks the entry satisfies the compiled matches (no matches - all entries).
+
+		A field with multiple values (list) matches if any of its values matches.
+		"""
+		if not groups:
+			return True
+		valueIn = JournalFilter._journalValueIn
+		for group in groups:
+			for f, vals in group.items():
+				v = entry.get(f)
+				if isinstance(v, list):
+					if not any(valueIn(x, vals) for x in v):
+						break
+				elif not valueIn(v, vals):
+					break
+			else:
+				return True
+		return False
+
+	@staticmethod
+	def journalProjection(reader):
+		"""Checks the reader is able to load single fields of entry (projection).
+
+		The projection uses internals of python-systemd reader, if some of them is
+		missing (other version of module), the entries are loaded entirely with
+		public `get_next` (logged once).
+		"""
+		missing = [n for n in JournalFilter.READER_PROJECTION if not callable(getattr(reader, n, None))]
+		if not missing:
+			return True
+		if not JournalFilter._readerProjectionLogged:
+			JournalFilter._readerProjectionLogged = True
+			logSys.debug("Journal reader has no %s, entries will be loaded entirely using get_next",
+				", ".join(missing))
+		return False
+
+	@staticmethod
+	def readJournalFields(reader, fields):
+		"""Moves reader to next entry and loads raw values of given fields only (projection).
+
+		Returns None if end of journal is reached.
+		"""
+		if not reader._next():
+			return None
+		raw = {}
+		for f in fields:
+			try:
+				raw[f] = reader._get(f)
+			except KeyError:
+				pass
+		return raw
+
+	@staticmethod
+	def convertJournalEntry(reader, raw):
+		"""Converts raw fields used by formatJournalEntry (and time stamps of current entry).
+		"""
+		convert = reader._convert_field
+		entry = dict((f, convert(f, raw[f])) for f in JournalFilter.ENTRY_FIELDS if f in raw)
+		entry['__REALTIME_TIMESTAMP'] = convert('__REALTIME_TIMESTAMP', reader._get_realtime())
+		entry['__MONOTONIC_TIMESTAMP'] = convert('__MONOTONIC_TIMESTAMP', reader._get_monotonic())
+		return entry
+
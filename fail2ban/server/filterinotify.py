@@ -0,0 +1,434 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: t -*-
+# vi: set ft=python sts=4 ts=4 sw=4 noet :
+
+# This file is part of Fail2Ban.
+#
+# Fail2Ban is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Fail2Ban is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fail2Ban; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = "Fail2Ban Developers"
+__copyright__ = "Copyright (c) 2026 Fail2Ban Developers"
+__license__ = "GPL"
+
+import ctypes
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from os.path import dirname, join as pathjoin
+
+from .filter import FileFilter
+from .utils import Utils
+from ..helpers import getLogger, prctl_set_th_name
+
+# Gets the instance of the logger.
+logSys = getLogger(__name__)
+
+# Native inotify (linux only) via libc, verify it is functional on this system:
+try:
+	_libc = ctypes.CDLL(None, use_errno=True)
+	_inotify_init1 = _libc.inotify_init1
+	_inotify_add_watch = _libc.inotify_add_watch
+	_inotify_rm_watch = _libc.inotify_rm_watch
+	_inotify_init1.argtypes = [ctypes.c_int]
+	_inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+	_inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+	_fd = _inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+	if _fd < 0: # pragma: no cover
+		raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+	os.close(_fd)
+	del _fd
+	select.epoll
+except (OSError, AttributeError) as e: # pragma: no cover
+	raise ImportError("Native inotify is probably not functional on this system: %s" % e)
+
+# inotify event masks (see inotify(7)):
+IN_MODIFY      = 0x00000002
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_ISDIR       = 0x40000000
+
+_FILE_MASK = IN_MODIFY | IN_MOVE_SELF | IN_DELETE_SELF
+_DIR_MASK = IN_CREATE | IN_MOVED_TO | IN_MOVE_SELF | IN_DELETE_SELF | IN_ONLYDIR
+_GONE_MASK = IN_MOVE_SELF | IN_DELETE_SELF | IN_IGNORED
+
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+_EVENT = struct.Struct('iIII')
+
+
+def _maskname(mask):
+	return '|'.join(n for n, m in (
+		('IN_MODIFY', IN_MODIFY), ('IN_MOVED_TO', IN_MOVED_TO), ('IN_CREATE', IN_CREATE),
+		('IN_DELETE_SELF', IN_DELETE_SELF), ('IN_MOVE_SELF', IN_MOVE_SELF),
+		('IN_Q_OVERFLOW', IN_Q_OVERFLOW), ('IN_IGNORED', IN_IGNORED),
+	) if mask & m) or hex(mask)
+
+
+class InotifyMonitor(object):
+	"""Monitor of log files using native inotify, shared by all jails.
+
+	Single thread (driven by epoll) reads events of one inotify instance and
+	notifies the filters subscribed to the affected paths (modification,
+	creation of the file, e. g. after rotation).  The thread is started with
+	first subscription and ends if nothing is monitored anymore.
+
+	Each file is watched together with its directory, so file created (or
+	moved) in place of rotated one is detected.  Paths not available currently
+	(e. g. whole directory rotated) are retried with growing interval.
+	"""
+
+	# interval to retry watch of missing path and its maximum:
+	RETRY_INTERVAL = Utils.DEFAULT_SLEEP_INTERVAL
+	MAX_RETRY_INTERVAL = 5
+
+	_instance = None
+	_instanceLock = threading.Lock()
+
+	@classmethod
+	def getInstance(cls):
+		with cls._instanceLock:
+			if cls._instance is None:
+				cls._instance = cls()
+			return cls._instance
+
+	def __init__(self):
+		self.__lock = threading.RLock()
+		self.__ctx = None
+		# path -> set of filters:
+		self.__subs = {}
+		# watches of files and directories (path -> wd, wd -> set of paths):
+		self.__fileWds = {}
+		self.__wdFiles = {}
+		self.__dirWds = {}
+		self.__wdDirs = {}
+		# missing paths (not watched) -> [next retry time, retry interval]:
+		self.__missing = {}
+
+	def subscribe(self, path, flt):
+		"""Subscribes filter to the path, returns True if file is watched (available).
+		"""
+		with self.__lock:
+			subs = self.__subs.get(path)
+			if subs is None:
+				subs = self.__subs[path] = set()
+				if self.__ctx is None:
+					self.__start()
+				self.__watchFile(path)
+			subs.add(flt)
+			return path in self.__fileWds
+
+	def unsubscribe(self, path, flt):
+		"""Unsubscribes filter from the path (stops monitor if nothing remains to monitor).
+		"""
+		with self.__lock:
+			subs = self.__subs.get(path)
+			if not subs:
+				return
+			subs.discard(flt)
+			if subs:
+				return
+			del self.__subs[path]
+			self.__missing.pop(path, None)
+			self.__unwatch(path, self.__fileWds, self.__wdFiles)
+			pdir = dirname(path)
+			if not any(dirname(p) == pdir for p in self.__subs):
+				self.__unwatch(pdir, self.__dirWds, self.__wdDirs)
+			if self.__subs:
+				return
+			ctx, self.__ctx = self.__ctx, None
+		# stop thread (outside of lock, it may wait for lock to end dispatching):
+		if ctx:
+			ctx.active = False
+			os.write(ctx.wakeup[1], b'\0')
+			ctx.thread.join(Utils.DEFAULT_SLEEP_TIME)
+			# release descriptors (after thread exit, so no reuse of them in poll):
+			ctx.epoll.close()
+			for fd in (ctx.fd,) + ctx.wakeup:
+				os.close(fd)
+			logSys.debug("Stopped inotify monitor")
+
+	def getMissing(self, flt):
+		"""Returns paths of the filter, which are currently not available.
+		"""
+		with self.__lock:
+			return [p for p in self.__missing if flt in self.__subs.get(p, ())]
+
+	def __start(self):
+		class _Context(object):
+			pass
+		ctx = _Context()
+		ctx.active = True
+		ctx.fd = _inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if ctx.fd < 0: # pragma: no cover
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e))
+		ctx.wakeup = os.pipe()
+		ctx.epoll = select.epoll()
+		ctx.epoll.register(ctx.fd, select.EPOLLIN)
+		ctx.epoll.register(ctx.wakeup[0], select.EPOLLIN)
+		ctx.thread = threading.Thread(target=self.__run, args=(ctx,), name="f2b/inotify")
+		ctx.thread.daemon = True
+		self.__ctx = ctx
+		ctx.thread.start()
+		logSys.debug("Started inotify monitor")
+
+	def __addWatch(self, path, mask):
+		wd = _inotify_add_watch(self.__ctx.fd, os.fsencode(path), mask)
+		if wd < 0:
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e), path)
+		return wd
+
+	def __unwatch(self, path, pathWds, wdPaths):
+		wd = pathWds.pop(path, None)
+		if wd is None:
+			return
+		paths = wdPaths.get(wd)
+		if paths:
+			paths.discard(path)
+			if paths:
+				return
+			del wdPaths[wd]
+		# ignore errors (watch is already removed by kernel, if file or directory deleted):
+		_inotify_rm_watch(self.__ctx.fd, wd)
+
+	def __watchFile(self, path):
+		"""Watches the file and its directory, returns False if path is missing.
+		"""
+		pdir = dirname(path)
+		try:
+			if pdir not in self.__dirWds:
+				wd = self.__addWatch(pdir, _DIR_MASK)
+				self.__dirWds[pdir] = wd
+				self.__wdDirs.setdefault(wd, set()).add(pdir)
+			wd = self.__addWatch(path, _FILE_MASK)
+		except OSError as e:
+			if path not in self.__missing:
+				self.__missing[path] = [time.time() + self.RETRY_INTERVAL, self.RETRY_INTERVAL]
+				logSys.log(logging.MSG, "Log absence detected (possibly rotation) for %s, reason: %s",
+					path, e.strerror)
+			return False
+		self.__fileWds[path] = wd
+		self.__wdFiles.setdefault(wd, set()).add(path)
+		if self.__missing.pop(path, None) is not None:
+			logSys.log(logging.MSG, "Log presence detected for file %s", path)
+		return True
+
+	def __rewatchFile(self, path, notify):
+		self.__unwatch(path, self.__fileWds, self.__wdFiles)
+		if self.__watchFile(path):
+			notify[path] = 1
+
+	def __dispatch(self, data, notify):
+		pos = 0
+		while pos + _EVENT.size <= len(data):
+			wd, mask, cookie, nlen = _EVENT.unpack_from(data, pos)
+			name = data[pos + _EVENT.size:pos + _EVENT.size + nlen].rstrip(b'\0')
+			pos += _EVENT.size + nlen
+			if logSys.getEffectiveLevel() <= 4:
+				logSys.log(4, "Inotify event %s (wd %s, name %r)", _maskname(mask), wd, name)
+			if mask & IN_Q_OVERFLOW: # pragma: no cover - too many events
+				logSys.warning("Inotify event queue overflowed, check all monitored files")
+				for path in self.__subs:
+					notify[path] = 1
+				continue
+			paths = self.__wdFiles.get(wd)
+			if paths:
+				if mask & IN_MODIFY:
+					for path in paths:
+						notify[path] = 1
+				if mask & _GONE_MASK:
+					# file moved or deleted - watch the path again (new file or missing):
+					for path in list(paths):
+						self.__rewatchFile(path, notify)
+				continue
+			dirs = self.__wdDirs.get(wd)
+			if dirs:
+				if mask & (IN_CREATE | IN_MOVED_TO):
+					if mask & IN_ISDIR:
+						continue
+					for pdir in dirs:
+						path = pathjoin(pdir, os.fsdecode(name))
+						# new file (e. g. after rotation):
+						if path in self.__subs:
+							self.__rewatchFile(path, notify)
+				elif mask & _GONE_MASK:
+					# directory moved or deleted - watch all its files again:
+					for pdir in list(dirs):
+						self.__unwatch(pdir, self.__dirWds, self.__wdDirs)
+						for path in list(self.__subs):
+							if dirname(path) == pdir:
+								self.__rewatchFile(path, notify)
+
+	def __retryMissing(self, notify):
+		ntm = time.time()
+		for path, retry in list(self.__missing.items()):
+			if ntm < retry[0]:
+				continue
+			if not self.__watchFile(path):
+				retry[1] = min(retry[1] * 2, self.MAX_RETRY_INTERVAL)
+				retry[0] = ntm + retry[1]
+				continue
+			notify[path] = 1
+
+	def __run(self, ctx):
+		prctl_set_th_name(ctx.thread.name)
+		logSys.debug("Inotify monitor started")
+		try:
+			while ctx.active:
+				with self.__lock:
+					timeout = -1
+					if self.__missing:
+						timeout = max(0, min(r[0] for r in self.__missing.values()) - time.time())
+				events = ctx.epoll.poll(timeout)
+				if not ctx.active:
+					break
+				data = b''
+				for fd, ev in events:
+					if fd == ctx.fd:
+						# read all available events:
+						while True:
+							try:
+								buf = os.read(ctx.fd, 65536)
+							except BlockingIOError:
+								break
+							if not buf: # pragma: no cover
+								break
+							data += buf
+					else:
+						os.read(fd, 512)
+				notify = {}
+				with self.__lock:
+					if ctx is not self.__ctx: # pragma: no cover - stopped
+						break
+					if data:
+						self.__dispatch(data, notify)
+					if self.__missing:
+						self.__retryMissing(notify)
+					# notify subscribed filters:
+					for path in notify:
+						for flt in self.__subs.get(path, ()):
+							flt.notifyModified(path)
+		except Exception as e: # pragma: no cover
+			logSys.error("Caught unhandled exception in inotify monitor: %r", e,
+				exc_info=logSys.getEffectiveLevel()<=logging.DEBUG)
+		logSys.debug("Inotify monitor exited")
+
+
+##
+# Log reader class.
+#
+# This class reads a log file and detects login failures or anything else
+# that matches a given regular expression. This class is instantiated by
+# a Jail object.
+
+class FilterInotify(FileFilter):
+	"""File filter with native inotify backend.
+
+	Modifications are detected by shared `InotifyMonitor` (single thread for
+	all jails), the filter thread sleeps until it gets notified, so processes
+	modified files without delay.
+	"""
+
+	def __init__(self, jail, **kwargs):
+		FileFilter.__init__(self, jail, **kwargs)
+		self.__monitor = InotifyMonitor.getInstance()
+		# modified paths to process (dict as ordered set):
+		self.__modified = {}
+		self.__cond = threading.Condition()
+		logSys.debug("Created FilterInotify")
+
+	def notifyModified(self, path):
+		"""Notifies filter the log file is modified (or created), invoked by monitor.
+		"""
+		with self.__cond:
+			self.__modified[path] = 1
+			self.__cond.notify()
+
+	##
+	# Add a log file path
+	#
+	# @param path log file path
+
+	def _addLogPath(self, path):
+		if self.__monitor.subscribe(path, self):
+			# process file (content written before start):
+			self.notifyModified(path)
+
+	##
+	# Delete a log path
+	#
+	# @param path the log file to delete
+
+	def _delLogPath(self, path):
+		self.__monitor.unsubscribe(path, self)
+		with self.__cond:
+			self.__modified.pop(path, None)
+
+	def getPendingPaths(self):
+		return self.__monitor.getMissing(self)
+
+	##
+	# Main loop.
+	#
+	# Waits for notification from monitor and processes modified files.
+
+	def run(self):
+		logSys.debug("[%s] filter started (inotify)", self.jailName)
+		while self.active:
+			try:
+				with self.__cond:
+					if self.idle or not self.__modified:
+						self.__cond.wait(self.sleeptime)
+					modlst = None
+					if not self.idle and self.active:
+						modlst, self.__modified = self.__modified, {}
+				if modlst:
+					for path in modlst:
+						if not self.active:
+							break
+						if self.idle:
+							# process it later:
+							with self.__cond:
+								self.__modified[path] = 1
+							continue
+						self.getFailures(path)
+				self.ticks += 1
+				if self.ticks % 10 == 0:
+					self.performSvc()
+			except Exception as e: # pragma: no cover
+				if not self.active: # if not active - error by stop...
+					break
+				logSys.error("Caught unhandled exception in main cycle: %r", e,
+					exc_info=logSys.getEffectiveLevel()<=logging.DEBUG)
+				# incr common error counter:
+				self.commonError("unhandled", e)
+		logSys.debug("[%s] filter exited (inotify)", self.jailName)
+		return True
+
+	def stop(self):
+		# wake up thread (to exit immediately):
+		if self.active:
+			self.active = False
+		with self.__cond:
+			self.__cond.notify()
+		super(FilterInotify, self).stop()
@@ -25,7 +25,9 @@ __copyright__ = "Copyright (c) 2004 Cyril Jaquier; 2012 Yaroslav Halchenko"
 __license__ = "GPL"
 
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .filter import FileFilter
 from .utils import Utils
@@ -36,6 +38,166 @@ from ..helpers import getLogger, logging
 logSys = getLogger(__name__)
 
 
+class PollScheduler(object):
+	"""Poll scheduler, shared by all jails with polling backend.
+
+	Single thread stats each distinct path once per interval and dispatches
+	its stats to the subscribed filters, if the file got modified (or stat
+	failed).  The interval is adaptive: it grows (up to the `sleeptime` of
+	filters) for quiet files and falls back to the minimal interval for files
+	currently written.  It triggers also the service of registered filters
+	(every 10 sleep times).  The filters process the modified files in small
+	worker pool of scheduler (no thread per jail).  The thread is started with
+	first subscription and ends if nothing is monitored anymore.
+	"""
+
+	## Maximal count of worker threads processing the files for all filters:
+	MAX_WORKERS = 4
+
+	_instance = None
+	_instanceLock = threading.Lock()
+
+	@classmethod
+	def getInstance(cls):
+		with cls._instanceLock:
+			if cls._instance is None:
+				cls._instance = cls()
+			return cls._instance
+
+	class _Entry(object):
+		__slots__ = ('subs', 'fresh', 'stats', 'interval', 'nextTime')
+		def __init__(self):
+			self.subs = set()
+			# filters not yet notified (get stats by next check anyway):
+			self.fresh = set()
+			self.stats = None
+			self.interval = 0
+			self.nextTime = 0
+
+	def __init__(self):
+		self.__cond = threading.Condition(threading.RLock())
+		self.__entries = {}
+		## Registered filters, filter -> time of last service:
+		self.__filters = {}
+		self.__thread = None
+		self.__pool = None
+
+	def __startThread(self):
+		if self.__thread is None:
+			self.__thread = threading.Thread(target=self.__run, name="f2b/poller")
+			self.__thread.daemon = True
+			self.__thread.start()
+		self.__cond.notify()
+
+	def register(self, flt):
+		"""Registers filter for periodic service (see notifySvc).
+		"""
+		with self.__cond:
+			self.__filters[flt] = time.time()
+			self.__startThread()
+
+	def unregister(self, flt):
+		with self.__cond:
+			if self.__filters.pop(flt, None) is not None:
+				self.__cond.notify()
+
+	def subscribe(self, path, flt):
+		"""Subscribes filter to stats of the path (checked immediately).
+		"""
+		with self.__cond:
+			e = self.__entries.get(path)
+			if e is None:
+				e = self.__entries[path] = self._Entry()
+			e.subs.add(flt)
+			e.fresh.add(flt)
+			e.nextTime = 0
+			self.__startThread()
+
+	def unsubscribe(self, path, flt):
+		"""Unsubscribes filter from the path (thread ends if nothing remains to poll).
+		"""
+		with self.__cond:
+			e = self.__entries.get(path)
+			if e is None:
+				return
+			e.subs.discard(flt)
+			e.fresh.discard(flt)
+			if not e.subs:
+				del self.__entries[path]
+				self.__cond.notify()
+
+	def submit(self, func):
+		"""Executes func in worker pool (created on demand).
+		"""
+		with self.__cond:
+			if self.__pool is None:
+				self.__pool = ThreadPoolExecutor(self.MAX_WORKERS, thread_name_prefix="f2b/poll")
+			return self.__pool.submit(func)
+
+	def __intervals(self, e):
+		# maximal interval is the (smallest) sleep time of subscribers:
+		maxInt = min(flt.sleeptime for flt in e.subs)
+		return min(Utils.DEFAULT_SLEEP_INTERVAL, maxInt), maxInt
+
+	def __run(self):
+		logSys.debug("Poll scheduler started")
+		while True:
+			with self.__cond:
+				if not self.__entries and not self.__filters:
+					self.__thread = None
+					# idle workers end, pending tasks are still processed:
+					if self.__pool is not None:
+						self.__pool.shutdown(wait=False)
+						self.__pool = None
+					break
+				ntm = time.time()
+				tm = min([e.nextTime for e in self.__entries.values()] +
+					[stm + flt.sleeptime * 10 for flt, stm in self.__filters.items()])
+				if tm > ntm:
+					self.__cond.wait(tm - ntm)
+					continue
+				due = [(path, e) for path, e in self.__entries.items() if e.nextTime <= ntm]
+				svc = [flt for flt, stm in self.__filters.items() if stm + flt.sleeptime * 10 <= ntm]
+				for flt in svc:
+					self.__filters[flt] = ntm
+			notify = []
+			for path, e in due:
+				# stat each path once for all subscribers:
+				try:
+					logStats = os.stat(path)
+					stats, err = (logStats.st_mtime, logStats.st_ino, logStats.st_size), None
+				except OSError as ex:
+					logStats, stats, err = None, None, ex
+				with self.__cond:
+					if not e.subs: # unsubscribed in-between
+						continue
+					minInt, maxInt = self.__intervals(e)
+					if err is not None or stats != e.stats:
+						# modified (or error) - poll it often:
+						e.interval = minInt
+						subs = list(e.subs)
+					else:
+						# quiet file - back off:
+						e.interval = min(maxInt, max(e.interval, minInt) * 2)
+						subs = list(e.fresh)
+					e.stats = stats
+					e.fresh.clear()
+					e.nextTime = time.time() + e.interval
+				if subs:
+					notify.append((path, subs, logStats, err))
+			# dispatch to subscribed filters (they only queue it and process in worker):
+			calls = [(flt.notifyStats, (path, logStats, err))
+				for path, subs, logStats, err in notify for flt in subs]
+			calls += [(flt.notifySvc, ()) for flt in svc]
+			for func, args in calls:
+				try:
+					func(*args)
+				except Exception as ex: # pragma: no cover
+					logSys.error("Caught unhandled exception in poll scheduler: %r", ex,
+						exc_info=logSys.getEffectiveLevel()<=logging.DEBUG)
+		logSys.debug("Poll scheduler stopped")
+
+
 ##
 # Log reader class.
 #
@@ -51,11 +213,23 @@ class FilterPoll(FileFilter):
 	# Initialize the filter object with default values.
 	# @param jail the jail object
 
-	def __init__(self, jail):
-		FileFilter.__init__(self, jail)
+	def __init__(self, jail, **kwargs):
+		self.__cond = threading.Condition()
+		FileFilter.__init__(self, jail, **kwargs)
 		## The time of the last modification of the file.
 		self.__prevStats = dict()
 		self.__file404Cnt = dict()
+		## Shared scheduler (stats the files for all jails), used if filter is started:
+		self.__scheduler = PollScheduler.getInstance()
+		self.__polling = False
+		## Stats supplied by scheduler, path -> (stats, error) (latest only), checked in worker:
+		self.__notified = {}
+		## Modified paths to process (dict as ordered set):
+		self.__modified = {}
+		## Service requested by scheduler:
+		self.__svc = False
+		## Processing submitted to worker of scheduler (or running):
+		self.__busy = False
 		logSys.debug("Created FilterPoll")
 
 	##
@@ -66,6 +240,8 @@ class FilterPoll(FileFilter):
 	def _addLogPath(self, path):
 		self.__prevStats[path] = (0, None, None)	 # mtime, ino, size
 		self.__file404Cnt[path] = 0
+		if self.__polling:
+			self.__scheduler.subscribe(path, self)
 
 	##
 	# Delete a log path
@@ -73,8 +249,12 @@ class FilterPoll(FileFilter):
 	# @param path the log file to delete
 
 	def _delLogPath(self, path):
+		self.__scheduler.unsubscribe(path, self)
 		del self.__prevStats[path]
 		del self.__file404Cnt[path]
+		with self.__cond:
+			self.__notified.pop(path, None)
+			self.__modified.pop(path, None)
 
 	##
 	# Get a modified log path at once
@@ -85,46 +265,133 @@ class FilterPoll(FileFilter):
 				modlst.append(filename)
 		return modlst
 
-	##
-	# Main loop.
-	#
-	# This function is the main loop of the thread. It checks if the
-	# file has been modified and looks for failures.
-	# @return True when the thread exits nicely
+	def notifyStats(self, filename, logStats, err=None):
+		"""Queues stats of the log file (or stat error), supplied by poll scheduler.
+
+		Called in scheduler thread, so the stats are only queued here and checked
+		by the worker processing the filter (see __process).  Not yet checked stats
+		of the path are replaced (each error is followed by a pause in worker).
+		"""
+		with self.__cond:
+			self.__notified.pop(filename, None)
+			self.__notified[filename] = (logStats, err)
+			self.__schedule()
+
+	def notifySvc(self):
+		"""Requests service of the filter (called periodically by poll scheduler).
+		"""
+		with self.__cond:
+			self.__svc = True
+			self.__schedule()
+
+	@property
+	def idle(self):
+		return self.__idle
+
+	@idle.setter
+	def idle(self, value):
+		self.__idle = value
+		# process files modified in idle:
+		if not value and self.active:
+			with self.__cond:
+				self.__schedule()
 
-	def run(self):
-		while self.active:
+	def __schedule(self):
+		# (called under lock) submits processing to worker of scheduler, if something to do:
+		if self.__busy or not self.active:
+			return
+		if self.__notified or self.__svc or (self.__modified and not self.idle):
+			self.__busy = True
+			self.__scheduler.submit(self.__process)
+
+	def __checkNotified(self, notified):
+		"""Checks stats queued by scheduler, marks modified paths to process.
+		"""
+		for filename, (logStats, err) in notified.items():
+			# removed in-between:
+			if filename not in self.__prevStats:
+				continue
+			if err is None:
+				modified = self.__checkStats(filename, logStats)
+			else:
+				modified = self.__statError(filename, err)
+			if modified:
+				with self.__cond:
+					self.__modified[filename] = 1
+
+	def __process(self):
+		"""Processes queued stats and modified files, looks for failures.
+
+		Runs in worker of poll scheduler (at most one worker per filter), until
+		nothing remains to do.
+		"""
+		while True:
+			with self.__cond:
+				notified, self.__notified = self.__notified, {}
+				svc, self.__svc = self.__svc, False
+				if not self.active or not (notified or svc or (self.__modified and not self.idle)):
+					self.__busy = False
+					return
 			try:
 				if logSys.getEffectiveLevel() <= 4:
 					logSys.log(4, "Woke up idle=%s with %d files monitored",
 							   self.idle, self.getLogCount())
-				if self.idle:
-					if not Utils.wait_for(lambda: not self.active or not self.idle, 
-						self.sleeptime * 10, self.sleeptime
-					):
-						self.ticks += 1
-						continue
-				# Get file modification
-				modlst = []
-				Utils.wait_for(lambda: not self.active or self.getModified(modlst),
-					self.sleeptime)
-				if not self.active: # pragma: no cover - timing
-					break
-				for filename in modlst:
-					self.getFailures(filename)
+				# check stats supplied by scheduler:
+				if notified:
+					self.__checkNotified(notified)
+				with self.__cond:
+					modlst = None
+					if not self.idle and self.active:
+						modlst, self.__modified = self.__modified, {}
+				if modlst:
+					for filename in modlst:
+						self.getFailures(filename)
 
 				self.ticks += 1
-				if self.ticks % 10 == 0:
+				if svc:
 					self.performSvc()
 			except Exception as e: # pragma: no cover
 				if not self.active: # if not active - error by stop...
-					break
+					continue
 				logSys.error("Caught unhandled exception in main cycle: %r", e,
 					exc_info=logSys.getEffectiveLevel()<=logging.DEBUG)
 				# incr common error counter:
 				self.commonError("unhandled", e)
-		logSys.debug("[%s] filter terminated", self.jailName)
-		return True
+
+	##
+	# Start monitoring.
+	#
+	# The filter has no own thread: the files are checked by shared poll
+	# scheduler, the modified files are processed in its worker pool.
+
+	def start(self):
+		self.active = True
+		self.__polling = True
+		self.__scheduler.register(self)
+		for filename in self.getLogPaths():
+			self.__scheduler.subscribe(filename, self)
+
+	def stop(self):
+		if self.active:
+			self.active = False
+			logSys.debug("[%s] filter terminated", self.jailName)
+		self.__polling = False
+		self.__scheduler.unregister(self)
+		for filename in self.getLogPaths():
+			self.__scheduler.unsubscribe(filename, self)
+		# waits for running processing (in done):
+		super(FilterPoll, self).stop()
+
+	def is_alive(self):
+		"""Whether the filter is started (or its processing still running).
+		"""
+		with self.__cond:
+			return bool(self.active) or self.__busy
+	isAlive = is_alive
+
+	def join(self):
+		# no own thread - wait for processing only:
+		self.done()
 
 	##
 	# Checks if the log file has been modified.
@@ -135,42 +402,49 @@ class FilterPoll(FileFilter):
 	def isModified(self, filename):
 		try:
 			logStats = os.stat(filename)
-			stats = logStats.st_mtime, logStats.st_ino, logStats.st_size
-			pstats = self.__prevStats.get(filename, (0,))
-			if logSys.getEffectiveLevel() <= 4:
-				# we do not want to waste time on strftime etc if not necessary
-				dt = logStats.st_mtime - pstats[0]
-				logSys.log(4, "Checking %s for being modified. Previous/current stats: %s / %s. dt: %s",
-				           filename, pstats, stats, dt)
-				# os.system("stat %s | grep Modify" % filename)
-			self.__file404Cnt[filename] = 0
-			if pstats == stats:
-				return False
-			logSys.debug("%s has been modified", filename)
-			self.__prevStats[filename] = stats
-			return True
 		except Exception as e:
-			# still alive (may be deleted because multi-threaded):
-			if not self.getLog(filename) or self.__prevStats.get(filename) is None:
-				logSys.warning("Log %r seems to be down: %s", filename, e)
-				return False
-			# log error:
-			if self.__file404Cnt[filename] < 2:
-				if e.errno == 2:
-					logSys.debug("Log absence detected (possibly rotation) for %s, reason: %s",
-							 filename, e)
-				else: # pragma: no cover
-					logSys.error("Unable to get stat on %s because of: %s",
-							 filename, e, 
-							 exc_info=logSys.getEffectiveLevel()<=logging.DEBUG)
-			# increase file and common error counters:
-			self.__file404Cnt[filename] += 1
-			self.commonError()
-			if self.__file404Cnt[filename] > 50:
-				logSys.warning("Too many errors. Remove file %r from monitoring process", filename)
-				self.__file404Cnt[filename] = 0
-				self.delLogPath(filename)
+			return self.__statError(filename, e)
+		return self.__checkStats(filename, logStats)
+
+	def __checkStats(self, filename, logStats):
+		stats = logStats.st_mtime, logStats.st_ino, logStats.st_size
+		pstats = self.__prevStats.get(filename, (0,))
+		if logSys.getEffectiveLevel() <= 4:
+			# we do not want to waste time on strftime etc if not necessary
+			dt = logStats.st_mtime - pstats[0]
+			logSys.log(4, "Checking %s for being modified. Previous/current stats: %s / %s. dt: %s",
+			           filename, pstats, stats, dt)
+			# os.system("stat %s | grep Modify" % filename)
+		if filename in self.__file404Cnt:
+			self.__file404Cnt[filename] = 0
+		if pstats == stats:
 			return False
+		logSys.debug("%s has been modified", filename)
+		self.__prevStats[filename] = stats
+		return True
+
+	def __statError(self, filename, e):
+		# still alive (may be deleted because multi-threaded):
+		if not self.getLog(filename) or self.__prevStats.get(filename) is None:
+			logSys.warning("Log %r seems to be down: %s", filename, e)
+			return False
+		# log error:
+		if self.__file404Cnt[filename] < 2:
+			if getattr(e, 'errno', None) == 2:
+				logSys.debug("Log absence detected (possibly rotation) for %s, reason: %s",
+						 filename, e)
+			else: # pragma: no cover
+				logSys.error("Unable to get stat on %s because of: %s",
+						 filename, e, 
+						 exc_info=logSys.getEffectiveLevel()<=logging.DEBUG)
+		# increase file and common error counters:
+		self.__file404Cnt[filename] += 1
+		self.commonError()
+		if self.__file404Cnt[filename] > 50:
+			logSys.warning("Too many errors. Remove file %r from monitoring process", filename)
+			self.__file404Cnt[filename] = 0
+			self.delLogPath(filename)
+		return False
 
 	def getPendingPaths(self):
 		return list(self.__file404Cnt.keys())
@@ -69,8 +69,8 @@ class FilterPyinotify(FileFilter):
 	# Initialize the filter object with default values.
 	# @param jail the jail object
 
-	def __init__(self, jail):
-		FileFilter.__init__(self, jail)
+	def __init__(self, jail, **kwargs):
+		FileFilter.__init__(self, jail, **kwargs)
 		# Pyinotify watch manager
 		self.__monitor = pyinotify.WatchManager()
 		self.__notifier = None
@@ -23,6 +23,7 @@ __copyright__ = "Copyright (c) 2013 Steven Hiscocks"
 __license__ = "GPL"
 
 import os
+import threading
 import time
 
 from glob import glob
@@ -83,6 +84,217 @@ def _globJournalFiles(flags=None, path=None):
 	return filesSet if filesSet else None
 
 
+class JournalDispatcher(object): # pragma: systemd no cover
+	"""Journal dispatcher, shared by all systemd jails with option `shared`.
+
+	Single thread reads the journal (one reader per distinct journal arguments),
+	whose match set is the union of `journalmatch` of all subscribed jails, and
+	routes each entry to the jails whose matches it satisfies.  So a write to the
+	journal wakes up the dispatcher and the interested jails only.
+	Each subscriber has own position (time of last routed entry), thus the reader
+	can be moved back for a jail starting later (entries already seen by other jails
+	are skipped for them).  A jail which doesn't accept entries (idle or its queue
+	is full) is paused (its position stays) and resumed later from its position.
+	The data threshold of the reader is the largest one of subscribed jails.
+	The thread is started with first subscription and ends if no jail is
+	subscribed anymore.
+	"""
+
+	## Max count of entries read at once (before notification of subscribers):
+	BATCH_SIZE = 100
+
+	_instances = {}
+	_instanceLock = threading.Lock()
+
+	@classmethod
+	def getInstance(cls, args):
+		key = repr(sorted((k, v) for k, v in args.items() if k != 'converters'))
+		with cls._instanceLock:
+			d = cls._instances.get(key)
+			if d is None:
+				d = cls._instances[key] = cls(args)
+			return d
+
+	class _Sub(object):
+		__slots__ = ('flt', 'groups', 'pos', 'routed', 'endSent', 'paused', 'resume')
+		def __init__(self, flt, pos):
+			self.flt = flt
+			self.groups = ()
+			# time of last routed entry (entries before are skipped after seek back):
+			self.pos = pos
+			self.routed = False
+			self.endSent = False
+			# no entries routed (jail idle or queue full), resume requested:
+			self.paused = False
+			self.resume = False
+
+	def __init__(self, args):
+		self.__args = args
+		self.__lock = threading.Lock()
+		self.__subs = {}
+		self.__changed = True
+		self.__seekTime = None
+		# time of last read entry:
+		self.__lastTime = None
+		# default data threshold of reader (set by open of reader):
+		self.__defThreshold = None
+		self.__thread = None
+
+	def subscribe(self, flt, startTime):
+		"""Subscribes filter, entries are routed to it starting from startTime.
+		"""
+		with self.__lock:
+			self.__subs[flt] = self._Sub(flt, startTime)
+			self.__changed = True
+			if self.__seekTime is None or startTime < self.__seekTime:
+				self.__seekTime = startTime
+			if self.__thread is None:
+				self.__thread = threading.Thread(target=self.__run, name="f2b/journal")
+				self.__thread.daemon = True
+				self.__thread.start()
+
+	def unsubscribe(self, flt):
+		"""Unsubscribes filter (thread ends if no subscriber remains).
+		"""
+		with self.__lock:
+			if self.__subs.pop(flt, None) is not None:
+				self.__changed = True
+
+	def resume(self, flt):
+		"""Resumes routing of entries to paused filter (from its last position).
+		"""
+		with self.__lock:
+			sub = self.__subs.get(flt)
+			if sub is None or not sub.paused:
+				return
+			# paused till the reader is moved back to position of the filter:
+			sub.resume = True
+			if self.__seekTime is None or sub.pos < self.__seekTime:
+				self.__seekTime = sub.pos
+
+	def update(self, flt):
+		"""Notifies the dispatcher about changed journal matches of filter.
+		"""
+		with self.__lock:
+			if flt in self.__subs:
+				self.__changed = True
+
+	def __setMatches(self, reader, subs):
+		reader.flush_matches()
+		fields = set(FilterSystemd.ENTRY_FIELDS)
+		# data threshold of the largest one of subscribers (None - default of reader):
+		threshold = [sub.flt.getDataThreshold() or self.__defThreshold for sub in subs]
+		threshold = max([t for t in threshold if t is not None] or [None])
+		if threshold is not None:
+			reader.data_threshold = threshold
+		for sub in subs:
+			sub.groups = JournalFilter.compileJournalMatches(sub.flt.getJournalMatch())
+			for group in sub.groups:
+				fields.update(group)
+			sub.endSent = False
+		# union of matches (if some jail has no matches, it needs all entries):
+		if all(sub.groups for sub in subs):
+			for sub in subs:
+				for match in sub.flt.getJournalMatch():
+					for m in match:
+						reader.add_match(m)
+					reader.add_disjunction()
+		return fields
+
+	def __dispatch(self, reader, subs, fields, projected):
+		pending = {}
+		# positions before the batch (restored if filter doesn't accept the entries):
+		start = dict((sub, (sub.pos, sub.routed)) for sub in subs)
+		cnt = 0
+		while cnt < self.BATCH_SIZE:
+			if projected:
+				raw = JournalFilter.readJournalFields(reader, fields)
+				if raw is None:
+					break
+				rt = reader._get_realtime() / 1000000.0
+				entry = None
+			else:
+				entry = raw = reader.get_next()
+				if not entry:
+					break
+				rt = entry['__REALTIME_TIMESTAMP'].timestamp()
+			cnt += 1
+			self.__lastTime = rt
+			for sub in subs:
+				if sub.paused or rt < sub.pos or (rt == sub.pos and sub.routed):
+					continue
+				if not JournalFilter.journalEntryMatches(sub.groups, raw):
+					continue
+				sub.pos, sub.routed = rt, True
+				if entry is None:
+					# convert fields used by formatJournalEntry (once for all jails):
+					entry = JournalFilter.convertJournalEntry(reader, raw)
+				pending.setdefault(sub, []).append(entry)
+		for sub, entries in pending.items():
+			with self.__lock:
+				if not sub.flt.putJournalEntries(entries):
+					# jail is idle or its queue is full - pause it, entries are routed again after resume:
+					sub.pos, sub.routed = start[sub]
+					sub.paused = True
+		if not cnt:
+			# end of journal reached - notify jails once (switch to in operation mode):
+			for sub in subs:
+				if not sub.endSent and not sub.paused:
+					sub.endSent = True
+					sub.flt.putJournalEntries(None)
+		return cnt
+
+	def __run(self):
+		logSys.debug("Journal dispatcher started")
+		reader = None
+		subs = []
+		try:
+			while True:
+				with self.__lock:
+					if not self.__subs:
+						self.__thread = None
+						break
+					changed, self.__changed = self.__changed, False
+					seekTime, self.__seekTime = self.__seekTime, None
+					if changed:
+						subs = list(self.__subs.values())
+					# resumed jails get entries again (reader is moved back to their position below):
+					for sub in subs:
+						if sub.resume:
+							sub.paused = sub.resume = False
+				try:
+					if reader is None:
+						reader = journal.Reader(**self.__args)
+						self.__defThreshold = reader.data_threshold
+						projected = JournalFilter.journalProjection(reader)
+						changed = True
+					if changed:
+						fields = self.__setMatches(reader, subs)
+					if changed or seekTime is not None:
+						# position is lost by change of matches - continue from last read entry,
+						# or move back if new jail starts earlier (or paused jail resumes):
+						tm = [t for t in (seekTime, self.__lastTime) if t is not None]
+						reader.seek_realtime(float(min(tm) if tm else MyTime.time()))
+					if self.__dispatch(reader, subs, fields, projected):
+						continue
+					# wait for entries (or timeout to check subscribers):
+					if reader.wait(min(Utils.DEFAULT_SLEEP_TIME, min(sub.flt.sleeptime for sub in subs))) == journal.INVALIDATE:
+						# move back and forth to ensure do not end up in dead space by rotation or vacuuming:
+						if reader.get_previous(): reader.get_next()
+				except Exception as e: # pragma: no cover
+					logSys.error("Caught unhandled exception in journal dispatcher: %r", e,
+						exc_info=logSys.getEffectiveLevel()<=logging.DEBUG)
+					# reopen journal:
+					if reader is not None:
+						reader.close()
+						reader = None
+					time.sleep(Utils.DEFAULT_SLEEP_TIME)
+		finally:
+			if reader is not None:
+				reader.close()
+		logSys.debug("Journal dispatcher stopped")
+
+
 ##
 # Journal reader class.
 #
@@ -91,23 +303,50 @@ def _globJournalFiles(flags=None, path=None):
 # a Jail object.
 
 class FilterSystemd(JournalFilter): # pragma: systemd no cover
+
 	##
 	# Constructor.
 	#
 	# Initialize the filter object with default values.
 	# @param jail the jail object
+	# @param batchsize max count of entries processed at once (before service tasks, DB update etc)
+	# @param datathreshold max size of data fields loaded from journal (larger are truncated)
+	# @param shared use journal reader shared with other jails (see JournalDispatcher)
 
-	def __init__(self, jail, **kwargs):
+	def __init__(self, jail, batchsize=100, datathreshold=None, shared=False, **kwargs):
 		self.__jrnlargs = FilterSystemd._getJournalArgs(kwargs)
 		JournalFilter.__init__(self, jail, **kwargs)
 		self.__modified = 0
-		# Initialise systemd-journal connection
-		self.__journal = journal.Reader(**self.__jrnlargs)
+		self.__batchSize = max(1, int(batchsize))
+		self.__dataThreshold = int(datathreshold) if datathreshold else None
+		# time of last processed entry (None if end of journal reached), used for lag in status:
+		self.__lastEntryTime = None
+		self.__shared = _as_bool(shared)
+		self.__dispatcher = None
+		if self.__shared:
+			# entries routed by dispatcher (None as end of journal marker), bounded by
+			# batchsize (dispatcher pauses the jail if it doesn't accept entries):
+			self.__pending = []
+			self.__pendPaused = False
+			self.__pendCond = threading.Condition()
+			self.__journal = None
+		else:
+			# Initialise systemd-journal connection
+			self.__journal = journal.Reader(**self.__jrnlargs)
+			self._initJournal()
 		self.__matches = []
 		self.__bypassInvalidateMsg = 0
 		self.setDatePattern(None)
 		logSys.debug("Created FilterSystemd")
 
+	def _initJournal(self):
+		"""Applies settings of reader (also after reopen).
+		"""
+		if self.__dataThreshold:
+			self.__journal.data_threshold = self.__dataThreshold
+		# reader is able to load single fields (projection, otherwise get_next loads all fields):
+		self.__projected = self.journalProjection(self.__journal)
+
 	@staticmethod
 	def _getJournalArgs(kwargs):
 		args = {'converters':{'__CURSOR': lambda x: x}}
@@ -198,6 +437,7 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 				# cannot reopen in that way, so simply recreate reader:
 				self.closeJournal()
 				self.__journal = journal.Reader(**self.__jrnlargs)
+		self._initJournal()
 		# restore journalmatch specified for the jail:
 		self.resetJournalMatches()
 		# just to avoid "Invalidate signaled" happening again after reopen:
@@ -209,6 +449,12 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 	# @param matches list structure with journal matches
 
 	def _addJournalMatches(self, matches):
+		if self.__shared:
+			# shared reader - matches are applied by dispatcher:
+			self.__matches.extend([list(match) for match in matches])
+			if self.__dispatcher:
+				self.__dispatcher.update(self)
+			return
 		if self.__matches:
 			self.__journal.add_disjunction() # Add OR
 		newMatches = []
@@ -248,7 +494,8 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 	# @return None 
 
 	def resetJournalMatches(self):
-		self.__journal.flush_matches()
+		if not self.__shared:
+			self.__journal.flush_matches()
 		logSys.debug("[%s] Flushed all journal matches", self.jailName)
 		match_copy = self.__matches[:]
 		self.__matches = []
@@ -296,6 +543,32 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 	def getJournalReader(self):
 		return self.__journal
 
+	def getDataThreshold(self):
+		return self.__dataThreshold
+
+	def getNextEntry(self):
+		"""Reads next journal entry (or None if end of journal reached).
+
+		Only the fields used by formatJournalEntry are loaded and converted (if
+		supported by reader), so large or many custom fields of entry cost nothing.
+		Note multiple values of same field are reduced to the first one in this case.
+		"""
+		jnl = self.__journal
+		if not self.__projected:
+			return jnl.get_next()
+		raw = self.readJournalFields(jnl, self.ENTRY_FIELDS)
+		if raw is None:
+			return None
+		return self.convertJournalEntry(jnl, raw)
+
+	def getEntryCursor(self, logentry):
+		"""Returns cursor of entry (read from journal if not loaded with the entry).
+		"""
+		cursor = logentry.get('__CURSOR')
+		if cursor is None:
+			cursor = self.__journal._get_cursor()
+		return cursor
+
 	def getJrnEntTime(self, logentry):
 		""" Returns time of entry as tuple (ISO-str, Posix)."""
 		date = logentry.get('_SOURCE_REALTIME_TIMESTAMP')
@@ -358,6 +631,30 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 			date = float(date)
 		self.__journal.seek_realtime(date)
 
+	def putJournalEntries(self, entries):
+		"""Called by dispatcher (shared reader) with entries routed to this jail,
+		or with None if end of journal is reached.
+
+		Returns False if entries are not accepted (jail is idle or its queue is full),
+		the dispatcher routes them again after resume (see `_runShared`).
+		"""
+		with self.__pendCond:
+			if entries is None:
+				self.__pending.append(None)
+			elif self.idle or len(self.__pending) >= self.__batchSize:
+				self.__pendPaused = True
+				return False
+			else:
+				self.__pending.extend(entries)
+			self.__pendCond.notify()
+		return True
+
+	def stop(self):
+		super(FilterSystemd, self).stop()
+		if self.__shared:
+			with self.__pendCond:
+				self.__pendCond.notify()
+
 	def inOperationMode(self):
 		self.inOperation = True
 		logSys.info("[%s] Jail is in operation now (process new journal entries)", self.jailName)
@@ -378,6 +675,9 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 				"Jail regexs will be checked against all journal entries, "
 				"which is not advised for performance reasons.", self.jailName)
 
+		if self.__shared:
+			return self._runShared()
+
 		# Save current cursor position (to recognize in operation mode):
 		logentry = None
 		try:
@@ -398,7 +698,7 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 			# Not in operation while we'll read old messages ...
 			self.inOperation = False
 			# Save current time in order to check time to switch "in operation" mode
-			startTime = (1, MyTime.time(), logentry.get('__CURSOR'))
+			startTime = (1, MyTime.time(), self.getEntryCursor(logentry))
 		else:
 			# empty journal or no entries for current filter:
 			self.inOperationMode()
@@ -462,54 +762,49 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 							self._reopenJournal()
 							wcode = journal.NOP
 				self.__modified = 0
-				while self.active:
-					logentry = None
-					try:
-						logentry = self.__journal.get_next()
-					except OSError as e:
-						logSys.error("Error reading line from systemd journal: %s",
-							e, exc_info=logSys.getEffectiveLevel() <= logging.DEBUG)
-					self.ticks += 1
-					if logentry:
-						line, tm = self.formatJournalEntry(logentry)
-						# switch "in operation" mode if we'll find start entry (+ some delta):
-						if not self.inOperation:
-							if tm >= MyTime.time() - 1: # reached now (approximated):
-								self.inOperationMode()
-							elif startTime[0] == 1:
-								# if it reached start entry (or get read time larger than start time)
-								if logentry.get('__CURSOR') == startTime[2] or tm > startTime[1]:
-									# give the filter same time it needed to reach the start entry:
-									startTime = (0, MyTime.time()*2 - startTime[1])
-							elif tm > startTime[1]: # reached start time (approximated):
+				# current time cached for the batch:
+				with MyTime.coarseClock():
+					while self.active:
+						logentry = None
+						try:
+							logentry = self.getNextEntry()
+						except OSError as e:
+							logSys.error("Error reading line from systemd journal: %s",
+								e, exc_info=logSys.getEffectiveLevel() <= logging.DEBUG)
+						self.ticks += 1
+						if logentry:
+							line, tm = self.formatJournalEntry(logentry)
+							# switch "in operation" mode if we'll find start entry (+ some delta):
+							if not self.inOperation:
+								if tm >= MyTime.time() - 1: # reached now (approximated):
+									self.inOperationMode()
+								elif startTime[0] == 1:
+									# if it reached start entry (or get read time larger than start time)
+									if tm > startTime[1] or self.getEntryCursor(logentry) == startTime[2]:
+										# give the filter same time it needed to reach the start entry:
+										startTime = (0, MyTime.time()*2 - startTime[1])
+								elif tm > startTime[1]: # reached start time (approximated):
+									self.inOperationMode()
+							# process line
+							self.processLineAndAdd(line, tm)
+							self.__lastEntryTime = tm
+							self.__modified += 1
+							if self.__modified >= self.__batchSize:
+								wcode = journal.APPEND; # don't need wait - there are still unprocessed entries
+								break
+						else:
+							# "in operation" mode since we don't have messages anymore (reached end of journal):
+							if not self.inOperation:
 								self.inOperationMode()
-						# process line
-						self.processLineAndAdd(line, tm)
-						self.__modified += 1
-						if self.__modified >= 100: # todo: should be configurable
-							wcode = journal.APPEND; # don't need wait - there are still unprocessed entries
+							self.__lastEntryTime = None
+							wcode = journal.NOP; # enter wait - no more entries to process
 							break
-					else:
-						# "in operation" mode since we don't have messages anymore (reached end of journal):
-						if not self.inOperation:
-							self.inOperationMode()
-						wcode = journal.NOP; # enter wait - no more entries to process
-						break
 				self.__modified = 0
 				if self.ticks % 10 == 0:
 					self.performSvc()
 				# update position in log (time and iso string):
-				if self.jail.database:
-					if line:
-						self._pendDBUpdates['systemd-journal'] = (tm, line[1])
-						line = None
-					if self._pendDBUpdates and (
-				    self.ticks % 100 == 0
-				    or MyTime.time() >= self._nextUpdateTM
-				    or not self.active
-				  ):
-						self._updateDBPending()
-						self._nextUpdateTM = MyTime.time() + Utils.DEFAULT_SLEEP_TIME * 5
+				self._updateJournalPos(line and (tm, line[1]))
+				line = None
 			except Exception as e: # pragma: no cover
 				if not self.active: # if not active - error by stop...
 					break
@@ -527,6 +822,79 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 		logSys.debug("[%s] filter exited (systemd)", self.jailName)
 		return True
 
+	def _runShared(self):
+		"""Main loop by shared reader, processes entries routed by dispatcher.
+		"""
+		# Seek to max(last_known_time, now - findtime) in journal
+		startTime = 0
+		if self.jail.database is not None:
+			startTime = self.jail.database.getJournalPos(self.jail, 'systemd-journal') or 0
+		startTime = max(startTime, MyTime.time() - int(self.getFindTime()))
+		# Not in operation while we'll read old messages ...
+		self.inOperation = False
+		self.__dispatcher = JournalDispatcher.getInstance(self.__jrnlargs)
+		self.__dispatcher.subscribe(self, startTime)
+		line = None
+		try:
+			while self.active:
+				try:
+					if self.idle:
+						# entries are not routed in idle mode (dispatcher resumes from last position
+						# afterwards), entries already queued remain unprocessed till end of idle:
+						if not Utils.wait_for(lambda: not self.active or not self.idle,
+							self.sleeptime * 10, self.sleeptime
+						):
+							self.ticks += 1
+							continue
+					with self.__pendCond:
+						# dispatcher paused the jail (idle or queue was full) - resume if queue has space:
+						resume = self.__pendPaused and len(self.__pending) < self.__batchSize
+						if resume:
+							self.__pendPaused = False
+						elif not self.__pending and self.active:
+							self.__pendCond.wait(self.sleeptime)
+						# process at most batchsize entries at once:
+						pending = self.__pending[:self.__batchSize]
+						del self.__pending[:self.__batchSize]
+					if resume:
+						self.__dispatcher.resume(self)
+					self.ticks += 1
+					# current time cached for the batch:
+					with MyTime.coarseClock():
+						for logentry in pending:
+							if not self.active:
+								break
+							if logentry is None:
+								# "in operation" mode since we don't have messages anymore (reached end of journal):
+								if not self.inOperation:
+									self.inOperationMode()
+								self.__lastEntryTime = None
+								continue
+							line, tm = self.formatJournalEntry(logentry)
+							if not self.inOperation and tm >= MyTime.time() - 1: # reached now (approximated):
+								self.inOperationMode()
+							self.processLineAndAdd(line, tm)
+							self.__lastEntryTime = tm
+					if self.ticks % 10 == 0:
+						self.performSvc()
+					# update position in log (time and iso string):
+					self._updateJournalPos(line and (tm, line[1]))
+					line = None
+				except Exception as e: # pragma: no cover
+					if not self.active: # if not active - error by stop...
+						break
+					logSys.error("Caught unhandled exception in main cycle: %r", e,
+						exc_info=logSys.getEffectiveLevel()<=logging.DEBUG)
+					# incr common error counter:
+					self.commonError("unhandled", e)
+		finally:
+			self.__dispatcher.unsubscribe(self)
+
+		logSys.debug("[%s] filter terminated", self.jailName)
+		self.done()
+		logSys.debug("[%s] filter exited (systemd, shared)", self.jailName)
+		return True
+
 	def closeJournal(self):
 		try:
 			jnl, self.__journal = self.__journal, None
@@ -543,8 +911,34 @@ class FilterSystemd(JournalFilter): # pragma: systemd no cover
 			return ret
 		ret.append(("Journal matches",
 			[" + ".join(" ".join(match) for match in self.__matches)]))
+		ret.append(("Journal lag", self.getLag()))
 		return ret
 
+	def getLag(self):
+		"""Lag of the reader in seconds (time of last processed entry against now),
+		0 if end of journal is reached.
+		"""
+		tm = self.__lastEntryTime
+		if tm is None:
+			return 0
+		return max(0, int(MyTime.time() - tm))
+
+	def _updateJournalPos(self, pos=None):
+		"""Updates position in journal (time and iso string of last processed entry),
+		written to database in batches (each 100 ticks, 5 sleep intervals or on stop).
+		"""
+		if not self.jail.database:
+			return
+		if pos:
+			self._pendDBUpdates['systemd-journal'] = pos
+		if self._pendDBUpdates and (
+			self.ticks % 100 == 0
+			or MyTime.time() >= self._nextUpdateTM
+			or not self.active
+		):
+			self._updateDBPending()
+			self._nextUpdateTM = MyTime.time() + Utils.DEFAULT_SLEEP_TIME * 5
+
 	def _updateDBPending(self):
 		"""Apply pending updates (journal position) to database.
 		"""
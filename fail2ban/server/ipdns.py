@@ -700,6 +700,8 @@ IPAddr.IP6_4COMPAT = IPAddr("::ffff:0:0", 96)
 class IPAddrSet(set):
 
 	hasSubNet = 0
+	# index of subnets (built on demand by first check, reset by modification):
+	_netIndex = None
 
 	def __init__(self, ips=[]):
 		ips, subnet = IPAddrSet._list2set(ips)
@@ -725,16 +727,62 @@ class IPAddrSet(set):
 		self.clear()
 		self.update(ips)
 		self.hasSubNet = subnet
+		self._netIndex = None
 
 	def add(self, ip):
 		if not isinstance(ip, IPAddr): ip = IPAddr(ip)
-		self.hasSubNet |= not ip.isSingle
+		if not ip.isSingle:
+			self.hasSubNet = 1
+			self._netIndex = None
 		set.add(self, ip)
 
+	def discard(self, ip):
+		set.discard(self, ip)
+		self._netIndex = None
+
+	def remove(self, ip):
+		set.remove(self, ip)
+		self._netIndex = None
+
+	def _buildNetIndex(self):
+		"""Build index of subnets, to find the network of IP in O(prefix-lengths).
+
+		Subnets are grouped by family and prefix length (longest prefix first), so
+		the lookup masks the address once per distinct prefix length and checks it
+		in the hash set of networks.  Entries not representable as network (DNS)
+		are returned as list of others (checked as before).
+		"""
+		nets = {}
+		other = []
+		for n in self:
+			if n.isSingle:
+				continue
+			if n.family not in (socket.AF_INET, socket.AF_INET6):
+				other.append(n)
+				continue
+			nets.setdefault(n.family, {}).setdefault(n.plen, set()).add(n.addr)
+		for fam, plens in nets.items():
+			full = 0xFFFFFFFF if fam == socket.AF_INET else 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF
+			nets[fam] = tuple((full ^ (full >> plen), addrs)
+				for plen, addrs in sorted(plens.items(), reverse=True))
+		self._netIndex = idx = (nets, tuple(other))
+		return idx
+
 	def __contains__(self, ip):
 		if not isinstance(ip, IPAddr): ip = IPAddr(ip)
 		# IP can be found directly or IP is in each subnet:
-		return set.__contains__(self, ip) or (self.hasSubNet and any(n.contains(ip) for n in self))
+		if set.__contains__(self, ip):
+			return True
+		if not self.hasSubNet:
+			return False
+		nets, other = self._netIndex or self._buildNetIndex()
+		nets = nets.get(ip.family)
+		if nets:
+			addr = ip.addr
+			for mask, addrs in nets:
+				if (addr & mask) in addrs:
+					return True
+		return any(n.contains(ip) for n in other)
 
 
 class FileIPAddrSet(IPAddrSet):
@@ -747,6 +795,7 @@ class FileIPAddrSet(IPAddrSet):
 	maxUpdateLatency = 1 # latency in seconds to update by changes
 	_nextCheck = 0
 	_fileStats = ()
+	version = 0 # incremented by each (re)load
 
 	def __init__(self, fileName=''):
 		self.fileName = fileName
@@ -792,6 +841,7 @@ class FileIPAddrSet(IPAddrSet):
 					ips = f.read()
 				ips = splitwords(ips, ignoreComments=True)
 				self.set(ips)
+				self.version += 1
 		except Exception as e: # pragma: no cover
 			self._nextCheck += 60; # increase interval to check (to 1 minute, to avoid log flood on errors)
 			if not noError: raise e
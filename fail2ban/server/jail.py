@@ -66,7 +66,7 @@ class Jail(object):
 	#Known backends. Each backend should have corresponding __initBackend method
 	# yoh: stored in a list instead of a tuple since only
 	#      list had .index until 2.6
-	_BACKENDS = ['pyinotify', 'polling', 'systemd']
+	_BACKENDS = ['pyinotify', 'inotify', 'polling', 'systemd']
 
 	def __init__(self, name, backend = "auto", db=None):
 		self.__db = db
@@ -132,6 +132,12 @@ class Jail(object):
 		logSys.info("Jail '%s' uses poller %r" % (self.name, kwargs))
 		self.__filter = FilterPoll(self, **kwargs)
 
+	def _initInotify(self, **kwargs):
+		# Try to use native inotify
+		from .filterinotify import FilterInotify
+		logSys.info("Jail '%s' uses inotify %r" % (self.name, kwargs))
+		self.__filter = FilterInotify(self, **kwargs)
+
 	def _initPyinotify(self, **kwargs):
 		# Try to import pyinotify
 		from .filterpyinotify import FilterPyinotify
@@ -0,0 +1,518 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: t -*-
+# vi: set ft=python sts=4 ts=4 sw=4 noet :
+
+# This file is part of Fail2Ban.
+#
+# Fail2Ban is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Fail2Ban is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Fail2Ban; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+__author__ = "Fail2Ban Developers"
+__copyright__ = "Copyright (c) 2026 Fail2Ban Developers"
+__license__ = "GPL"
+
+import json
+import logging
+import os
+import time
+from threading import RLock
+
+from .banstore import BanStore, _ipNetwork, _json_dumps_safe, _json_loads_safe
+from .mytime import MyTime
+from ..helpers import getLogger
+
+# Gets the instance of the logger.
+logSys = getLogger(__name__)
+
+
+class MemoryBanStore(BanStore):
+	"""In-memory ban store with snapshot file and append-only log.
+
+	All data are hold in memory (lookups of bad IPs are simple dictionary
+	lookups, so much faster as SQLite queries), every modification is
+	appended to the log file `FILE.log`, which is compacted into the
+	snapshot file `FILE` by purge, on close or if the log grows above
+	`snapshotInterval` entries.  The snapshot is written atomically
+	(temporary file, fsync and rename).
+
+	Parameters
+	----------
+	filename : str
+		Store specification `memory:FILE` (or `memory:` to keep data in
+		memory only, without persistence).
+	purgeAge : int
+		Purge age in seconds, used to remove old bans from
+		store during purge.
+
+	Attributes
+	----------
+	filename
+	purgeage
+	"""
+	PREFIX = 'memory:'
+	__version__ = 1
+
+	def __init__(self, filename, purgeAge=24*60*60, outDatedFactor=3):
+		BanStore.__init__(self)
+		self.maxMatches = 10
+		# count of log entries causing a snapshot:
+		self.snapshotInterval = 10000
+		# statistic of last purge (rows removed, time spent):
+		self.purgeStats = {}
+		self._lock = RLock()
+		self._dbFilename = filename
+		self._path = filename[len(self.PREFIX):] if filename.startswith(self.PREFIX) else filename
+		self._purgeAge = purgeAge
+		self._outDatedFactor = outDatedFactor
+		self._bansMergedCache = {}
+		# jail name -> enabled:
+		self._jails = {}
+		# (jail name, path) -> [md5, pos]:
+		self._logs = {}
+		# path -> [md5, time index] (shared by jails):
+		self._logIndex = {}
+		# ip -> list of [jail name, timeofban, bantime, bancount, data] (history):
+		self._bans = {}
+		# ip -> {jail name: (timeofban, bantime, bancount, data)} (bad ips):
+		self._bips = {}
+		self._seq = 0
+		self._logFile = None
+		self._logCount = 0
+		self._load()
+
+	@property
+	def filename(self):
+		"""Specification of the store (`memory:FILE`).
+		"""
+		return self._dbFilename
+
+	@staticmethod
+	def _dataToFile(data):
+		return data.decode('latin-1')
+
+	@staticmethod
+	def _dataFromFile(data):
+		return data.encode('latin-1')
+
+	def _load(self):
+		if not self._path:
+			logSys.info("Connected to fail2ban in-memory ban store (without persistence)")
+			return
+		snapshot = None
+		try:
+			with open(self._path, 'r') as f:
+				snapshot = f.read()
+		except FileNotFoundError:
+			pass
+		with self._lock:
+			if snapshot:
+				snapshot = json.loads(snapshot)
+				if snapshot.get('version', 0) > self.__version__:
+					raise NotImplementedError(
+						"Attempt to load future version %r of ban store" % (snapshot['version'],))
+				self._seq = snapshot['seq']
+				self._jails = dict(snapshot['jails'])
+				for jail, path, md5, pos in snapshot['logs']:
+					self._logs[(jail, path)] = [md5, pos]
+				for path, md5, index in snapshot.get('logindex', ()):
+					self._logIndex[path] = [md5, [tuple(e) for e in index]]
+				for ip, jail, timeofban, bantime, bancount, data in snapshot['bans']:
+					self._bans.setdefault(ip, []).append(
+						[jail, timeofban, bantime, bancount, self._dataFromFile(data)])
+				for ip, jail, timeofban, bantime, bancount, data in snapshot['bips']:
+					self._bips.setdefault(ip, {})[jail] = (
+						timeofban, bantime, bancount, self._dataFromFile(data))
+			# replay log (entries newer than snapshot):
+			replayed = 0
+			try:
+				with open(self._path + '.log', 'r') as f:
+					for line in f:
+						try:
+							seq, op, args = json.loads(line)
+						except ValueError: # pragma: no cover - truncated line (crash during write)
+							logSys.warning("Ignore damaged entry in ban store log: %r", line[:100])
+							continue
+						if seq <= self._seq:
+							continue
+						self._seq = seq
+						self._apply(op, args)
+						replayed += 1
+			except FileNotFoundError:
+				pass
+			logSys.info("Connected to fail2ban in-memory ban store '%s' (%d bad ip(s), %d log entries replayed)",
+				self._path, len(self._bips), replayed)
+			# compact log into new snapshot:
+			self._snapshot()
+
+	def _snapshot(self):
+		"""Writes all data atomically to snapshot file and truncates the log.
+		"""
+		if not self._path:
+			return
+		with self._lock:
+			snapshot = {
+				'version': self.__version__, 'seq': self._seq,
+				'jails': self._jails,
+				'logs': [(jail, path, md5, pos) for (jail, path), (md5, pos) in self._logs.items()],
+				'logindex': [(path, md5, index) for path, (md5, index) in self._logIndex.items()],
+				'bans': [(ip, jail, timeofban, bantime, bancount, self._dataToFile(data))
+					for ip, bans in self._bans.items()
+						for jail, timeofban, bantime, bancount, data in bans],
+				'bips': [(ip, jail, timeofban, bantime, bancount, self._dataToFile(data))
+					for ip, bips in self._bips.items()
+						for jail, (timeofban, bantime, bancount, data) in bips.items()],
+			}
+			tmp = self._path + '.tmp'
+			with open(tmp, 'w') as f:
+				json.dump(snapshot, f)
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmp, self._path)
+			# all entries are in snapshot now - start new log:
+			if self._logFile:
+				self._logFile.close()
+			self._logFile = open(self._path + '.log', 'w')
+			self._logCount = 0
+
+	def _append(self, op, args):
+		"""Applies an operation and appends it to the log.
+		"""
+		with self._lock:
+			self._seq += 1
+			self._apply(op, args)
+			if not self._logFile:
+				return
+			try:
+				self._logFile.write(json.dumps((self._seq, op, args)) + '\n')
+				self._logFile.flush()
+				self._logCount += 1
+				if self._logCount >= self.snapshotInterval:
+					self._snapshot()
+			except (OSError, ValueError) as e: # pragma: no cover
+				logSys.error("Error writing ban store log '%s': %s", self._path, e)
+
+	def _apply(self, op, args):
+		getattr(self, '_op_' + op)(*args)
+
+	def close(self):
+		logSys.debug("Close ban store ...")
+		with self._lock:
+			if self._logFile:
+				self._snapshot()
+				self._logFile.close()
+				self._logFile = None
+		logSys.info("Ban store closed.")
+
+	## -----------------------------------------
+	## operations (applied directly and by replay of the log)
+	## -----------------------------------------
+
+	def _op_addJail(self, name):
+		self._jails[name] = 1
+
+	def _op_delJail(self, name):
+		if name is None:
+			for name in self._jails:
+				self._jails[name] = 0
+		elif name in self._jails:
+			self._jails[name] = 0
+
+	def _op_log(self, jail, path, md5, pos, index=None):
+		self._logs[(jail, path)] = [md5, pos]
+		if index is not None:
+			# shared by jails - the largest index of the file is used:
+			cur = self._logIndex.get(path)
+			if not cur or cur[0] != md5 or len(index) >= len(cur[1]):
+				self._logIndex[path] = [md5, [tuple(e) for e in index]]
+
+	def _op_addBan(self, jail, ip, timeofban, bantime, bancount, data):
+		if isinstance(data, str):
+			data = self._dataFromFile(data)
+		self._bans.setdefault(ip, []).append([jail, timeofban, bantime, bancount, data])
+		self._bips.setdefault(ip, {})[jail] = (timeofban, bantime, bancount, data)
+
+	def _op_delBan(self, jail, ips):
+		if ips is None:
+			ips = list(self._bips.keys() | self._bans.keys())
+		for ip in ips:
+			bips = self._bips.get(ip)
+			if bips:
+				bips.pop(jail, None)
+				if not bips:
+					del self._bips[ip]
+			bans = self._bans.get(ip)
+			if bans:
+				bans = [b for b in bans if b[0] != jail]
+				if bans:
+					self._bans[ip] = bans
+				else:
+					del self._bans[ip]
+
+	def _purgeData(self, purgeTime):
+		stats = {'bans': 0, 'bips': 0, 'jails': 0}
+		for ip in list(self._bans):
+			bans = self._bans[ip]
+			n = len(bans)
+			bans = [b for b in bans if b[1] >= purgeTime]
+			stats['bans'] += n - len(bans)
+			if bans:
+				self._bans[ip] = bans
+			else:
+				del self._bans[ip]
+		# bad ips whose time since last ban is several times out-dated (not permanent):
+		purgeTime = int(purgeTime)
+		for ip in list(self._bips):
+			bips = self._bips[ip]
+			for jail in [jail for jail, (timeofban, bantime, _, _) in bips.items()
+				if timeofban < purgeTime and bantime != -1
+					and timeofban + bantime * self._outDatedFactor < purgeTime
+			]:
+				del bips[jail]
+				stats['bips'] += 1
+			if not bips:
+				del self._bips[ip]
+		# remove disabled jails without bans (and logs of them):
+		used = set()
+		for bans in self._bans.values():
+			used.update(b[0] for b in bans)
+		for bips in self._bips.values():
+			used.update(bips)
+		for jail in [jail for jail, enabled in self._jails.items()
+			if not enabled and jail not in used
+		]:
+			del self._jails[jail]
+			stats['jails'] += 1
+			for key in [key for key in self._logs if key[0] == jail]:
+				del self._logs[key]
+		# time index of files not monitored anymore:
+		used = set(path for (_, path) in self._logs)
+		for path in [path for path in self._logIndex if path not in used]:
+			del self._logIndex[path]
+		return stats
+
+	## -----------------------------------------
+	## ban store interface
+	## -----------------------------------------
+
+	def addJail(self, jail):
+		with self._lock:
+			if self._jails.get(jail.name) != 1:
+				self._append('addJail', (jail.name,))
+
+	def delJail(self, jail):
+		with self._lock:
+			self._forgetLogs(jail)
+			self._append('delJail', (jail.name,))
+
+	def delAllJails(self):
+		with self._lock:
+			self._forgetLogs()
+			self._append('delJail', (None,))
+
+	def getJailNames(self, enabled=None):
+		with self._lock:
+			return set(name for name, e in self._jails.items()
+				if enabled is None or e == int(enabled))
+
+	def addLog(self, jail, container):
+		return self._addLog(jail, container.getFileName(), container.getPos(), container.getHash())
+
+	def _addLog(self, jail, name, pos=0, md5=None):
+		with self._lock:
+			firstLineMD5, lastLinePos = self._logs.get((jail.name, name), (None, None))
+			if firstLineMD5 is None and (pos or md5 is not None):
+				self._append('log', (jail.name, name, md5, pos))
+			if md5 is not None and md5 != firstLineMD5:
+				lastLinePos = None
+			return lastLinePos
+
+	def getLogPaths(self, jail=None):
+		with self._lock:
+			return set(path for (j, path) in self._logs
+				if jail is None or j == jail.name)
+
+	def updateLog(self, jail, container):
+		self._append('log', (jail.name, container.getFileName(), container.getHash(), container.getPos(),
+			container.getTimeIndex()))
+
+	def _updateLogs(self, logs):
+		with self._lock:
+			for jail, name, pos, md5, index in logs:
+				# avoid repeated writing of unchanged index (shared by jails):
+				if index is not None and self._logIndex.get(name) == [md5, index]:
+					index = None
+				self._append('log', (jail.name, name, md5, pos, index))
+
+	def getLogTimeIndex(self, container):
+		md5 = container.getHash()
+		with self._lock:
+			md5i, index = self._logIndex.get(container.getFileName(), (None, None))
+		if not md5 or md5 != md5i:
+			return None
+		return [tuple(e) for e in index]
+
+	def getJournalPos(self, jail, name, time=0, iso=None):
+		return self._addLog(jail, name, time, iso)
+
+	def updateJournal(self, jail, name, time, iso):
+		self._append('log', (jail.name, name, iso, time))
+
+	def addBan(self, jail, ticket):
+		ip = str(ticket.getID())
+		data = ticket.getData()
+		matches = data.get('matches')
+		if self.maxMatches:
+			if matches and len(matches) > self.maxMatches:
+				data = data.copy()
+				data['matches'] = matches[-self.maxMatches:]
+		elif matches:
+			data = data.copy()
+			del data['matches']
+		data = _json_dumps_safe(data)
+		if not isinstance(data, bytes):
+			data = data.encode('latin-1')
+		with self._lock:
+			self._invalidateBansMerged(ip, jail)
+			self._append('addBan', (jail.name, ip, int(round(ticket.getTime())),
+				ticket.getBanTime(jail.actions.getBanTime()), ticket.getBanCount(),
+				self._dataToFile(data)))
+
+	def delBan(self, jail, *args):
+		self._append('delBan', (jail.name, [str(ip) for ip in args] if args else None))
+
+	def _getBans(self, jail=None, bantime=None, ip=None):
+		with self._lock:
+			mintime = None
+			if bantime is not None and bantime >= 0:
+				mintime = MyTime.time() - bantime
+			ips = (str(ip),) if ip is not None else sorted(self._bans)
+			rows = []
+			for ip in ips:
+				bans = [b for b in self._bans.get(ip, ())
+					if (jail is None or b[0] == jail.name) and (mintime is None or b[1] > mintime)]
+				bans.sort(key=lambda b: b[1], reverse=True)
+				rows.extend((ip, b[1], _json_loads_safe(b[4])) for b in bans)
+			return rows
+
+	def getBan(self, ip, jail=None, forbantime=None, overalljails=None, fromtime=None):
+		ip = str(ip)
+		with self._lock:
+			bips = self._bips.get(ip)
+			if not bips:
+				return []
+			if not overalljails and jail is not None:
+				rows = bips.get(jail.name)
+				rows = (rows,) if rows else ()
+			else:
+				rows = bips.values()
+			if forbantime is not None:
+				mintime = MyTime.time() - forbantime
+				rows = [r for r in rows if r[0] > mintime]
+			if fromtime is not None:
+				rows = [r for r in rows if r[0] > fromtime]
+			if not rows:
+				return []
+			if overalljails:
+				return [(sum(r[2] for r in rows), max(r[0] for r in rows), sum(r[1] for r in rows))]
+			r = max(rows, key=lambda r: r[0])
+			return [(r[2], r[0], r[1])]
+
+	def _getCurrentBansRows(self, jail=None, ip=None, forbantime=None, fromtime=None):
+		with self._lock:
+			mintime = None
+			if forbantime not in (None, -1): # not specified or persistent (all)
+				mintime = fromtime - forbantime
+			ips = (ip,) if ip is not None else sorted(self._bips)
+			rows = []
+			for ip in ips:
+				bips = self._bips.get(ip)
+				if not bips:
+					continue
+				if jail is not None:
+					r = bips.get(jail.name)
+					bips = (r,) if r else ()
+				else:
+					bips = bips.values()
+				bips = [r for r in bips
+					if (r[0] + r[1] > fromtime or r[1] <= -1) and (mintime is None or r[0] > mintime)]
+				if not bips:
+					continue
+				timeofban, bantime, bancount, data = max(bips, key=lambda r: r[0])
+				rows.append((ip, timeofban, bantime, bancount, _json_loads_safe(data)))
+			return rows
+
+	def _iterBans(self, jail, since):
+		for ip, bans in self._bans.items():
+			for b in bans:
+				if (jail is None or b[0] == jail.name) and (since is None or b[1] > since):
+					yield ip, b
+
+	@staticmethod
+	def _countStats(stats, limit, key):
+		rows = sorted(((k, v[0], len(v[1])) for k, v in stats.items()), key=key)
+		return rows[:limit] if limit is not None else rows
+
+	def _getBansByPrefix(self, jail, since, limit, bits4, bits6):
+		stats = {}
+		with self._lock:
+			for ip, b in self._iterBans(jail, since):
+				st = stats.setdefault(_ipNetwork(ip, bits4, bits6), [0, set()])
+				st[0] += 1
+				st[1].add(ip)
+		return self._countStats(stats, limit, key=lambda r: (-r[1], r[0]))
+
+	def _getBansPerDay(self, jail, since, limit):
+		stats = {}
+		with self._lock:
+			for ip, b in self._iterBans(jail, since):
+				st = stats.setdefault(time.strftime('%Y-%m-%d', time.localtime(b[1])), [0, set()])
+				st[0] += 1
+				st[1].add(ip)
+		rows = self._countStats(stats, None, key=lambda r: r[0])
+		rows.reverse()
+		return rows[:limit] if limit is not None else rows
+
+	def _getJailOverlap(self, jail, since, limit):
+		stats = {}
+		with self._lock:
+			for ip, bans in self._bans.items():
+				jails = set(b[0] for b in bans if since is None or b[1] > since)
+				for j1 in jails:
+					if jail is not None and j1 != jail.name:
+						continue
+					for j2 in jails:
+						if j2 == j1 or (jail is None and j2 < j1):
+							continue
+						stats[(j1, j2)] = stats.get((j1, j2), 0) + 1
+		rows = sorted((k[0], k[1], v) for k, v in stats.items())
+		rows.sort(key=lambda r: -r[2])
+		return rows[:limit] if limit is not None else rows
+
+	def purge(self):
+		"""Purge old bans, jails and log files from store.
+
+		Afterwards a new snapshot is written (compacts the log).
+		"""
+		stime = time.time()
+		with self._lock:
+			self._bansMergedCache = {}
+			purgeTime = MyTime.time() - self._purgeAge
+			stats = self._purgeData(purgeTime)
+			self._snapshot()
+		stats['chunks'] = 1
+		stats['time'] = time.time() - stime
+		self.purgeStats = stats
+		logSys.log(logging.INFO if (stats['bans'] or stats['bips'] or stats['jails']) else logging.DEBUG,
+			"Purge ban store: removed %(bans)d ban(s), %(bips)d bad ip(s),"
+			" %(jails)d jail(s), %(time).3f sec", stats)
+		return stats
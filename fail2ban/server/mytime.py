@@ -23,6 +23,7 @@ __license__ = "GPL"
 
 import datetime
 import re
+import threading
 import time
 
 
@@ -43,6 +44,8 @@ class MyTime:
 	myTime = None
 	alternateNowTime = None
 	alternateNow = None
+	# coarse clock (current time cached per thread within coarseClock block):
+	_coarse = threading.local()
 
 	@staticmethod
 	def setAlternateNow(t):
@@ -80,6 +83,37 @@ class MyTime:
 		else:
 			return MyTime.myTime
 
+	@staticmethod
+	def coarse():
+		"""Coarse variant of time(), returns the time cached by the thread in a
+		coarseClock block (refreshed once per chunk), otherwise as time()
+		"""
+		if MyTime.myTime is None:
+			t = getattr(MyTime._coarse, 'now', None)
+			return t if t is not None else time.time()
+		return MyTime.myTime
+
+	@staticmethod
+	def refreshCoarse():
+		"""Refresh the cached time of the thread (if inside of coarseClock block)
+		"""
+		c = MyTime._coarse
+		if getattr(c, 'now', None) is not None:
+			c.now = time.time()
+
+	class coarseClock():
+		"""Context manager caching the current time for the thread (see coarse).
+		Ex: with MyTime.coarseClock():
+		      for line in chunk: ... MyTime.coarse() ...
+		"""
+		def __enter__(self):
+			c = MyTime._coarse
+			self._prev = getattr(c, 'now', None)
+			c.now = time.time()
+			return self
+		def __exit__(self, *args):
+			MyTime._coarse.now = self._prev
+
 	@staticmethod
 	def gmtime():
 		"""Decorate time.gmtime() for the purpose of testing mocking
@@ -35,6 +35,7 @@ import sys
 from .observer import Observers, ObserverThread
 from .jails import Jails
 from .filter import DNSUtils, FileFilter, JournalFilter
+from .mytime import MyTime
 from .transmitter import Transmitter
 from .asyncserver import AsyncServer, AsyncServerException
 from .. import version
@@ -48,6 +49,7 @@ DEF_SYSLOGSOCKET = "auto"
 DEF_LOGLEVEL = "INFO"
 DEF_LOGTARGET = "STDOUT"
 
+from .memorystore import MemoryBanStore
 try:
 	from .database import Fail2BanDb
 except ImportError: # pragma: no cover
@@ -389,6 +391,24 @@ class Server:
 			logSys.debug("Jail %s is not a FileFilter instance" % name)
 			return []
 	
+	def addLogGlob(self, name, pattern, tail=False):
+		filter_ = self.__jails[name].filter
+		if isinstance(filter_, FileFilter):
+			filter_.addLogGlob(pattern, tail)
+	
+	def delLogGlob(self, name, pattern):
+		filter_ = self.__jails[name].filter
+		if isinstance(filter_, FileFilter):
+			filter_.delLogGlob(pattern)
+	
+	def getLogGlob(self, name):
+		filter_ = self.__jails[name].filter
+		if isinstance(filter_, FileFilter):
+			return filter_.getLogGlobs()
+		else: # pragma: systemd no cover
+			logSys.debug("Jail %s is not a FileFilter instance" % name)
+			return []
+	
 	def addJournalMatch(self, name, match): # pragma: systemd no cover
 		filter_ = self.__jails[name].filter
 		if isinstance(filter_, JournalFilter):
@@ -586,6 +606,43 @@ class Server:
 		"""
 		return self.__jails[name].actions.getBanList(withTime)
 
+	def getBanStats(self, name, kind, args=()):
+		"""Returns aggregated statistic of bans stored in database.
+
+		Parameters
+		----------
+		name : str
+			The name of a jail or '--all' for all jails.
+		kind : str
+			Kind of statistic (see `BanStore.getBanStats`).
+		args : list
+			Positional arguments of the statistic (e. g. prefix length),
+			as well as options '--since <TIME>' and '--limit <N>'.
+
+		Returns
+		-------
+		list
+			Rows of the statistic.
+		"""
+		if self.__db is None:
+			raise ValueError("Statistic %r not available since no database" % kind)
+		jail = self.__jails[name] if name != '--all' else None
+		opts = {}
+		prefix = []
+		args = list(args)
+		while args:
+			opt = args.pop(0)
+			if opt in ('--since', '--limit'):
+				if not args:
+					raise ValueError("Missing value of option %r" % opt)
+				if opt == '--since':
+					opts['since'] = MyTime.time() - MyTime.str2seconds(args.pop(0))
+				else:
+					opts['limit'] = int(args.pop(0))
+			else:
+				prefix.append(int(opt))
+		return self.__db.getBanStats(kind, jail, prefix=prefix, **opts)
+
 	def setBanTimeExtra(self, name, opt, value):
 		self.__jails[name].setBanTimeExtra(opt, value)
 
@@ -837,7 +894,12 @@ class Server:
 		if filename.lower() == "none":
 			self.__db = None
 		else:
-			if Fail2BanDb is not None:
+			if filename.startswith(MemoryBanStore.PREFIX):
+				# in-memory ban store (with snapshot file), doesn't need sqlite:
+				_make_file_path(filename[len(MemoryBanStore.PREFIX):])
+				self.__db = MemoryBanStore(filename)
+				self.__db.delAllJails()
+			elif Fail2BanDb is not None:
 				_make_file_path(filename)
 				self.__db = Fail2BanDb(filename)
 				self.__db.delAllJails()
@@ -157,6 +157,9 @@ def validateTimeZone(tz):
 	tz = m.groups()
 	return zone2offset(tz, 0)
 
+# offset of zone given as string (e. g. '+0200', 'CEST', 'UTC-0430'):
+_TZ_STR_OFFS = {}
+
 def zone2offset(tz, dt):
 	"""Return the proper offset, in minutes according to given timezone at a given time.
 
@@ -172,7 +175,13 @@ def zone2offset(tz, dt):
 	if isinstance(tz, int):
 		return tz
 	if isinstance(tz, str):
-		return validateTimeZone(tz)
+		# offsets are fixed (abbreviations without automatic DST-switch), so cache it:
+		tzo = _TZ_STR_OFFS.get(tz)
+		if tzo is None:
+			if len(_TZ_STR_OFFS) >= 1000: # pragma: no cover - too many zones
+				_TZ_STR_OFFS.clear()
+			tzo = _TZ_STR_OFFS[tz] = validateTimeZone(tz)
+		return tzo
 	tz, tzo = tz
 	if tzo is None or tzo == '': # without offset
 		return TZ_ABBR_OFFS[tz]
@@ -186,7 +195,7 @@ def zone2offset(tz, dt):
 		# [+-]hh:mm --> [+-]1 * (hh*60 + mm)
 		return TZ_ABBR_OFFS[tz] + (-1 if tzo[0] == '-' else 1) * (int(tzo[1:3])*60 + int(tzo[4:6]))
 
-def reGroupDictStrptime(found_dict, msec=False, default_tz=None):
+def reGroupDictStrptime(found_dict, msec=False, default_tz=None, year_ctx=None):
 	"""Return time from dictionary of strptime fields
 
 	This is tweaked from python built-in _strptime.
@@ -198,6 +207,7 @@ def reGroupDictStrptime(found_dict, msec=False, default_tz=None):
 		respective value.
 	default_tz : default timezone to apply if nothing relevant is in found_dict
                      (may be a non-fixed one in the future)
+	year_ctx : YearContext used to assume the year if it is missing (optional)
 	Returns
 	-------
 	float
@@ -278,8 +288,13 @@ def reGroupDictStrptime(found_dict, msec=False, default_tz=None):
 			else:
 				tzoffset = zone2offset(z, 0); # currently offset-based only
 
-	# Fail2Ban will assume it's this year
+	# Fail2Ban will assume it's this year (or last year, using context of last date if given):
 	assume_year = False
+	if year is None and year_ctx is not None and month is not None and day is not None:
+		if tzoffset is None and default_tz is not None:
+			year = year_ctx.assume(month, day, hour, minute, second, zone2offset(default_tz, None))
+		else:
+			year = year_ctx.assume(month, day, hour, minute, second, tzoffset)
 	if year is None:
 		if not now: now = MyTime.now()
 		year = now.year
@@ -325,20 +340,176 @@ def reGroupDictStrptime(found_dict, msec=False, default_tz=None):
 	if assume_year:
 		if not now: now = MyTime.now()
 		if date_result > now + datetime.timedelta(days=1): # ignore by timezone issues (+24h)
-			# assume last year - also reset month and day as it's not yesterday...
-			date_result = date_result.replace(
-				year=year-1, month=month, day=day)
+			# assume last year - also reset month and day as it's not yesterday
+			# (if today assumed, otherwise keep it shifted by zone offset)...
+			if assume_today:
+				date_result = date_result.replace(
+					year=year-1, month=month, day=day)
+			else:
+				date_result = date_result.replace(year=date_result.year-1)
 
 	# make time:
 	if tzoffset is not None:
 		tm = calendar.timegm(date_result.utctimetuple())
 	else:
-		tm = time.mktime(date_result.timetuple())
+		tm = localEpoch(date_result.year, date_result.month, date_result.day,
+			date_result.hour, date_result.minute, date_result.second)
 	if msec: # pragma: no cover - currently unused
 		tm += fraction/1000000.0
 	return tm
 
 
+# abbreviated month name (lower case) -> month number:
+_A_MONTH_IDX = dict((m, i) for i, m in enumerate(locale_time.a_month) if m)
+# (year, month) -> days since epoch of 1st day of month:
+_MONTH_DAYS = {}
+_EPOCH_ORD = datetime.date(1970, 1, 1).toordinal()
+
+def _timegm(year, month, day, hour, minute, second):
+	"""Integer variant of calendar.timegm (days of month are cached)."""
+	try:
+		days = _MONTH_DAYS[(year, month)]
+	except KeyError:
+		days = _MONTH_DAYS[(year, month)] = datetime.date(year, month, 1).toordinal() - _EPOCH_ORD
+	return ((days + day - 1) * 24 + hour) * 3600 + minute * 60 + second
+
+# offsets of local time (seconds) by hour (year, month, day, hour):
+_LOCAL_OFFS = {}
+_LOCAL_OFFS_TZ = [None]
+
+def localOffset(year, month, day, hour):
+	"""Return offset of local time (seconds) for the hour (cached, so to convert local
+	time it is enough to subtract it from the naive timestamp).
+
+	Returns None if offset changes within the hour (DST switch not at full hour).
+	"""
+	# reset if time zone changed (tzset):
+	if _LOCAL_OFFS_TZ[0] is not time.tzname:
+		_LOCAL_OFFS.clear()
+		_LOCAL_OFFS_TZ[0] = time.tzname
+	key = (year, month, day, hour)
+	try:
+		return _LOCAL_OFFS[key]
+	except KeyError:
+		pass
+	if len(_LOCAL_OFFS) >= 1000:
+		_LOCAL_OFFS.clear()
+	t = _timegm(year, month, day, hour, 0, 0)
+	off = t - time.mktime((year, month, day, hour, 0, 0, 0, 0, -1))
+	if t + 3599 - time.mktime((year, month, day, hour, 59, 59, 0, 0, -1)) != off: # pragma: no cover
+		off = None
+	_LOCAL_OFFS[key] = off
+	return off
+
+def precomputeLocalOffsets(tm=None):
+	"""Precompute offsets of local time for all hours of the day (default today).
+	"""
+	lt = time.localtime(MyTime.time() if tm is None else tm)
+	for hour in range(24):
+		localOffset(lt.tm_year, lt.tm_mon, lt.tm_mday, hour)
+
+def localEpoch(year, month, day, hour, minute, second):
+	"""Return time from local time fields (as time.mktime, but using cached offset of hour).
+	"""
+	off = localOffset(year, month, day, hour)
+	if off is None: # pragma: no cover
+		return time.mktime((year, month, day, hour, minute, second, 0, 0, -1))
+	return float(_timegm(year, month, day, hour, minute, second) - off)
+
+class YearContext(object):
+	"""Stateful inference of year for dates without year (one per date detector).
+
+	The year is assumed as by reGroupDictStrptime (current year or last year if the
+	date is in the future), but the decision is saved together with the bounds it
+	remains valid within.  So the progressing dates get the year without building of
+	current datetime, and the full inference runs at real boundaries only (new year,
+	date close to the future limit, time moving backwards).
+	"""
+	__slots__ = ('year', 'dec', 'limit', 'nowTime', 'yearEnd', 'fallbacks')
+
+	def __init__(self):
+		self.year = None
+		self.fallbacks = 0
+
+	def assume(self, month, day, hour, minute, second, tzoffset=None):
+		"""Return year assumed for the date (naive fields, tzoffset in minutes)"""
+		now = MyTime.time()
+		year = self.year
+		if year is not None and self.nowTime <= now < self.yearEnd:
+			# naive time stamp in current year (the limit is naive also, 1h as tolerance of DST):
+			tm = _timegm(year + self.dec, month, day, hour, minute, second) - (tzoffset or 0) * 60
+			if self.dec:
+				# still in the future (limit grows with time):
+				if tm > self.limit + (now - self.nowTime) + 3600:
+					return year
+			elif tm <= self.limit - 3600:
+				return year
+		# full inference:
+		self.fallbacks += 1
+		dt = MyTime.now()
+		year = dt.year
+		self.limit = _timegm(year, dt.month, dt.day, dt.hour, dt.minute, dt.second) + 86400
+		self.dec = int(_timegm(year, month, day, hour, minute, second) - (tzoffset or 0) * 60 > self.limit)
+		self.nowTime = now
+		self.yearEnd = localEpoch(year + 1, 1, 1, 0, 0, 0)
+		self.year = year = year - self.dec
+		return year
+
+
+def _fastEpoch(year, month, day, hour, minute, second, z, default_tz, assume_year=False,
+	year_ctx=None
+):
+	"""Return time from integer fields (fast path of reGroupDictStrptime).
+
+	Returns None for anything unusual (possibly invalid date, leap second),
+	so the caller falls back to the generic conversion.
+	"""
+	if day > 28 or hour > 23 or second > 59:
+		return None
+	if z is not None:
+		tzoffset = 0 if z in ("Z", "UTC", "GMT") else zone2offset(z, 0)
+	elif default_tz is not None:
+		tzoffset = zone2offset(default_tz, None)
+	else:
+		tzoffset = None
+	if assume_year and year_ctx is not None:
+		year = year_ctx.assume(month, day, hour, minute, second, tzoffset)
+	elif assume_year:
+		# Fail2Ban will assume it's this year (or last year if in the future):
+		now = MyTime.now()
+		year = now.year
+		if _timegm(year, month, day, hour, minute, second) - (tzoffset or 0) * 60 > \
+				_timegm(year, now.month, now.day, now.hour, now.minute, now.second) + 86400:
+			year -= 1
+	if tzoffset is not None:
+		return _timegm(year, month, day, hour, minute, second) - tzoffset * 60
+	return localEpoch(year, month, day, hour, minute, second)
+
+def fastStrptimeISO(dateMatch, default_tz=None, year_ctx=None):
+	"""Fast conversion of match for `%ExY-%m-%d %H:%M:%S(?:.%f)?(?: %z)?`.
+	"""
+	Y, m, d, H, M, S, z = dateMatch.group('Y', 'm', 'd', 'H', 'M', 'S', 'z')
+	return _fastEpoch(int(Y), int(m), int(d), int(H), int(M), int(S), z, default_tz)
+
+def fastStrptimeApache(dateMatch, default_tz=None, year_ctx=None):
+	"""Fast conversion of match for `%d/%b/%ExY:%H:%M:%S(?:.%f)?(?: %z)?`.
+	"""
+	d, b, Y, H, M, S, z = dateMatch.group('d', 'b', 'Y', 'H', 'M', 'S', 'z')
+	m = _A_MONTH_IDX.get(b.lower())
+	if m is None:
+		return None
+	return _fastEpoch(int(Y), m, int(d), int(H), int(M), int(S), z, default_tz)
+
+def fastStrptimeSyslog(dateMatch, default_tz=None, year_ctx=None):
+	"""Fast conversion of match for `(?:%a )?%b %d %k:%M:%S(?:.%f)?(?: %ExY)?`.
+	"""
+	b, d, H, M, S, Y = dateMatch.group('b', 'd', 'H', 'M', 'S', 'Y')
+	m = _A_MONTH_IDX.get(b.lower())
+	if m is None:
+		return None
+	return _fastEpoch(int(Y) if Y else 0, m, int(d), int(H), int(M), int(S), None, default_tz,
+		assume_year=not Y, year_ctx=year_ctx)
+
 TZ_ABBR_OFFS = {'':0, None:0}
 TZ_STR = '''
 	-12 Y
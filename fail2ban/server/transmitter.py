@@ -211,6 +211,24 @@ class Transmitter:
 				db.purgeage = command[1]
 				if self.__quiet: return
 				return db.purgeage
+		elif name == "dbcheckpointbytes":
+			db = self.__server.getDatabase()
+			if db is None:
+				logSys.log(logging.MSG, "dbcheckpointbytes setting was not in effect since no db yet")
+				return None
+			else:
+				db.checkpointBytes = int(command[1])
+				if self.__quiet: return
+				return db.checkpointBytes
+		elif name == "dbcheckpointtime":
+			db = self.__server.getDatabase()
+			if db is None:
+				logSys.log(logging.MSG, "dbcheckpointtime setting was not in effect since no db yet")
+				return None
+			else:
+				db.checkpointTime = command[1]
+				if self.__quiet: return
+				return db.checkpointTime
 		# Jail
 		elif command[1] == "idle":
 			if command[2] == "on":
@@ -265,6 +283,24 @@ class Transmitter:
 			self.__server.delLogPath(name, value)
 			if self.__quiet: return
 			return self.__server.getLogPath(name)
+		elif command[1] == "addlogglob":
+			value = command[2]
+			tail = False
+			if len(command) == 4:
+				if command[3].lower()  == "tail":
+					tail = True
+				elif command[3].lower() != "head":
+					raise ValueError("File option must be 'head' or 'tail'")
+			elif len(command) > 4:
+				raise ValueError("Only one glob can be added at a time")
+			self.__server.addLogGlob(name, value, tail)
+			if self.__quiet: return
+			return self.__server.getLogGlob(name)
+		elif command[1] == "dellogglob":
+			value = command[2]
+			self.__server.delLogGlob(name, value)
+			if self.__quiet: return
+			return self.__server.getLogGlob(name)
 		elif command[1] == "logencoding":
 			value = command[2]
 			self.__server.setLogEncoding(name, value)
@@ -440,12 +476,29 @@ class Transmitter:
 				return None
 			else:
 				return db.purgeage
+		elif name == "dbcheckpointbytes":
+			db = self.__server.getDatabase()
+			if db is None:
+				return None
+			else:
+				return db.checkpointBytes
+		elif name == "dbcheckpointtime":
+			db = self.__server.getDatabase()
+			if db is None:
+				return None
+			else:
+				return db.checkpointTime
+		elif command[1:2] == ["stats"] and len(command) >= 3:
+			# aggregated statistic of bans in database (jail or --all):
+			return self.__server.getBanStats(name, command[2], command[3:])
 		# Jail, Filter
 		elif command[1] == "banned":
 			# check IP is banned in all jails:
 			return self.__server.banned(name, command[2:])
 		elif command[1] == "logpath":
 			return self.__server.getLogPath(name)
+		elif command[1] == "logglob":
+			return self.__server.getLogGlob(name)
 		elif command[1] == "logencoding":
 			return self.__server.getLogEncoding(name)
 		elif command[1] == "journalmatch": # pragma: systemd no cover
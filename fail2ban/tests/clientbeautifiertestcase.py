@@ -340,7 +340,19 @@ class BeautifierTest(unittest.TestCase):
 		output = "The jail sshd action iptables has the following methods:\n"
 		output += "ban, unban"
 		self.assertEqual(self.b.beautify(["ban", "unban"]), output)
-	
+
+	def testBanStats(self):
+		self.b.setInputCmd(["get", "sshd", "stats", "bans-by-prefix", "24"])
+		self.assertEqual(self.b.beautify([]), "No bans found")
+		output = ("Statistic bans-by-prefix for the jail sshd:\n"
+			"|- 192.0.2.0/24:\t5 ban(s), 2 IP(s)\n"
+			"`- 2001:db8::/64:\t1 ban(s), 1 IP(s)")
+		self.assertEqual(self.b.beautify([("192.0.2.0/24", 5, 2), ("2001:db8::/64", 1, 1)]), output)
+		self.b.setInputCmd(["get", "--all", "stats", "jail-overlap"])
+		output = ("Statistic jail-overlap for all jails:\n"
+			"`- sshd + postfix:\t3 IP(s)")
+		self.assertEqual(self.b.beautify([("sshd", "postfix", 3)]), output)
+
 #	def testException(self):
 #		self.b.setInputCmd(["get", "sshd", "logpath"])
 #		self.assertRaises(self.b.beautify(1), TypeError)
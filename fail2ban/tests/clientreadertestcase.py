@@ -1044,6 +1044,29 @@ filter = testfilter1
 		self.assertLogged('Have not found any log file for')
 		self.assertEqual(s, [['config-error', "Jail 'testjail1' skipped, because of missing log files."]])
 
+	@with_tmpdir
+	def testLogPathGlobWatch(self, basedir):
+		with open(os.path.join(basedir, "jail.conf"), 'w') as jailfd:
+			jailfd.write("""
+[testjail1]
+enabled = true
+backend = polling
+logpath = %s/vhosts/*.log tail
+          %s/jail.conf
+globwatch = true
+action = 
+filter = 
+failregex = test <HOST>
+""" % (basedir, basedir))
+		jails = JailsReader(basedir=basedir)
+		self.assertTrue(jails.read())
+		self.assertTrue(jails.getOptions())
+		# glob is sent to server (also without matching files), simple path as usual:
+		comm_commands = jails.convert()
+		self.assertIn(['set', 'testjail1', 'addlogglob', basedir + '/vhosts/*.log', 'tail'], comm_commands)
+		self.assertIn(['set', 'testjail1', 'addlogpath', basedir + '/jail.conf', 'head'], comm_commands)
+		self.assertNotIn('globwatch', [c[2] for c in comm_commands if len(c) > 2])
+
 	def testLogPathSystemdBackend(self):
 		try: # pragma: systemd no cover
 			from ..server.filtersystemd import FilterSystemd
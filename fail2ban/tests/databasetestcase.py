@@ -28,12 +28,16 @@ import unittest
 import tempfile
 import sqlite3
 import shutil
+import time
 
 from ..server.filter import FileContainer, Filter
 from ..server.mytime import MyTime
 from ..server.ticket import FailTicket
 from ..server.actions import Actions, Utils
 from .dummyjail import DummyJail
+from ..server import banstore
+from ..server.banstore import BanStore
+from ..server.memorystore import MemoryBanStore
 try:
 	from ..server import database
 	Fail2BanDb = database.Fail2BanDb
@@ -72,7 +76,7 @@ class DatabaseTest(LogCaptureTestCase):
 		return self._db
 	@db.setter
 	def db(self, value):
-		if isinstance(self._db, Fail2BanDb): # pragma: no cover
+		if isinstance(self._db, BanStore): # pragma: no cover
 			self._db.close()
 		self._db = value
 
@@ -289,6 +293,108 @@ class DatabaseTest(LogCaptureTestCase):
 			self.db.addLog(self.jail, self.fileContainer), None)
 		os.remove(filename)
 
+	def testCheckpointLogs(self):
+		self._testAddLog()
+		filename = self.fileContainer.getFileName()
+		jail2 = DummyJail(name='DummyJail-2')
+		self.db.addJail(jail2)
+		with open(filename, "w") as f:
+			f.write("Some text to write which will change md5sum\n" * 10)
+		cont2 = FileContainer(filename, "utf-8")
+		cont = self.fileContainer = FileContainer(filename, "utf-8")
+		cont.setPos(45)
+		cont2.setPos(90)
+		self.db.checkpointBytes = 100
+		self.db.checkpointTime = 60
+		stime = MyTime.time()
+		MyTime.setTime(stime)
+		try:
+			# first time - written for both jails (in single transaction):
+			self.db.pendLog(self.jail, cont)
+			self.db.pendLog(jail2, cont2)
+			self.assertEqual(self.db.checkpointLogs(), 2)
+			self.assertEqual(self.db.addLog(self.jail, FileContainer(filename, "utf-8")), 45)
+			self.assertEqual(self.db.addLog(jail2, FileContainer(filename, "utf-8")), 90)
+			# moved lesser than threshold:
+			cont.setPos(90)
+			self.db.pendLog(self.jail, cont)
+			# checkpoint interval is not yet elapsed:
+			self.assertEqual(self.db.checkpointLogs(), 0)
+			MyTime.setTime(stime + 10)
+			self.assertEqual(self.db.checkpointLogs(), 0)
+			self.assertEqual(self.db.addLog(self.jail, FileContainer(filename, "utf-8")), 45)
+			# moved above threshold:
+			cont.setPos(450)
+			self.db.pendLog(self.jail, cont)
+			MyTime.setTime(stime + 20)
+			self.assertEqual(self.db.checkpointLogs(), 1)
+			self.assertEqual(self.db.addLog(self.jail, FileContainer(filename, "utf-8")), 450)
+			# time threshold:
+			cont2.setPos(135)
+			self.db.pendLog(jail2, cont2)
+			MyTime.setTime(stime + 30)
+			self.assertEqual(self.db.checkpointLogs(), 0)
+			MyTime.setTime(stime + 65)
+			self.assertEqual(self.db.checkpointLogs(), 1)
+			self.assertEqual(self.db.addLog(jail2, FileContainer(filename, "utf-8")), 135)
+			# force (stop) writes regardless thresholds and interval:
+			cont2.setPos(180)
+			self.db.pendLog(jail2, cont2)
+			cont.setPos(405)
+			self.db.pendLog(self.jail, cont)
+			self.assertEqual(self.db.checkpointLogs(force=True, jail=jail2), 1)
+			self.assertEqual(self.db.addLog(jail2, FileContainer(filename, "utf-8")), 180)
+			self.assertEqual(self.db.addLog(self.jail, FileContainer(filename, "utf-8")), 450)
+			self.assertEqual(self.db.checkpointLogs(force=True), 1)
+			self.assertEqual(self.db.addLog(self.jail, FileContainer(filename, "utf-8")), 405)
+			# nothing pending anymore:
+			self.assertEqual(self.db.checkpointLogs(force=True), 0)
+			# removed log - pending position is written, checkpoint state is forgotten:
+			cont.setPos(450)
+			self.db.pendLog(self.jail, cont)
+			self.db.delLog(self.jail, filename)
+			self.assertEqual(self.db.addLog(self.jail, FileContainer(filename, "utf-8")), 450)
+			self.assertNotIn((self.jail.name, filename), self.db._lastLogs)
+			self.assertNotIn((self.jail.name, filename), self.db._pendLogs)
+			# removed jail - checkpoint state is forgotten:
+			cont2.setPos(225)
+			self.db.pendLog(jail2, cont2)
+			self.assertIn((jail2.name, filename), self.db._lastLogs)
+			self.db.delJail(jail2)
+			self.assertEqual(self.db._lastLogs, {})
+			self.assertEqual(self.db._pendLogs, {})
+		finally:
+			MyTime.setTime(None)
+			os.remove(filename)
+
+	def testLogTimeIndex(self):
+		self._testAddLog()
+		filename = self.fileContainer.getFileName()
+		jail2 = DummyJail(name='DummyJail-2')
+		self.db.addJail(jail2)
+		with open(filename, "w") as f:
+			f.write("Some text to write which will change md5sum\n" * 10)
+		index = [(0, 1500000000), (135, 1500000100), (270, 1500000200)]
+		try:
+			cont = FileContainer(filename, "utf-8")
+			# unknown yet:
+			self.assertEqual(self.db.getLogTimeIndex(cont), None)
+			cont.setTimeIndex(index)
+			cont.setPos(405)
+			self.db.pendLog(self.jail, cont)
+			self.assertEqual(self.db.checkpointLogs(force=True), 1)
+			# shared between jails (the same file and hash):
+			self.assertEqual(self.db.getLogTimeIndex(FileContainer(filename, "utf-8")), index)
+			self.db.addLog(jail2, FileContainer(filename, "utf-8"))
+			self.db.updateLog(jail2, FileContainer(filename, "utf-8"))
+			self.assertEqual(self.db.getLogTimeIndex(FileContainer(filename, "utf-8")), index)
+			# hash changed (rotation) - index is invalid:
+			with open(filename, "w") as f:
+				f.write("Some different text to change md5sum\n")
+			self.assertEqual(self.db.getLogTimeIndex(FileContainer(filename, "utf-8")), None)
+		finally:
+			os.remove(filename)
+
 	def testUpdateJournal(self):
 		self.testAddJail() # Jail required
 		# not yet updated:
@@ -343,9 +449,9 @@ class DatabaseTest(LogCaptureTestCase):
 
 		self.pruneLog('[test-phase 2] simulate errors')
 		## simulate errors in dumps/loads:
-		priorEnc = database.PREFER_ENC
+		priorEnc = banstore.PREFER_ENC
 		try:
-			database.PREFER_ENC = 'f2b-test::non-existing-encoding'
+			banstore.PREFER_ENC = 'f2b-test::non-existing-encoding'
 
 			for ticket in tickets:
 				self.db.addBan(self.jail, ticket)
@@ -359,7 +465,7 @@ class DatabaseTest(LogCaptureTestCase):
 			## despite errors all tickets written and loaded (check adapter-handlers are error-safe):
 			self.assertEqual(len(readtickets), 14)
 		finally:
-			database.PREFER_ENC = priorEnc
+			banstore.PREFER_ENC = priorEnc
 		
 		## check the database is still operable (not locked) after all the errors:
 		self.pruneLog('[test-phase 3] still operable?')
@@ -566,6 +672,86 @@ class DatabaseTest(LogCaptureTestCase):
 		self.assertEqual(len(tickets), 1)
 		self.assertEqual(tickets[0].getBanTime(), -1); # current jail ban time.
 
+	def testGetBan(self):
+		self.testAddJail()
+		jail2 = DummyJail(name='DummyJail-2')
+		self.db.addJail(jail2)
+		ip = "192.0.2.1"
+		self.assertEqual(self.db.getBan(ip, self.jail), [])
+		self.assertEqual(self.db.getBan(ip, overalljails=True), [])
+		stime = int(MyTime.time())
+		ticket = FailTicket(ip, stime - 40, ["abc\n"])
+		ticket.setBanCount(1)
+		self.db.addBan(self.jail, ticket)
+		# result of previous call must be invalidated by addBan:
+		self.assertEqual(self.db.getBan(ip, self.jail), [(1, stime - 40, 600)])
+		self.assertEqual(self.db.getBan(ip, jail2), [])
+		ticket = FailTicket(ip, stime - 20, ["abc\n"])
+		ticket.setBanCount(2)
+		self.db.addBan(jail2, ticket)
+		self.assertEqual(self.db.getBan(ip, jail2), [(2, stime - 20, 600)])
+		self.assertEqual(self.db.getBan(ip, self.jail), [(1, stime - 40, 600)])
+		self.assertEqual(self.db.getBan(ip, self.jail, overalljails=True), [(3, stime - 20, 1200)])
+		# time dependent queries:
+		self.assertEqual(self.db.getBan(ip, self.jail, forbantime=30), [])
+		self.assertEqual(self.db.getBan(ip, overalljails=True, forbantime=30), [(2, stime - 20, 600)])
+		self.assertEqual(self.db.getBan(ip, overalljails=True, fromtime=stime - 30), [(2, stime - 20, 600)])
+		# the same result again (cached):
+		self.assertEqual(self.db.getBan(ip, self.jail, overalljails=True), [(3, stime - 20, 1200)])
+		# delete invalidates it also:
+		self.db.delBan(jail2, ip)
+		self.assertEqual(self.db.getBan(ip, jail2), [])
+		self.assertEqual(self.db.getBan(ip, self.jail, overalljails=True), [(1, stime - 40, 600)])
+		self.db.delBan(self.jail)
+		self.assertEqual(self.db.getBan(ip, self.jail), [])
+		self.assertEqual(self.db.getBan(ip, overalljails=True), [])
+
+	def testGetBanStats(self):
+		self.testAddJail()
+		jail2 = DummyJail(name='DummyJail-2')
+		self.db.addJail(jail2)
+		stime = int(MyTime.time())
+		for jail, ip, tm in (
+			(self.jail, "192.0.2.1", stime - 10),
+			(self.jail, "192.0.2.1", stime - 20),
+			(self.jail, "192.0.2.2", stime - 30),
+			(self.jail, "198.51.100.7", stime - 2*24*60*60),
+			(self.jail, "2001:db8::1", stime - 40),
+			(jail2, "192.0.2.2", stime - 50),
+			(jail2, "198.51.100.7", stime - 60),
+		):
+			self.db.addBan(jail, FailTicket(ip, tm, ["abc\n"]))
+		# by prefix:
+		self.assertEqual(self.db.getBanStats('bans-by-prefix'), [
+			("192.0.2.0/24", 4, 2), ("198.51.100.0/24", 2, 1), ("2001:db8::/64", 1, 1)])
+		self.assertEqual(self.db.getBanStats('bans-by-prefix', self.jail, limit=1), [
+			("192.0.2.0/24", 3, 2)])
+		self.assertEqual(self.db.getBanStats('bans-by-prefix', self.jail, since=stime - 25, prefix=[32]), [
+			("192.0.2.1", 2, 1)])
+		self.assertEqual(self.db.getBanStats('bans-by-prefix', jail2, prefix=[8, 32]), [
+			("192.0.0.0/8", 1, 1), ("198.0.0.0/8", 1, 1)])
+		self.assertEqual(self.db.getBanStats('bans-by-prefix', since=stime), [])
+		# per day:
+		day = lambda t: time.strftime('%Y-%m-%d', time.localtime(t))
+		stats = self.db.getBanStats('bans-per-day', self.jail)
+		self.assertEqual(stats[-1], (day(stime - 2*24*60*60), 1, 1))
+		self.assertEqual(sum(r[1] for r in stats), 5)
+		self.assertEqual(self.db.getBanStats('bans-per-day', jail2, since=stime - 55), [
+			(day(stime - 50), 1, 1)])
+		# overlap:
+		self.assertEqual(self.db.getBanStats('jail-overlap'), [
+			(self.jail.name, jail2.name, 2)])
+		self.assertEqual(self.db.getBanStats('jail-overlap', jail2), [
+			(jail2.name, self.jail.name, 2)])
+		self.assertEqual(self.db.getBanStats('jail-overlap', jail2, since=stime - 55), [
+			(jail2.name, self.jail.name, 1)])
+		# invalid arguments:
+		self.assertRaises(ValueError, self.db.getBanStats, 'unknown')
+		self.assertRaises(ValueError, self.db.getBanStats, 'bans-by-prefix', prefix=[33])
+		self.assertRaises(ValueError, self.db.getBanStats, 'bans-by-prefix', prefix=[24, 64, 1])
+		self.assertRaises(ValueError, self.db.getBanStats, 'bans-per-day', prefix=[24])
+		self.assertRaises(ValueError, self.db.getBanStats, 'jail-overlap', limit=-1)
+
 	def testActionWithDB(self):
 		# test action together with database functionality
 		self.testAddJail() # Jail required
@@ -630,3 +816,132 @@ class DatabaseTest(LogCaptureTestCase):
 		self.db.purge() # Should leave jail as ban present
 		self.assertEqual(len(self.db.getJailNames()), 1)
 		self.assertEqual(len(self.db.getBans(jail=self.jail)), 1)
+
+	def testPurgeChunked(self):
+		self.testAddJail()
+		# 25 old bans (IP's have distinct bips entries) and 2 actual bans:
+		for i in range(25):
+			self.db.addBan(self.jail, FailTicket("192.0.2.%d" % i, 1000 + i, ["abc\n"]))
+		for i in range(2):
+			self.db.addBan(self.jail, FailTicket("198.51.100.%d" % i, MyTime.time(), ["abc\n"]))
+		self.db.purgeChunkSize = 10
+		# concurrent lookups between chunks (lock is released) would cache rows purged hereafter:
+		purgeChunk = self.db._purgeChunk
+		def _purgeChunk(*args):
+			self.db.getBan("192.0.2.24", self.jail)
+			self.db.getBansMerged("192.0.2.24", jail=self.jail)
+			return purgeChunk(*args)
+		self.db._purgeChunk = _purgeChunk
+		stats = self.db.purge()
+		del self.db._purgeChunk
+		self.assertEqual(stats, self.db.purgeStats)
+		self.assertEqual((stats['bans'], stats['bips'], stats['jails']), (25, 25, 0))
+		# caches reset after the purge (no stale rows):
+		self.assertEqual(self.db.getBan("192.0.2.24", self.jail), [])
+		self.assertEqual(self.db.getBansMerged("192.0.2.24", jail=self.jail), None)
+		# 3 chunks for bans (10, 10, 5) and bips each:
+		self.assertEqual(stats['chunks'], 6)
+		self.assertTrue(stats['time'] >= 0)
+		self.assertLogged("Purge database: removed 25 ban(s), 25 bad ip(s), 0 jail(s) in 6 chunk(s)")
+		self.assertEqual(len(self.db.getBans(jail=self.jail)), 2)
+		self.assertEqual(len(self.db.getCurrentBans(jail=self.jail)), 2)
+		# nothing to purge anymore:
+		stats = self.db.purge()
+		self.assertEqual((stats['bans'], stats['bips'], stats['chunks']), (0, 0, 2))
+		# new database file supports incremental vacuum (file can shrink by purge):
+		self.assertEqual(self.db._db.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+
+
+class MemoryBanStoreTest(DatabaseTest):
+	"""Same test-cases as for database, but using in-memory ban store (with snapshot)."""
+
+	@property
+	def db(self):
+		if isinstance(self._db, str) and self._db == ':auto-create-in-memory:':
+			self._db = MemoryBanStore(MemoryBanStore.PREFIX + (self.dbFilename or ''))
+		return self._db
+	@db.setter
+	def db(self, value):
+		DatabaseTest.db.fset(self, value)
+
+	def tearDown(self):
+		"""Call after every test case."""
+		if isinstance(self._db, MemoryBanStore):
+			self._db.close()
+		super(MemoryBanStoreTest, self).tearDown()
+		if self.dbFilename is not None:
+			for ext in ('.log', '.tmp'):
+				if os.path.exists(self.dbFilename + ext):
+					os.remove(self.dbFilename + ext)
+
+	def testGetFilename(self):
+		self.assertEqual(MemoryBanStore.PREFIX + (self.dbFilename or ''), self.db.filename)
+
+	def testCreateInvalidPath(self):
+		self.assertRaises(OSError, MemoryBanStore, "memory:/this/path/should/not/exist")
+
+	def testImportWithoutSqlite(self):
+		# memory ban store must not depend on sqlite3 (e. g. builds without it):
+		import subprocess
+		out = subprocess.check_output([sys.executable, "-c",
+			"import sys; sys.modules['sqlite3'] = None\n"
+			"from fail2ban.server.memorystore import MemoryBanStore\n"
+			"from fail2ban.server import server\n"
+			"print(server.Fail2BanDb, 'fail2ban.server.database' in sys.modules)"],
+			cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+		self.assertEqual(out.strip(), b"None False")
+
+	def testCreateAndReconnect(self):
+		if self.dbFilename is None: # pragma: no cover
+			raise unittest.SkipTest("in :memory: database")
+		self.testAddBan()
+		self.db.addBan(self.jail, FailTicket("192.0.2.1", MyTime.time(), ["abc\n"]))
+		self.db.delBan(self.jail, "127.0.0.1")
+		self.db.updateJournal(self.jail, 'systemd-journal', 1500000000, 'TEST')
+		# reconnect without close (simulate crash, replay of the log):
+		self._db = MemoryBanStore(MemoryBanStore.PREFIX + self.dbFilename)
+		self.assertLogged("5 log entries replayed")
+		self.assertIn(self.jail.name, self.db.getJailNames())
+		self.assertEqual([t.getID() for t in self.db.getBans(jail=self.jail)], ["192.0.2.1"])
+		self.assertEqual(self.db.getJournalPos(self.jail, 'systemd-journal'), 1500000000)
+		# close writes snapshot, so nothing to replay after reconnect:
+		self.db = MemoryBanStore(MemoryBanStore.PREFIX + self.dbFilename)
+		self.assertLogged("0 log entries replayed")
+		self.assertEqual([t.getID() for t in self.db.getBans(jail=self.jail)], ["192.0.2.1"])
+		self.assertEqual(len(self.db.getBan("192.0.2.1", self.jail)), 1)
+
+	def testSnapshotInterval(self):
+		if self.dbFilename is None: # pragma: no cover
+			raise unittest.SkipTest("in :memory: database")
+		self.testAddJail()
+		self.db.snapshotInterval = 5
+		for i in range(12):
+			self.db.addBan(self.jail, FailTicket("192.0.2.%d" % i, MyTime.time(), ["abc\n"]))
+		# 13 entries (jail and 12 bans), log compacted twice, 3 entries remaining in log:
+		with open(self.dbFilename + '.log') as f:
+			self.assertEqual(len(f.readlines()), 3)
+		self._db = MemoryBanStore(MemoryBanStore.PREFIX + self.dbFilename)
+		self.assertLogged("12 bad ip(s), 3 log entries replayed")
+		self.assertEqual(len(self.db.getBans(jail=self.jail)), 12)
+
+	def testRepairDb(self):
+		raise unittest.SkipTest("SQLite3 only")
+
+	def testUpdateDb(self):
+		raise unittest.SkipTest("SQLite3 only")
+
+	def testUpdateDb2(self):
+		raise unittest.SkipTest("SQLite3 only")
+
+	def testPurgeChunked(self):
+		self.testAddJail()
+		for i in range(25):
+			self.db.addBan(self.jail, FailTicket("192.0.2.%d" % i, 1000 + i, ["abc\n"]))
+		for i in range(2):
+			self.db.addBan(self.jail, FailTicket("198.51.100.%d" % i, MyTime.time(), ["abc\n"]))
+		stats = self.db.purge()
+		self.assertEqual(stats, self.db.purgeStats)
+		self.assertEqual((stats['bans'], stats['bips'], stats['jails']), (25, 25, 0))
+		self.assertLogged("Purge ban store: removed 25 ban(s), 25 bad ip(s), 0 jail(s)")
+		self.assertEqual(len(self.db.getBans(jail=self.jail)), 2)
+		self.assertEqual(len(self.db.getCurrentBans(jail=self.jail)), 2)
@@ -25,17 +25,26 @@ __copyright__ = "Copyright (c) 2004 Cyril Jaquier"
 __license__ = "GPL"
 
 import unittest
+import calendar
+import os
 import time
 import datetime
 
+from glob import glob
+
 from ..server.datedetector import DateDetector
 from ..server import datedetector
 from ..server.datetemplate import DatePatternRegex, DateTemplate
+from ..server.strptime import reGroupDictStrptime, localEpoch, localOffset, \
+	precomputeLocalOffsets, zone2offset
+from ..server.mytime import MyTime
 from .utils import setUpMyTime, tearDownMyTime, LogCaptureTestCase
 from ..helpers import getLogger
 
 logSys = getLogger("fail2ban")
 
+TEST_FILES_DIR = os.path.join(os.path.dirname(__file__), "files")
+
 
 class DateDetectorTest(LogCaptureTestCase):
 
@@ -405,6 +414,242 @@ class DateDetectorTest(LogCaptureTestCase):
 		finally:
 			datedetector.logLevel = self.__old_eff_level
 
+	def _testTimeCache(self, dd, lines):
+		# match once (only the conversion is measured):
+		matches = [(l, m) for l, m in ((l, dd.matchTime(l)) for l in lines) if m[1]]
+		# generic conversion (strptime for each line):
+		t0 = time.time()
+		generic = [m[1].getDate(l, m[0], default_tz=dd.default_tz) for l, m in matches]
+		t1 = time.time()
+		# conversion using time cache:
+		cached = [dd.getTime(l, m) for l, m in matches]
+		t2 = time.time()
+		logSys.debug('time cache: %d lines, generic %.3f ms, cached %.3f ms',
+			len(matches), (t1 - t0) * 1000, (t2 - t1) * 1000)
+		for (l, m), g, c in zip(matches, generic, cached):
+			self.assertEqual(c and c[0], g and g[0], "wrong time for %r" % l)
+		return len(matches)
+
+	def testTimeCache(self):
+		# micro-benchmark and comparison with generic conversion over sample logs:
+		lines = []
+		for fn in glob(os.path.join(TEST_FILES_DIR, "logs", "*")):
+			if os.path.isfile(fn):
+				with open(fn, 'rb') as f:
+					lines.extend(l.decode('utf-8', 'replace').rstrip('\r\n') for l in f)
+		dd = self.datedetector
+		self.assertTrue(self._testTimeCache(dd, lines) > 1000)
+		self.assertTrue(dd._DateDetector__timeCache)
+		# with default time zone:
+		dd.default_tz = 'UTC+0300'
+		self._testTimeCache(dd, lines)
+		dd.default_tz = None
+		# consecutive lines mostly within the same minute (typical for live logs):
+		lines = ["Aug 14 11:%02d:%02d srv sshd[1]: Failed password for root from 198.51.100.1" % (
+			i // 600, (i // 10) % 60) for i in range(3000)]
+		self._testTimeCache(dd, lines)
+		# DST transitions (local time zone of test-framework is Europe/Zurich):
+		dd = DateDetector()
+		dd.appendTemplate('^%ExY-%Exm-%Exd %H:%M:%S(?: ?%Exz)?')
+		lines = []
+		for d in ('2005-03-27 01:59:%02d', '2005-03-27 02:30:%02d', '2005-03-27 03:00:%02d',
+			'2005-10-30 01:59:%02d', '2005-10-30 02:30:%02d', '2005-10-30 03:00:%02d',
+		):
+			lines.extend(d % sec for sec in (0, 1, 30, 59))
+		lines.extend(l + ' CEST' for l in lines[:])
+		self.assertEqual(self._testTimeCache(dd, lines), len(lines))
+		# leap second (not cached) is still invalid:
+		self.assertEqual(dd.getTime('2005-08-14 12:00:60'), None)
+		self.assertEqual(dd.getTime('2005-08-14 12:00:59')[0], 1124013659)
+
+	def testFastParsers(self):
+		dd = self.datedetector
+		lines = []
+		for d in (
+			# syslog (assumed year, rollover to last year if in the future):
+			'Aug 14 11:59:59', 'Sun Aug 14 11:59:59', 'Aug  4 01:02:03.123', 'Aug 15 12:00:01', 'Dec 31 23:59:59',
+			'Jan  1 00:00:00', 'Aug 14 12:00:00 2005', 'Feb 29 10:00:00', 'Aug 31 10:00:00', 'Aug 14 11:59:60',
+			# ISO 8601:
+			'2005-08-14 11:59:59', '2005-08-14T11:59:59.123', '2005/08/14 11:59:59', '2005.08.14  1:02:03',
+			'2005-08-14T11:59:59Z', '2005-08-14T11:59:59+02:00', '2005-08-14 11:59:59 -0430', '2004-02-29 10:00:00',
+			'2005-10-30 02:30:00', '2005-03-27 02:30:00',
+			# apache:
+			'[14/Aug/2005:11:59:59 +0200]', '[14/Aug/2005:11:59:59 -0000]', '14-Aug-2005 11:59:59.252',
+			'14-Aug-2005 11:59:59 +0200', '31/Aug/2005:11:59:59',
+		):
+			lines.append(d + ' srv test[1]: failure from 198.51.100.1')
+		for tz in (None, 'UTC+0300', 'CEST'):
+			dd.default_tz = tz
+			for line in lines:
+				match, template = dd.matchTime(line)
+				self.assertTrue(template.fastParser, "no fast parser for %r (%s)" % (line, template.name))
+				try:
+					generic = reGroupDictStrptime(match.groupdict(), default_tz=dd.default_tz)
+				except ValueError:
+					generic = None
+				fast = template.fastParser(match, dd.default_tz)
+				# fast is None - fallback to generic conversion:
+				if fast is not None:
+					self.assertEqual(fast, generic, "wrong time for %r with TZ %r" % (line, tz))
+				date = dd.getTime(line, (match, template))
+				self.assertEqual(date and date[0], generic)
+		dd.default_tz = None
+
+	def testLocalOffsetCache(self):
+		# all hours around DST switches (and some arbitrary days) - compare with mktime:
+		for (y, m, d) in ((2005, 3, 26), (2005, 3, 27), (2005, 3, 28), (2005, 10, 29), (2005, 10, 30),
+			(2005, 8, 14), (2004, 2, 29), (2005, 12, 31), (2006, 1, 1)
+		):
+			for H in range(24):
+				for (M, S) in ((0, 0), (15, 30), (59, 59)):
+					self.assertEqual(localEpoch(y, m, d, H, M, S),
+						time.mktime((y, m, d, H, M, S, 0, 0, -1)), (y, m, d, H, M, S))
+		# DST offsets (CET/CEST):
+		self.assertEqual(localOffset(2005, 3, 27, 1), 3600)
+		self.assertEqual(localOffset(2005, 3, 27, 3), 7200)
+		self.assertEqual(localOffset(2005, 10, 30, 3), 3600)
+		# precompute for today:
+		precomputeLocalOffsets()
+		self.assertEqual(localOffset(2005, 8, 14, 0), 7200)
+		self.assertEqual(localOffset(2005, 8, 14, 23), 7200)
+		# cache is reset if time zone gets changed:
+		tz = os.environ.get('TZ')
+		try:
+			os.environ['TZ'] = 'UTC'; time.tzset()
+			self.assertEqual(localOffset(2005, 8, 14, 12), 0)
+			self.assertEqual(localEpoch(2005, 8, 14, 12, 0, 0), 1124020800)
+		finally:
+			os.environ['TZ'] = tz; time.tzset()
+		self.assertEqual(localOffset(2005, 8, 14, 12), 7200)
+		# offsets of zones (cached):
+		for i in range(2):
+			self.assertEqual(zone2offset('CEST', None), 120)
+			self.assertEqual(zone2offset('UTC-0430', None), -270)
+			self.assertEqual(zone2offset('+0200', None), 120)
+
+	def testYearRollover(self):
+		# syslog lines without year across Dec 31 -> Jan 1 (incl. late delivered lines of old year):
+		with open(os.path.join(TEST_FILES_DIR, "testcase-yearrollover.log")) as f:
+			lines = f.read().splitlines()
+		def _expected(line, year):
+			tm = time.strptime(("%s " % year) + line[:15], "%Y %b %d %H:%M:%S")
+			return time.mktime(tm)
+		try:
+			# live (time progresses with the lines, late lines are in the past already):
+			dd = DateDetector()
+			dd.addDefaultTemplate()
+			now = 0
+			for line in lines:
+				year = 2005 if line.startswith('Dec') else 2006
+				now = max(now, _expected(line, year) + 1)
+				MyTime.setTime(now)
+				match = dd.matchTime(line)
+				self.assertEqual(dd.getTime(line, match)[0], _expected(line, year), line)
+				self.assertEqual(reGroupDictStrptime(match[0].groupdict()), _expected(line, year), line)
+			# full inference at start, new year and by late lines only:
+			self.assertEqual(dd._DateDetector__yearCtx.fallbacks, 4)
+			# read afterwards (and again in the next year):
+			for now, years in ((1136070600, (2005, 2006)), (1136070600 + 365*86400, (2006, 2007))):
+				MyTime.setTime(now)
+				dd = DateDetector()
+				dd.addDefaultTemplate()
+				for line in lines:
+					year = years[0] if line.startswith('Dec') else years[1]
+					match = dd.matchTime(line)
+					self.assertEqual(dd.getTime(line, match)[0], _expected(line, year), line)
+					self.assertEqual(reGroupDictStrptime(match[0].groupdict()), _expected(line, year), line)
+				self.assertEqual(dd._DateDetector__yearCtx.fallbacks, 4)
+		finally:
+			setUpMyTime()
+
+	def testYearRolloverZoneShift(self):
+		# date without year, zone offset shifts it across midnight (and new year) - rollover to
+		# last year must keep the shifted day, generic and fast conversion should be equal:
+		def _utc(y, m, d, H, M, offs):
+			return calendar.timegm((y, m, d, H, M, 0, 0, 0, 0)) - offs * 60
+		nyNow = 1136071800 # 2006-01-01 00:30 CET (2005-12-31 23:30 UTC)
+		try:
+			for now, line, tz, expected in (
+				# in the future - last year (offset shifts it to other day):
+				(None, 'Dec 28 01:00:00', 'UTC+0300', _utc(2004, 12, 28, 1, 0, 180)),
+				(None, 'Dec 28 23:00:00', 'UTC-0300', _utc(2004, 12, 28, 23, 0, -180)),
+				# offset shifts it to other year:
+				(None, 'Dec 31 23:30:00', 'UTC-0300', _utc(2004, 12, 31, 23, 30, -180)),
+				(nyNow, 'Dec 31 23:30:00', 'UTC-0300', _utc(2005, 12, 31, 23, 30, -180)),
+				(nyNow, 'Dec 31 01:00:00', 'UTC+0300', _utc(2005, 12, 31, 1, 0, 180)),
+				# not in the future (shifted to last year by offset only):
+				(nyNow, 'Jan  1 01:00:00', 'UTC+0300', _utc(2006, 1, 1, 1, 0, 180)),
+			):
+				if now: MyTime.setTime(now)
+				else: setUpMyTime()
+				dd = DateDetector()
+				dd.addDefaultTemplate()
+				dd.default_tz = tz
+				line += ' srv test[1]: failure from 198.51.100.1'
+				match, template = dd.matchTime(line)
+				generic = reGroupDictStrptime(match.groupdict(), default_tz=tz)
+				self.assertEqual(generic, expected, "wrong time for %r with TZ %r" % (line, tz))
+				fast = template.fastParser(match, tz)
+				# fast is None - fallback to generic conversion:
+				if fast is not None:
+					self.assertEqual(fast, generic, "wrong time for %r with TZ %r" % (line, tz))
+				self.assertEqual(dd.getTime(line, (match, template))[0], expected)
+		finally:
+			setUpMyTime()
+
+	def testLearningFrozenTemplate(self):
+		dd = self.datedetector
+		syslog = "Aug 14 11:%02d:%02d srv sshd[1]: failure from 198.51.100.1"
+		iso = "2005-08-14 11:%02d:%02d srv sshd[1]: failure from 198.51.100.1"
+		# learning by first lines:
+		for i in range(dd.LEARN_LINES - 1):
+			self.assertEqual(dd.getTime(syslog % (i // 60, i % 60))[0], 1124013600 - 3600 + i)
+			self.assertEqual(dd.frozenTemplate, None)
+		self.assertEqual(dd.getTime(syslog % (1, 39))[0], 1124013600 - 3600 + 99)
+		self.assertTrue(dd.frozenTemplate)
+		self.assertLogged("date template frozen after %d lines" % dd.LEARN_LINES)
+		self.assertEqual(dd.getTime(syslog % (2, 0))[0], 1124013600 - 3600 + 120)
+		# line without date doesn't cause fallback:
+		self.assertEqual(dd.getTime("no date in this line"), None)
+		self.assertTrue(dd.frozenTemplate)
+		# other format - found by search, fallback after few misses:
+		for i in range(dd.FROZEN_MAX_MISSES):
+			self.assertTrue(dd.frozenTemplate)
+			self.assertEqual(dd.getTime(iso % (3, i))[0], 1124013600 - 3600 + 180 + i)
+		self.assertEqual(dd.frozenTemplate, None)
+		self.assertLogged("misses %d lines, fallback to search in all templates" % dd.FROZEN_MAX_MISSES)
+		# mixed log - not frozen:
+		for i in range(dd.LEARN_LINES):
+			self.assertTrue(dd.getTime((iso if i % 2 else syslog) % (4, i % 60)))
+		self.assertEqual(dd.frozenTemplate, None)
+
+	def testCombinedSearch(self):
+		# combined regex finds the same dates as search template by template in sample logs:
+		cnt = 0
+		for fn in glob(os.path.join(TEST_FILES_DIR, "logs", "*")):
+			if not os.path.isfile(fn):
+				continue
+			with open(fn, 'rb') as f:
+				lines = [l.decode('utf-8', 'replace').rstrip('\r\n') for l in f]
+			res = []
+			for combined in (False, True):
+				dd = DateDetector()
+				dd.addDefaultTemplate()
+				dd.COMBINED_SEARCH = combined
+				res.append([(d[0], d[1].group(1)) if d else None for d in map(dd.getTime, lines)])
+			for l, d1, d2 in zip(lines, *res):
+				self.assertEqual(d2, d1, "different result for %r in %s" % (l, os.path.basename(fn)))
+				cnt += d2 is not None
+		self.assertTrue(cnt > 1000)
+		# combined regex of default templates (all templates are combinable, lastgroup identifies template):
+		dd = self.datedetector
+		combined = dd._getCombinedRegex()
+		self.assertTrue(combined)
+		line = "srv test[1]: at 2005-08-14 11:59:59 failure"
+		m = combined[1].search(line)
+		self.assertEqual(m.start(), dd.matchTime(line)[0].start())
+		self.assertEqual(combined[2][m.lastgroup].template, dd.matchTime(line)[1])
+
 	def testWrongTemplate(self):
 		t = DatePatternRegex('(%ExY%Exm%Exd')
 		# lazy compiling used, so try match:
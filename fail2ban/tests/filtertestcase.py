@@ -29,6 +29,7 @@ import re
 import sys
 import time, datetime
 import tempfile
+import threading
 import uuid
 
 try:
@@ -38,8 +39,8 @@ except ImportError:
 
 from ..helpers import uni_bytes
 from ..server.jail import Jail
-from ..server.filterpoll import FilterPoll
-from ..server.filter import FailTicket, Filter, FileFilter, FileContainer
+from ..server.filterpoll import FilterPoll, PollScheduler
+from ..server.filter import FailTicket, Filter, FileFilter, FileContainer, JournalFilter, _COMPRESSED_OPENERS
 from ..server.failmanager import FailManagerEmpty
 from ..server.ipdns import asip, getfqdn, DNSUtils, IPAddr, IPAddrSet
 from ..server.mytime import MyTime
@@ -324,6 +325,34 @@ class BasicFilter(unittest.TestCase):
 			if _tm(i) != tm: # pragma: no cover - never reachable
 				self.assertEqual((_tm(i), i), (tm, i))
 
+	def testJournalEntryMatches(self):
+		groups = JournalFilter.compileJournalMatches([
+			["_SYSTEMD_UNIT=sshd.service", "_COMM=sshd"],
+			["_SYSTEMD_UNIT=sshd.service", "_COMM=sshd-session", "_COMM=sshd-auth"],
+			["SYSLOG_IDENTIFIER=dropbear"],
+			["PRIORITY=3", "_BOOT_ID=0123456789abcdef0123456789abcdef"]])
+		m = JournalFilter.journalEntryMatches
+		# raw (bytes) and converted (str) values:
+		self.assertTrue(m(groups, {'_SYSTEMD_UNIT': b'sshd.service', '_COMM': b'sshd'}))
+		self.assertTrue(m(groups, {'_SYSTEMD_UNIT': 'sshd.service', '_COMM': 'sshd-auth'}))
+		self.assertTrue(m(groups, {'SYSLOG_IDENTIFIER': b'dropbear', '_COMM': b'dropbear'}))
+		# conjunction (all fields must match):
+		self.assertFalse(m(groups, {'_SYSTEMD_UNIT': b'sshd.service', '_COMM': b'sudo'}))
+		self.assertFalse(m(groups, {'_COMM': b'sshd'}))
+		self.assertFalse(m(groups, {'MESSAGE': b'test'}))
+		# multiple values of field (list) - any of them:
+		self.assertTrue(m(groups, {'_SYSTEMD_UNIT': ['user.service', 'sshd.service'], '_COMM': 'sshd'}))
+		self.assertTrue(m(groups, {'SYSLOG_IDENTIFIER': [b'dropbear', b'test']}))
+		self.assertFalse(m(groups, {'SYSLOG_IDENTIFIER': ['sshd', 'test'], '_COMM': []}))
+		# converted values (int, UUID):
+		boot = uuid.UUID('0123456789abcdef0123456789abcdef')
+		self.assertTrue(m(groups, {'PRIORITY': 3, '_BOOT_ID': boot}))
+		self.assertTrue(m(groups, {'PRIORITY': [6, 3], '_BOOT_ID': boot}))
+		self.assertFalse(m(groups, {'PRIORITY': 4, '_BOOT_ID': boot}))
+		self.assertFalse(m(groups, {'PRIORITY': 3, '_BOOT_ID': uuid.UUID(int=1)}))
+		# no matches - all entries:
+		self.assertTrue(m([], {'MESSAGE': b'test'}))
+
 	def testWrongCharInTupleLine(self):
 		## line tuple has different types (ascii after ascii / unicode):
 		for a1 in ('', '', b''):
@@ -337,6 +366,254 @@ class BasicFilter(unittest.TestCase):
 					"".join([uni_decode(v) for v in (a1, a2, a3)])
 
 
+class _MockJournalReader(object):
+	"""Mock-up of python-systemd journal reader (with internals used by projection).
+
+	Entries are dicts of raw (bytes) fields with time stamps in microseconds (ordered
+	by time), after the last entry `_next` blocks until `gate` is set (to simulate
+	slow reading).
+	"""
+	def __init__(self, *args, **kwargs):
+		self.entries = []
+		self.gate = threading.Event()
+		self.gate.set()
+		self.loaded = set()
+		self.data_threshold = 65536
+		self.closed = False
+		self.__idx = 0 # index of next entry
+		self.__cur = None
+	def _next(self, skip=1, block=True):
+		if self.__idx >= len(self.entries):
+			if block:
+				self.gate.wait(_maxWaitTime(10))
+			if self.__idx >= len(self.entries):
+				return False
+		self.__cur = self.entries[self.__idx]
+		self.__idx += 1
+		return True
+	def _get(self, field):
+		self.loaded.add(field)
+		return self.__cur[field]
+	def _get_realtime(self):
+		return self.__cur['__REALTIME_TIMESTAMP']
+	def _get_monotonic(self):
+		return self.__cur['__MONOTONIC_TIMESTAMP']
+	def _get_cursor(self):
+		return 'c%d' % self.__cur['__REALTIME_TIMESTAMP'] if self.__cur else None
+	def _convert_field(self, field, value):
+		if field.endswith('_TIMESTAMP'):
+			return datetime.datetime.fromtimestamp(int(value) / 1000000.0)
+		return value.decode('utf-8') if isinstance(value, bytes) else value
+	def _entry(self):
+		self.loaded.update(self.__cur)
+		return dict((f, self._convert_field(f, v)) for f, v in self.__cur.items())
+	def get_next(self, skip=1):
+		if not self._next(block=False):
+			return {}
+		return self._entry()
+	def get_previous(self, skip=1):
+		if self.__idx < 2:
+			return {}
+		self.__idx -= 1
+		self.__cur = self.entries[self.__idx - 1]
+		return self._entry()
+	def wait(self, timeout=None):
+		if self.__idx < len(self.entries):
+			return 1 # APPEND
+		time.sleep(min(timeout or 0.01, 0.01))
+		return 0 # NOP
+	def seek_tail(self):
+		self.__idx = len(self.entries) + 1
+	def seek_realtime(self, tm):
+		tm = int(tm * 1000000)
+		self.__idx = len(self.entries)
+		for i, e in enumerate(self.entries):
+			if e['__REALTIME_TIMESTAMP'] >= tm:
+				self.__idx = i
+				break
+	def flush_matches(self): pass
+	def add_match(self, *args): pass
+	def add_disjunction(self): pass
+	def close(self):
+		self.closed = True
+
+
+class _MockJournalReaderPublic(object):
+	"""Mock-up of journal reader without internals (public interface only)."""
+	def __init__(self, *args, **kwargs):
+		self.__r = _MockJournalReader()
+		self.entries, self.loaded = self.__r.entries, self.__r.loaded
+	def get_next(self, skip=1):
+		return self.__r.get_next(skip)
+	def close(self):
+		pass
+
+
+def _mockJournalEntry(tm, msg, **fields):
+	e = {'__REALTIME_TIMESTAMP': int(tm * 1000000), '__MONOTONIC_TIMESTAMP': 1000,
+		'_HOSTNAME': b'srv', 'SYSLOG_IDENTIFIER': b'sshd', '_PID': b'123', 'MESSAGE': msg.encode('utf-8')}
+	e.update(fields)
+	return e
+
+
+class JournalMockedReader(LogCaptureTestCase):
+	"""Projection of journal entries and lag of systemd filter (using mocked reader)"""
+
+	def setUp(self):
+		"""Call before every test case."""
+		super(JournalMockedReader, self).setUp()
+		setUpMyTime()
+		JournalFilter._readerProjectionLogged = False
+
+	def tearDown(self):
+		"""Call after every test case."""
+		tearDownMyTime()
+		super(JournalMockedReader, self).tearDown()
+
+	def _getFilterSystemd(self):
+		"""Imports systemd filter (with mocked-up python-systemd module, if not available)."""
+		try: # pragma: systemd no cover
+			from ..server import filtersystemd
+		except ImportError:
+			import types
+			from .. import server
+			systemd, jnl = types.ModuleType('systemd'), types.ModuleType('systemd.journal')
+			systemd.journal = jnl
+			for n, v in (('NOP', 0), ('APPEND', 1), ('INVALIDATE', 2),
+				('LOCAL_ONLY', 1), ('RUNTIME_ONLY', 2), ('SYSTEM_ONLY', 4), ('CURRENT_USER', 8)
+			):
+				setattr(jnl, n, v)
+			jnl.Reader = None
+			sys.modules['systemd'], sys.modules['systemd.journal'] = systemd, jnl
+			def _cleanup():
+				for n in ('systemd', 'systemd.journal', 'fail2ban.server.filtersystemd'):
+					sys.modules.pop(n, None)
+				if hasattr(server, 'filtersystemd'):
+					del server.filtersystemd
+			self.addCleanup(_cleanup)
+			from ..server import filtersystemd
+		prevReader = filtersystemd.journal.Reader
+		self.addCleanup(setattr, filtersystemd.journal, 'Reader', prevReader)
+		return filtersystemd
+
+	def testProjection(self):
+		reader = _MockJournalReader()
+		self.assertTrue(JournalFilter.journalProjection(reader))
+		tm = MyTime.time() - 10
+		reader.entries.append(_mockJournalEntry(tm, "test message", CUSTOM_LARGE_FIELD=b'x' * 1000))
+		raw = JournalFilter.readJournalFields(reader, JournalFilter.ENTRY_FIELDS)
+		entry = JournalFilter.convertJournalEntry(reader, raw)
+		# only fields used by formatJournalEntry are loaded and converted:
+		self.assertEqual(reader.loaded, set(('_HOSTNAME', 'SYSLOG_IDENTIFIER', '_COMM', 'SYSLOG_PID',
+			'_PID', 'MESSAGE', '_SOURCE_REALTIME_TIMESTAMP', '_SOURCE_MONOTONIC_TIMESTAMP')))
+		self.assertEqual(entry['MESSAGE'], "test message")
+		self.assertEqual(entry['_PID'], "123")
+		self.assertNotIn('CUSTOM_LARGE_FIELD', entry)
+		self.assertEqual(entry['__REALTIME_TIMESTAMP'].timestamp(), tm)
+		# end of journal:
+		self.assertEqual(JournalFilter.readJournalFields(reader, JournalFilter.ENTRY_FIELDS), None)
+		self.assertNotLogged("Journal reader has no")
+		# reader without internals - fallback to get_next (logged once):
+		reader = _MockJournalReaderPublic()
+		for i in range(2):
+			self.assertFalse(JournalFilter.journalProjection(reader))
+		self.assertLogged("Journal reader has no _next, _get, _convert_field, _get_realtime, _get_monotonic, "
+			"entries will be loaded entirely using get_next")
+		self.assertEqual(self.getLog().count("Journal reader has no"), 1)
+
+	def testFilterSystemdMockedReader(self):
+		filtersystemd = self._getFilterSystemd()
+		for Reader in (_MockJournalReader, _MockJournalReaderPublic):
+			filtersystemd.journal.Reader = Reader
+			flt = filtersystemd.FilterSystemd(DummyJail(), journalpath='/nonexistent/journal')
+			reader = flt.getJournalReader()
+			tm = MyTime.time() - 120
+			reader.entries.append(_mockJournalEntry(tm, "test message", CUSTOM_LARGE_FIELD=b'x' * 1000))
+			entry = flt.getNextEntry()
+			line, tm2 = flt.formatJournalEntry(entry)
+			self.assertEqual((line[2], tm2), ("srv sshd[123]: test message", tm))
+			# projection loads needed fields only, fallback (public get_next) loads all:
+			self.assertEqual('CUSTOM_LARGE_FIELD' in reader.loaded, Reader is _MockJournalReaderPublic)
+			self.assertFalse(flt.getNextEntry())
+		self.assertEqual(self.getLog().count("Journal reader has no"), 1)
+
+	def testFilterSystemdShared(self):
+		filtersystemd = self._getFilterSystemd()
+		entries = []
+		class Reader(_MockJournalReader):
+			def __init__(self, *args, **kwargs):
+				_MockJournalReader.__init__(self)
+				self.entries = entries
+		filtersystemd.journal.Reader = Reader
+		# 150 entries (more than a batch of dispatcher) in the last 5 minutes:
+		tm0 = MyTime.time() - 300
+		for i in range(150):
+			entries.append(_mockJournalEntry(tm0 + i, "test message %d" % i))
+		# jail 1 is idle at start and processes 5 entries at once, jail 2 - 100:
+		jrnlpath = '/nonexistent/journal-%s' % uuid.uuid4().hex
+		flts, found, maxPend = [], [], []
+		for batchsize in (5, 100):
+			flt = filtersystemd.FilterSystemd(DummyJail(), journalpath=jrnlpath, shared=1, batchsize=batchsize)
+			flt.sleeptime = 0.01
+			fnd = []
+			def _process(line, tm, flt=flt, fnd=fnd):
+				fnd.append((flt.ticks, tm))
+			flt.processLineAndAdd = _process
+			mp = [0]
+			def _put(entries, flt=flt, put=flt.putJournalEntries, mp=mp):
+				ret = put(entries)
+				mp[0] = max(mp[0], len(flt._FilterSystemd__pending))
+				return ret
+			flt.putJournalEntries = _put
+			flts.append(flt); found.append(fnd); maxPend.append(mp)
+		flts[0].idle = True
+		for flt in flts:
+			flt.start()
+		try:
+			expected = [tm0 + i for i in range(150)]
+			# jail 2 gets all entries, nothing is processed by idle jail 1:
+			self.assertTrue(Utils.wait_for(lambda: len(found[1]) >= 150, _maxWaitTime(5)))
+			self.assertEqual([tm for _, tm in found[1]], expected)
+			self.assertEqual(found[0], [])
+			# after idle the entries are routed to jail 1 again (nothing lost, nothing twice):
+			flts[0].idle = False
+			self.assertTrue(Utils.wait_for(lambda: len(found[0]) >= 150, _maxWaitTime(5)))
+			self.assertEqual([tm for _, tm in found[0]], expected)
+			self.assertEqual(len(found[1]), 150)
+			# processed in slices of batchsize, queue is bounded (by batchsize and batch of dispatcher):
+			slices = {}
+			for ticks, _ in found[0]:
+				slices[ticks] = slices.get(ticks, 0) + 1
+			self.assertTrue(max(slices.values()) <= 5, slices)
+			self.assertTrue(maxPend[0][0] < 5 + filtersystemd.JournalDispatcher.BATCH_SIZE, maxPend[0][0])
+		finally:
+			for flt in flts:
+				flt.stop()
+			for flt in flts:
+				flt.join()
+
+	def testFilterSystemdLag(self):
+		filtersystemd = self._getFilterSystemd()
+		filtersystemd.journal.Reader = _MockJournalReader
+		flt = filtersystemd.FilterSystemd(DummyJail(), journalpath='/nonexistent/journal')
+		flt.sleeptime = 0.01
+		reader = flt.getJournalReader()
+		self.assertEqual(dict(flt.status())["Journal lag"], 0)
+		# entry 2 minutes old, reading stalls hereafter (till gate is open):
+		reader.gate.clear()
+		reader.entries.append(_mockJournalEntry(MyTime.time() - 120, "test message"))
+		flt.start()
+		try:
+			self.assertTrue(Utils.wait_for(lambda: dict(flt.status())["Journal lag"] == 120, _maxWaitTime(5)))
+			# end of journal reached - no lag:
+			reader.gate.set()
+			self.assertTrue(Utils.wait_for(lambda: dict(flt.status())["Journal lag"] == 0, _maxWaitTime(5)))
+		finally:
+			reader.gate.set()
+			flt.stop()
+			flt.join()
+
+
 class IgnoreIP(LogCaptureTestCase):
 
 	def setUp(self):
@@ -399,6 +676,74 @@ class IgnoreIP(LogCaptureTestCase):
 		self.filter.addIgnoreIP('192.168.1.0/255.255.0.0')
 		self.assertRaises(ValueError, self.filter.addIgnoreIP, '192.168.1.0/255.255.0.128')
 
+	def testIgnoreIPManyCIDR(self):
+		self.filter.ignoreSelf = False
+		for i in range(1000):
+			self.filter.addIgnoreIP('10.%d.%d.0/%d' % (i % 256, i // 4, 22 + i % 3))
+		self.filter.addIgnoreIP('192.0.2.0/26')
+		self.assertEqual(len(self.filter.getIgnoreIP()), 1001)
+		self.assertTrue(self.filter.inIgnoreIPList('10.0.0.1'))
+		self.assertTrue(self.filter.inIgnoreIPList('10.2.0.255'))
+		self.assertFalse(self.filter.inIgnoreIPList('10.2.1.0'))
+		self.assertTrue(self.filter.inIgnoreIPList('192.0.2.63'))
+		self.assertFalse(self.filter.inIgnoreIPList('192.0.2.64'))
+		self.filter.delIgnoreIP('192.0.2.0/26')
+		self.assertFalse(self.filter.inIgnoreIPList('192.0.2.63'))
+		self.assertTrue(self.filter.inIgnoreIPList('10.0.0.1'))
+		self.filter.delIgnoreIP()
+		self.assertFalse(self.filter.inIgnoreIPList('10.0.0.1'))
+		self.assertEqual(self.filter.getIgnoreIP(), [])
+
+	def testIgnoreVerdictCache(self):
+		self.filter.ignoreSelf = False
+		self.filter.addIgnoreIP('192.0.2.0/25')
+		self.assertNotIn("Ignore cache hits", dict(self.filter.status("cymru")))
+		for i in range(4):
+			self.assertTrue(self.filter.inIgnoreIPList('192.0.2.1'))
+			self.assertFalse(self.filter.inIgnoreIPList('198.51.100.1'))
+		# extended status only (basic status format is unchanged):
+		self.assertNotIn("Ignore cache hits", dict(self.filter.status()))
+		self.assertEqual(dict(self.filter.status("cymru"))["Ignore cache hits"], "6 of 8 (75%)")
+		self.assertLogged("Ignore 192.0.2.1 by ip")
+		# reset by add/del:
+		self.filter.addIgnoreIP('198.51.100.0/24')
+		self.assertTrue(self.filter.inIgnoreIPList('198.51.100.1'))
+		self.filter.delIgnoreIP('192.0.2.0/25')
+		self.assertFalse(self.filter.inIgnoreIPList('192.0.2.1'))
+		self.filter.addIgnoreIP('192.0.2.1')
+		self.assertTrue(self.filter.inIgnoreIPList('192.0.2.1'))
+		self.filter.delIgnoreIP('192.0.2.1')
+		self.assertFalse(self.filter.inIgnoreIPList('192.0.2.1'))
+		# reset by reload of file-set:
+		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='.ips')
+		f = open(fname, 'wb')
+		try:
+			f.write(b"203.0.113.1\n")
+			f.flush()
+			self.filter.addIgnoreIP('file:' + fname)
+			self.assertTrue(self.filter.inIgnoreIPList('203.0.113.1'))
+			self.assertFalse(self.filter.inIgnoreIPList('203.0.113.2'))
+			# file-set is not checked for update until its check is due:
+			fs = self.filter.getIgnoreIP()[-1]
+			loads = [0]
+			def _load(*args, _load=fs.load, **kwargs):
+				loads[0] += 1
+				return _load(*args, **kwargs)
+			fs.load = _load
+			for i in range(3):
+				self.assertFalse(self.filter.inIgnoreIPList('203.0.113.2'))
+			self.assertEqual(loads[0], 0)
+			# +1m, jump to next minute to force next check for update:
+			MyTime.setTime(MyTime.time() + 60)
+			f.write(b"203.0.113.0/24\n")
+			f.flush()
+			self.assertTrue(self.filter.inIgnoreIPList('203.0.113.2'))
+			# check for update and lookup in the set (verdict cache got reset by reload):
+			self.assertEqual(loads[0], 2)
+		finally:
+			tearDownMyTime()
+			_killfile(f, fname)
+
 	def testIgnoreIPDNS(self):
 		# test subnets are pre-cached (as IPAddrSet), so it shall work even without network:
 		for dns in ("test-subnet-a", "test-subnet-b"):
@@ -591,6 +936,49 @@ class IgnoreIP(LogCaptureTestCase):
 		finally:
 			tearDownMyTime()
 
+	def testLazyDate(self):
+		try:
+			self.filter.addFailRegex('fail from <ADDR>$')
+			self.filter.setDatePattern(r'{^LN-BEG}%Y-%m-%d %H:%M:%S\s')
+			self.filter.setFindTime(600)
+			self.filter.setMaxRetry(50); # don't ban here
+			self.filter.inOperation = False
+			MyTime.setTime(1572138000)
+			dd = self.filter.dateDetector
+			calls = []
+			orgGetTime = dd.getTime
+			def _getTime(*args, **kwargs):
+				calls.append(args[0])
+				return orgGetTime(*args, **kwargs)
+			dd.getTime = _getTime
+			# not matched lines - no conversion of the date:
+			for i in range(10):
+				self.assertEqual(self.filter.processLine('2019-10-27 02:00:00 success from 192.0.2.1'), [])
+			self.assertEqual(calls, [])
+			# matched line - converted:
+			found = self.filter.processLine('2019-10-27 02:00:00 fail from 192.0.2.1')
+			self.assertEqual([(f[1], f[2]) for f in found], [('192.0.2.1', 1572138000)])
+			self.assertEqual(calls, ['2019-10-27 02:00:00 '])
+			# too old matched line is still ignored in initialization phase:
+			self.assertEqual(self.filter.processLine('2019-10-27 01:00:00 fail from 192.0.2.2'), [])
+			self.assertLogged("Ignoring all log entries older than 600s")
+			# line without date uses last known date (of not matched, lazy line):
+			self.filter.processLine('2019-10-27 01:59:00 success from 192.0.2.1')
+			found = self.filter.processLine('fail from 192.0.2.3')
+			self.assertEqual([(f[1], f[2]) for f in found], [('192.0.2.3', 1572137940)])
+			# in operation - odd time simulated as now:
+			self.filter.inOperation = True
+			found = self.filter.processLine('2019-10-27 04:00:00 fail from 192.0.2.4')
+			self.assertEqual([(f[1], f[2]) for f in found], [('192.0.2.4', 1572138000)])
+			self.assertLogged("This looks like a timezone problem")
+			# not applicable with multi-line buffer:
+			del calls[:]
+			self.filter.setMaxLines(2)
+			self.filter.processLine('2019-10-27 02:00:00 success from 192.0.2.1')
+			self.assertEqual(calls, ['2019-10-27 02:00:00 '])
+		finally:
+			tearDownMyTime()
+
 	def testAddAttempt(self):
 		self.filter.setMaxRetry(3)
 		for i in range(1, 1+3):
@@ -789,6 +1177,157 @@ class LogFileFilterPoll(unittest.TestCase):
 		self.assertTrue(self.filter.isModified(LogFileFilterPoll.FILENAME))
 		self.assertFalse(self.filter.isModified(LogFileFilterPoll.FILENAME))
 
+	def testFileContainerBlockRead(self):
+		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='.log')
+		lines = ['line 1 €', 'line 2 - TestȊ', '', 'long line 3 %s' % ('x' * 50), 'line 4\r']
+		for enc in ('utf-8', 'utf-16le', 'utf-16'):
+			f = open(fname, 'wb')
+			fc = None
+			try:
+				data = '\n'.join(lines).encode(enc)
+				f.write(data); f.flush()
+				# positions after each line (in bytes):
+				nl = len('\n'.encode('utf-16le' if enc == 'utf-16' else enc))
+				bom = len(''.encode(enc))
+				poss = []; p = bom
+				for l in lines[:-1]:
+					p += len(l.encode('utf-16le' if enc == 'utf-16' else enc)) + nl
+					poss.append(p)
+				fc = FileContainer(fname, enc)
+				# small blocks to cover splitting of lines between blocks:
+				fc.BLOCK_SIZE = 7
+				self.assertTrue(fc.open())
+				for l, p in zip(lines[:-1], poss):
+					self.assertEqual(fc.readline(), l)
+					self.assertEqual(fc.tell(), p)
+				# incomplete last line - wait for line end:
+				self.assertEqual(fc.readline(), None)
+				fc.close()
+				self.assertEqual(fc.getPos(), poss[-1])
+				# complete it and continue from stored position:
+				f.write('\n'.encode('utf-16le' if enc == 'utf-16' else enc)); f.flush()
+				self.assertTrue(fc.open())
+				self.assertEqual(fc.readline(), lines[-1].rstrip('\r'))
+				self.assertEqual(fc.readline(), None)
+				fc.close()
+				self.assertEqual(fc.getPos(), len(data) + nl)
+				# seek in the middle of line goes to the begin of next line:
+				fc.open(0)
+				self.assertEqual(fc.seek(poss[0] + nl), poss[1])
+				self.assertEqual(fc.readline(), lines[2])
+				# incomplete line consumed if not waiting for line end:
+				fc.seek(poss[-1], False)
+				self.assertEqual(fc.readline(False), lines[-1].rstrip('\r'))
+			finally:
+				if fc:
+					fc.close()
+				_killfile(f, fname)
+
+	def testFileContainerKeepOpen(self):
+		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='.log')
+		f = open(fname, 'wb')
+		fc = None
+		try:
+			f.write(b"line 1\nline 2\n"); f.flush()
+			fc = FileContainer(fname, 'utf-8', keepOpen=True)
+			self.assertTrue(fc.open())
+			self.assertEqual([fc.readline(), fc.readline(), fc.readline()], ["line 1", "line 2", None])
+			fc.close()
+			self.assertEqual(fc.getPos(), 14)
+			h = fc._FileContainer__handler
+			self.assertTrue(h is not None)
+			# nothing new:
+			self.assertFalse(fc.open())
+			# new content is read with the same handle:
+			f.write(b"line 3\n"); f.flush()
+			self.assertTrue(fc.open())
+			self.assertTrue(fc._FileContainer__handler is h)
+			self.assertEqual([fc.readline(), fc.readline()], ["line 3", None])
+			fc.close()
+			self.assertEqual(fc.getPos(), 21)
+			# copytruncate - truncated file is detected, handle released and file reopened:
+			f.seek(0); f.truncate()
+			f.write(b"new 1\n"); f.flush()
+			self.assertTrue(fc.open())
+			self.assertFalse(fc._FileContainer__handler is h)
+			h = fc._FileContainer__handler
+			self.assertEqual([fc.readline(), fc.readline()], ["new 1", None])
+			fc.close()
+			self.assertEqual(fc.getPos(), 6)
+			# create - file moved and new one created (new inode):
+			_killfile(f, fname)
+			f = open(fname, 'wb')
+			f.write(b"created 1\n"); f.flush()
+			self.assertTrue(fc.open())
+			self.assertFalse(fc._FileContainer__handler is h)
+			self.assertEqual([fc.readline(), fc.readline()], ["created 1", None])
+			fc.close()
+			self.assertEqual(fc.getPos(), 10)
+			# backend option:
+			flt = FilterPoll(DummyJail(), keepopen="yes")
+			flt.addLogPath(fname, autoSeek=False)
+			self.assertTrue(flt.getLog(fname).keepOpen)
+			flt.getFailures(fname)
+			self.assertTrue(flt.getLog(fname)._FileContainer__handler is not None)
+			log = flt.getLog(fname)
+			flt.delLogPath(fname)
+			self.assertTrue(log._FileContainer__handler is None)
+			# file removed - handle released:
+			_killfile(f, fname); f = None
+			self.assertRaises(OSError, fc.open)
+			self.assertTrue(fc._FileContainer__handler is None)
+		finally:
+			if fc:
+				fc.release()
+			_killfile(f, fname)
+
+	def testFileContainerKeepOpenHash(self):
+		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='.log')
+		f = open(fname, 'wb')
+		fc = None
+		try:
+			f.write(b"line 1\nline 2\n"); f.flush()
+			fc = FileContainer(fname, 'utf-8', keepOpen=True)
+			self.assertTrue(fc.open())
+			self.assertEqual([fc.readline(), fc.readline(), fc.readline()], ["line 1", "line 2", None])
+			fc.close()
+			h = fc._FileContainer__handler
+			# copytruncate and grown above position (same inode, size is larger):
+			f.seek(0); f.truncate()
+			f.write(b"other 1\nother 2\nother 3\n"); f.flush()
+			# hash is checked periodically (same as by reopen), so the handle is released:
+			fc._FileContainer__hashNextTime = 0
+			self.assertTrue(fc.open())
+			self.assertFalse(fc._FileContainer__handler is h)
+			self.assertEqual([fc.readline(), fc.readline(), fc.readline(), fc.readline()],
+				["other 1", "other 2", "other 3", None])
+			fc.close()
+			self.assertEqual(fc.getPos(), 24)
+			fc.release()
+			# rotated to empty file - inode is updated (not rotated again by each check):
+			_killfile(f, fname)
+			f = open(fname, 'wb')
+			self.assertFalse(fc.open())
+			self.assertEqual(fc.getHash(), '')
+			self.assertEqual(fc._FileContainer__ino, os.stat(fname).st_ino)
+			self.assertEqual(fc.getPos(), 0)
+			f.write(b"new 1\n"); f.flush()
+			self.assertTrue(fc.open())
+			self.assertEqual([fc.readline(), fc.readline()], ["new 1", None])
+			fc.close()
+			self.assertNotEqual(fc.getHash(), '')
+			# further content is read with the same handle:
+			h = fc._FileContainer__handler
+			f.write(b"new 2\n"); f.flush()
+			self.assertTrue(fc.open())
+			self.assertTrue(fc._FileContainer__handler is h)
+			self.assertEqual([fc.readline(), fc.readline()], ["new 2", None])
+			fc.close()
+		finally:
+			if fc:
+				fc.release()
+			_killfile(f, fname)
+
 	def testSeekToTimeSmallFile(self):
 		# speedup search using exact date pattern:
 		self.filter.setDatePattern(r'^%ExY-%Exm-%Exd %ExH:%ExM:%ExS')
@@ -915,12 +1454,63 @@ class LogFileFilterPoll(unittest.TestCase):
 				self.assertEqual(fc.getPos(), 47*count)
 				fc.setPos(53); self.filter.seekToTime(fc, time)
 				self.assertEqual(fc.getPos(), 47*count)
-		
+
 		finally:
 			if fc:
 				fc.close()
 			_killfile(f, fname)
 
+	def testSeekToTimeIndex(self):
+		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='.log')
+		time = 1417512352
+		count = 5000
+		f = open(fname, 'wb')
+		# small blocks and index step (to build index of small file):
+		orig = (FileContainer.BLOCK_SIZE, FileContainer.TIME_INDEX_STEP, FileContainer.TIME_INDEX_SIZE)
+		FileContainer.BLOCK_SIZE, FileContainer.TIME_INDEX_STEP, FileContainer.TIME_INDEX_SIZE = 4096, 16384, 8
+		try:
+			t = time - count
+			for i in range(count):
+				f.write(b"%s [sshd] error: PAM: failure\n" % _tmb(t + i))
+			f.flush()
+			flt = FilterPoll(DummyJail())
+			flt.setDatePattern(r'^%ExY-%Exm-%Exd %ExH:%ExM:%ExS')
+			flt.addLogPath(fname, autoSeek=False)
+			flt.active = True
+			flt.getFailures(fname)
+			fc = flt.getLog(fname)
+			# index is built during normal reading (thinned out to max size):
+			index = fc.getTimeIndex()
+			self.assertTrue(4 <= len(index) <= 8)
+			for p, it in index:
+				self.assertEqual(p % 47, 0)
+				self.assertEqual(it, t + p // 47)
+			# seek using index (region is narrowed, so needs lesser seeks):
+			seeks = []
+			seek = fc.seek
+			fc.seek = lambda *args: seeks.append(args) or seek(*args)
+			for st in (time - count // 3, time - 7):
+				seeks[:] = []
+				fc.setPos(0); flt.seekToTime(fc, st)
+				self.assertEqual(fc.getPos(), 47*(st - t))
+				withIndex = len(seeks)
+				seeks[:] = []
+				fc.setTimeIndex(None)
+				fc.setPos(0); flt.seekToTime(fc, st)
+				self.assertEqual(fc.getPos(), 47*(st - t))
+				self.assertLess(withIndex, len(seeks))
+				fc.setTimeIndex(index)
+			# rotation resets index:
+			f.seek(0); f.truncate()
+			f.write(b"%s [sshd] error: PAM: failure\n" % _tmb(time)); f.flush()
+			fc.setPos(47*count)
+			self.assertTrue(fc.open())
+			self.assertEqual(fc.getTimeIndex(), [])
+			fc.close()
+		finally:
+			FileContainer.BLOCK_SIZE, FileContainer.TIME_INDEX_STEP, FileContainer.TIME_INDEX_SIZE = orig
+			_killfile(f, fname)
+
 class LogFileMonitor(LogCaptureTestCase):
 	"""Few more tests for FilterPoll API
 	"""
@@ -1094,6 +1684,114 @@ class LogFileMonitor(LogCaptureTestCase):
 		#_assert_correct_last_attempt(self, self.filter, GetFailures.FAILURES_01)
 		self.assertEqual(self.filter.failManager.getFailTotal(), 3)
 
+	@with_tmpdir
+	def testLogGlobDiscovery(self, tmp):
+		flt = FilterPoll(DummyJail())
+		names = [os.path.join(tmp, n) for n in ('a.log', 'b.log', 'c.log', '.d.log', 'e.txt')]
+		for n in names[:2] + names[3:]:
+			with open(n, 'wb') as f:
+				f.write(b'test\n')
+		flt.addLogGlob(os.path.join(tmp, '*.log'), tail=True)
+		self.assertEqual(flt.getLogGlobs(), [os.path.join(tmp, '*.log')])
+		self.assertSortedEqual(flt.getLogPaths(), names[:2])
+		# initially found files at tail:
+		self.assertEqual(flt.getLog(names[0]).getPos(), 5)
+		# new file is discovered by service of filter (checked with interval):
+		with open(names[2], 'wb') as f:
+			f.write(b'test\n')
+		self.assertEqual(flt.checkLogGlobs(), 0)
+		self.assertEqual(flt.checkLogGlobs(force=True), 1)
+		self.assertLogged("Found new log file %r" % names[2])
+		self.assertSortedEqual(flt.getLogPaths(), names[:3])
+		# new files are read from begin:
+		self.assertEqual(flt.getLog(names[2]).getPos(), 0)
+		# removed file - missing twice (not by rotation):
+		os.remove(names[1])
+		flt.performSvc(force=True)
+		self.assertSortedEqual(flt.getLogPaths(), names[:3])
+		flt.performSvc(force=True)
+		self.assertSortedEqual(flt.getLogPaths(), [names[0], names[2]])
+		# glob removed with its files, explicitly added file remains:
+		flt.addLogPath(names[4], autoSeek=False)
+		flt.delLogGlob(os.path.join(tmp, '*.log'))
+		self.assertEqual(flt.getLogGlobs(), [])
+		self.assertEqual(flt.getLogPaths(), [names[4]])
+		flt.delLogPath(names[4])
+
+	def testPollNotifyStats(self):
+		flt = FilterPoll(DummyJail())
+		flt.addLogPath(self.name, autoSeek=False)
+		prevStats = flt._FilterPoll__prevStats
+		pstats = prevStats[self.name]
+		# called by scheduler thread - stats and errors are only queued (latest one per path), filter not started:
+		flt.notifyStats(self.name, None, OSError(2, 'No such file or directory'))
+		flt.notifyStats(self.name, os.stat(self.name))
+		self.assertEqual(prevStats[self.name], pstats)
+		self.assertEqual(flt._FilterPoll__modified, {})
+		notified, flt._FilterPoll__notified = flt._FilterPoll__notified, {}
+		self.assertEqual(list(notified), [self.name])
+		# checked by worker processing the filter:
+		flt._FilterPoll__checkNotified(notified)
+		self.assertNotEqual(prevStats[self.name], pstats)
+		self.assertEqual(list(flt._FilterPoll__modified), [self.name])
+		flt.notifyStats(self.name, None, OSError(2, 'No such file or directory'))
+		self.assertEqual(flt._FilterPoll__file404Cnt[self.name], 0)
+		flt._FilterPoll__checkNotified(flt._FilterPoll__notified)
+		self.assertEqual(flt._FilterPoll__file404Cnt[self.name], 1)
+		# removed path - queued stats are dropped:
+		flt.notifyStats(self.name, os.stat(self.name))
+		flt.delLogPath(self.name)
+		self.assertEqual(flt._FilterPoll__notified, {})
+		self.assertEqual(flt._FilterPoll__modified, {})
+		flt._FilterPoll__checkNotified(notified)
+		self.assertNotIn(self.name, prevStats)
+
+	def testPollSchedulerShared(self):
+		# speedup search using exact date pattern:
+		self.filter.setDatePattern(r'^(?:%a )?%b %d %H:%M:%S(?:\.%f)?(?: %ExY)?')
+		self.filter.sleeptime = 0.5
+		# second jail monitoring the same file:
+		flt2 = FilterPoll(DummyJail())
+		flt2.sleeptime = 0.5
+		flt2.setDatePattern(r'^(?:%a )?%b %d %H:%M:%S(?:\.%f)?(?: %ExY)?')
+		flt2.addFailRegex(self.filter.getFailRegex()[0])
+		flt2.addLogPath(self.name, autoSeek=False)
+		sched = PollScheduler.getInstance()
+		entries = sched._PollScheduler__entries
+		self.filter.start(); flt2.start()
+		try:
+			# one entry (single stat) for both filters, one scheduler thread:
+			self.assertTrue(Utils.wait_for(lambda: len(entries.get(self.name, ()).subs) == 2 if self.name in entries else False, _maxWaitTime(5)))
+			self.assertEqual(len([t for t in threading.enumerate() if t.name == "f2b/poller"]), 1)
+			# no own thread per filter (processed by small worker pool of scheduler):
+			self.assertTrue(self.filter.isAlive() and flt2.isAlive())
+			threads = threading.enumerate()
+			self.assertNotIn(self.filter, threads)
+			self.assertNotIn(flt2, threads)
+			self.assertLessEqual(len([t for t in threads if t.name.startswith("f2b/poll")]),
+				1 + PollScheduler.MAX_WORKERS)
+			# both filters get modification (idle filter processes it after wake up):
+			flt2.idle = True
+			_copy_lines_between_files(GetFailures.FILENAME_01, self.file, n=15)
+			self.assertTrue(Utils.wait_for(lambda: self.filter.failManager.getFailTotal() == 3, _maxWaitTime(10)))
+			self.assertEqual(flt2.failManager.getFailTotal(), 0)
+			flt2.idle = False
+			self.assertTrue(Utils.wait_for(lambda: flt2.failManager.getFailTotal() == 3, _maxWaitTime(10)))
+			# quiet file - interval backs off up to sleeptime:
+			e = entries[self.name]
+			self.assertTrue(Utils.wait_for(lambda: e.interval == 0.5, _maxWaitTime(10)))
+			# modification - polled often again:
+			self.file.write(b"Aug 14 11:59:59 line\n"); self.file.flush()
+			self.assertTrue(Utils.wait_for(lambda: e.interval < 0.5, _maxWaitTime(10)))
+		finally:
+			flt2.stop(); flt2.join()
+			self.filter.stop(); self.filter.join()
+		self.assertFalse(self.filter.isAlive() or flt2.isAlive())
+		# nothing to poll - scheduler removes entries (and its thread ends, also workers):
+		self.assertNotIn(self.name, entries)
+		self.assertTrue(Utils.wait_for(lambda: sched._PollScheduler__thread is None, _maxWaitTime(5)))
+		self.assertTrue(Utils.wait_for(lambda: not [t for t in threading.enumerate() if t.name.startswith("f2b/poll")], _maxWaitTime(5)))
+
 
 class CommonMonitorTestCase(unittest.TestCase):
 
@@ -1303,6 +2001,36 @@ def get_monitor_failures_testcase(Filter_):
 				self.assertFalse(self.filter._delWatch(0x7fffffff))
 				m.get_path = _org_get_path
 
+		def test_inotify_shared(self):
+			if hasattr(self.filter, 'notifyModified'): # native inotify only
+				m = self.filter._FilterInotify__monitor
+				subs, fileWds = m._InotifyMonitor__subs, m._InotifyMonitor__fileWds
+				# another subscriber of the same file (e. g. other jail) gets notified by the same monitor:
+				class _Subscriber:
+					modified = []
+					def notifyModified(self, path):
+						self.modified.append(path)
+				s = _Subscriber()
+				wds = (dict(fileWds), dict(m._InotifyMonitor__dirWds))
+				self.assertTrue(m.subscribe(self.name, s))
+				try:
+					# single watch of the file (and its directory) for both subscribers:
+					self.assertEqual(len(subs[self.name]), 2)
+					self.assertEqual((fileWds, m._InotifyMonitor__dirWds), wds)
+					_copy_lines_between_files(GetFailures.FILENAME_01, self.file, n=15)
+					self.assert_correct_last_attempt(GetFailures.FAILURES_01)
+					self.assertTrue(Utils.wait_for(lambda: self.name in s.modified, _maxWaitTime(10)))
+				finally:
+					m.unsubscribe(self.name, s)
+				# filter is still subscribed (monitor keeps watching with the same watches):
+				self.assertEqual(subs[self.name], set([self.filter]))
+				self.assertEqual((fileWds, m._InotifyMonitor__dirWds), wds)
+				del s.modified[:]
+				# events keep reaching the remaining filter (but not the unsubscribed one):
+				_copy_lines_between_files(GetFailures.FILENAME_01, self.file, skip=12, n=3)
+				self.assertTrue(self.waitFailTotal(3, 10))
+				self.assertEqual(s.modified, [])
+
 		def test_del_file(self):
 			# test filter reaction by delete watching file:
 			self.file.close()
@@ -1592,8 +2320,46 @@ def get_monitor_failures_journal_testcase(Filter_): # pragma: systemd no cover
 		def test_grow_file_in_idle(self):
 			self._test_grow_file(True)
 
-		def _test_grow_file(self, idle=False):
-			self._initFilter()
+		def test_grow_file_shared(self):
+			self._test_grow_file(shared=1)
+			self.assertEqual(self.filter.getJournalReader(), None)
+
+		def test_grow_file_shared_in_idle(self):
+			self._test_grow_file(True, shared=1)
+
+		def test_shared_routing(self):
+			self._initFilter(shared=1)
+			# second jail with other matches sharing the same reader:
+			jail2 = DummyJail()
+			flt2 = Filter_(jail2, shared=1)
+			flt2.addJournalMatch([
+				"SYSLOG_IDENTIFIER=fail2ban-testcases",
+				"TEST_FIELD=3",
+				"TEST_UUID=%s" % self.test_uuid])
+			flt2.addFailRegex(r"Failed .* from <HOST>")
+			self.filter.setMaxRetry(1)
+			flt2.setMaxRetry(1)
+			self.filter.start()
+			flt2.start()
+			try:
+				self.waitForTicks(1)
+				fields = dict(self.journal_fields)
+				fields.update(TEST_JOURNAL_FIELDS)
+				journal.send(MESSAGE="error: PAM: Authentication failure for test from 198.51.100.1", **fields)
+				fields['TEST_FIELD'] = "3"
+				journal.send(MESSAGE="Failed password for test from 198.51.100.3", **fields)
+				self.assertTrue(Utils.wait_for(lambda: len(self.jail) and len(jail2), _maxWaitTime(10)))
+				self.assertEqual(self.jail.getFailTicket().getID(), "198.51.100.1")
+				self.assertEqual(jail2.getFailTicket().getID(), "198.51.100.3")
+				# each jail got its own entry only:
+				self.assertEqual(len(self.jail), 0)
+				self.assertEqual(len(jail2), 0)
+			finally:
+				flt2.stop()
+				flt2.join()
+
+		def _test_grow_file(self, idle=False, **kwargs):
+			self._initFilter(**kwargs)
 			self.filter.start()
 			if idle:
 				self.filter.sleeptime /= 100.0
@@ -1631,6 +2397,22 @@ def get_monitor_failures_journal_testcase(Filter_): # pragma: systemd no cover
 				self.test_file, self.journal_fields, skip=5, n=4)
 			self.assert_correct_ban("193.168.0.128", 3)
 
+		def test_journal_projection(self):
+			self._initFilter()
+			_copy_lines_to_journal(self.test_file, self.journal_fields, n=2)
+			jnl = self.filter.getJournalReader()
+			# full entry (all fields loaded):
+			full = Utils.wait_for(lambda: jnl.seek_head() or jnl.get_next(), _maxWaitTime(10))
+			self.assertTrue(full)
+			# projected entry (fields used by formatJournalEntry only) produces the same line:
+			jnl.seek_head()
+			entry = self.filter.getNextEntry()
+			self.assertNotIn('TEST_UUID', entry)
+			self.assertEqual(self.filter.formatJournalEntry(entry), self.filter.formatJournalEntry(full))
+			self.assertEqual(self.filter.getEntryCursor(entry), full['__CURSOR'])
+			# not started - no lag:
+			self.assertEqual(dict(self.filter.status())["Journal lag"], 0)
+
 		@with_alt_time
 		def test_grow_file_with_db(self):
 
@@ -1845,6 +2627,130 @@ class GetFailures(LogCaptureTestCase):
 		self.filter.getFailures(filename)
 		_assert_correct_last_attempt(self, self.filter,  failures)
 
+	def testGetFailuresParallelCatchup(self):
+		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='.log')
+		try:
+			with open(fname, 'wb') as f:
+				# obsolete lines (out of find time) and the backlog:
+				for i in range(100):
+					f.write(b'Aug 14 10:%02d:%02d sshd[1]: Invalid user test from 198.51.100.%d\n' % (i // 60, i % 60, i % 7))
+				for i in range(2000):
+					f.write(b'Aug 14 11:%02d:%02d sshd[1]: %s from 198.51.100.%d port %d\n' % (
+						50 + i * 3 // 600, i * 3 // 10 % 60, (b'Invalid user test' if i % 3 else b'Connection closed'), i % 13, i))
+			def _getFailures(flt):
+				flt.active = True
+				flt.setDatePattern(r'^(?:%a )?%b %d %H:%M:%S(?:\.%f)?(?: %ExY)?')
+				flt.addFailRegex(r"Invalid user \S+ from <HOST>")
+				flt.failManager.setMaxRetry(1000)
+				flt.addLogPath(fname)
+				flt.getFailures(fname)
+				fails = {}
+				for fid, t in flt.failManager._FailManager__failList.items():
+					fails[fid] = (t.getRetry(), t.getTime(), t.getMatches())
+				flt.delLogPath(fname)
+				return fails
+			serial = _getFailures(self.filter)
+			self.assertEqual(len(serial), 13)
+			self.pruneLog()
+			flt = FileFilter(DummyJail(), catchup=3)
+			flt.CATCHUP_MIN_SIZE = 4096
+			self.assertEqual(_getFailures(flt), serial)
+			self.assertLogged("Catch-up of %r:" % fname, "processed by 3 workers", "1333 failures found", all=True)
+			self.assertEqual(flt.procLines, 2000)
+		finally:
+			_killfile(None, fname)
+
+	def testGetFailuresParallelCatchupEntries(self):
+		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='.log')
+		try:
+			with open(fname, 'wb') as f:
+				# entries of 6 lines (continuation lines without time stamp, so chunk bounds fall in entry):
+				for i in range(600):
+					f.write(b'Aug 14 11:59:%02d sshd[%d]: Connection from 198.51.100.%d port %d\n' % (
+						1 + i // 12, i, i % 11, i))
+					for j in range(5):
+						f.write(b'  sshd[%d]: continuation %d: Invalid user test from 198.51.100.%d\n' % (
+							i, j, (i + j) % 11))
+			def _getFailures(maxlines=1, **kwargs):
+				flt = FileFilter(DummyJail(), **kwargs)
+				flt.CATCHUP_MIN_SIZE = 4096
+				flt.active = True
+				flt.setMaxLines(maxlines)
+				flt.setDatePattern(r'^(?:%a )?%b %d %H:%M:%S(?:\.%f)?(?: %ExY)?')
+				if maxlines > 1:
+					flt.addFailRegex(r"Connection from <HOST> port \d+\n.*continuation 0: Invalid user")
+				else:
+					flt.addFailRegex(r"Invalid user \S+ from <HOST>")
+				flt.failManager.setMaxRetry(1000)
+				flt.addLogPath(fname)
+				flt.getFailures(fname)
+				fails = {}
+				for fid, t in flt.failManager._FailManager__failList.items():
+					fails[fid] = (t.getRetry(), t.getTime(), t.getMatches())
+				flt.delLogPath(fname)
+				return fails
+			# single-line filter (inner chunk bounds are moved to begin of next entry):
+			serial = _getFailures()
+			self.assertEqual(sum(f[0] for f in serial.values()), 3000)
+			self.pruneLog()
+			self.assertEqual(_getFailures(catchup=3), serial)
+			self.assertLogged("processed by 3 workers", "3000 failures found", all=True)
+			# multi-line filter - catch-up is not applicable (processed serial):
+			serial = _getFailures(maxlines=2)
+			self.assertEqual(sum(f[0] for f in serial.values()), 600)
+			self.pruneLog()
+			self.assertEqual(_getFailures(maxlines=2, catchup=3), serial)
+			self.assertNotLogged("Catch-up of %r:" % fname)
+		finally:
+			_killfile(None, fname)
+
+	def testGetFailuresRotated(self):
+		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='.log')
+		orig = FileContainer.TIME_INDEX_STEP
+		FileContainer.TIME_INDEX_STEP = 16384
+		try:
+			# current log (rotated 5 minutes ago):
+			with open(fname, 'wb') as f:
+				for i in range(300):
+					f.write(b'Aug 14 11:55:%02d sshd[1]: Invalid user test from 198.51.100.3 port %d\n' % (i % 60, i))
+			# predecessor, failures before find time (1) and within find time (2):
+			data = b''.join(
+				b'Aug 14 11:%02d:%02d sshd[1]: Invalid user test from 198.51.100.%d port %d\n' % (
+					i // 60, i % 60, 1 if i < 50*60 else 2, i)
+				for i in range(55*60) if not i % 5)
+			def _getFailures(**kwargs):
+				flt = FileFilter(DummyJail(), **kwargs)
+				flt.active = True
+				flt.setDatePattern(r'^(?:%a )?%b %d %H:%M:%S(?:\.%f)?(?: %ExY)?')
+				flt.addFailRegex(r"Invalid user \S+ from <HOST>")
+				flt.failManager.setMaxRetry(1000)
+				flt.addLogPath(fname)
+				flt.getFailures(fname)
+				fails = dict((str(fid), t.getRetry())
+					for fid, t in flt.failManager._FailManager__failList.items())
+				flt.delLogPath(fname)
+				return fails
+			for ext in ('', '.gz', '.bz2', '.xz', '.zst'):
+				if ext and ext not in _COMPRESSED_OPENERS: # pragma: no cover
+					continue
+				rname = fname + '.1' + ext
+				opener = _COMPRESSED_OPENERS.get(ext, open)
+				with opener(rname, 'wb') as f:
+					f.write(data)
+				try:
+					self.pruneLog('[test-phase %r]' % ext)
+					# option disabled - current log only:
+					self.assertEqual(_getFailures(), {'198.51.100.3': 300})
+					self.assertNotLogged("Read rotated log")
+					# failures within find time from predecessor also:
+					self.assertEqual(_getFailures(rotated=True), {'198.51.100.2': 60, '198.51.100.3': 300})
+					self.assertLogged("Read rotated log %r:" % rname)
+				finally:
+					os.remove(rname)
+		finally:
+			FileContainer.TIME_INDEX_STEP = orig
+			_killfile(None, fname)
+
 	def testCRLFFailures01(self):
 		# We first adjust logfile/failures to end with CR+LF
 		fname = tempfile.mktemp(prefix='tmp_fail2ban', suffix='crlf')
@@ -2540,6 +3446,32 @@ class DNSUtilsNetworkTests(unittest.TestCase):
 					DNSUtils.CACHE_nameToIp.unset(DNSUtils._getSelfIPs_key)
 					DNSUtils.CACHE_nameToIp.unset(DNSUtils._getNetIntrfIPs_key)
 
+	def test_IPAddrSet_NetIndex(self):
+		# a lot of subnets with different prefixes (compare index with walk over all subnets):
+		nets = ['10.%d.%d.0/%d' % (i % 256, (i * 7) % 256, 16 + i % 9) for i in range(1500)]
+		nets += ['2001:db8:%x::/%d' % (i, 40 + i % 25) for i in range(1500)]
+		nets += ['198.51.100.1', '2001:db8::1']
+		ips = IPAddrSet(nets)
+		nets = [IPAddr(n) for n in nets]
+		for ip in ['10.%d.%d.%d' % (i % 256, (i * 13) % 256, i % 250) for i in range(600)] + [
+			'2001:db8:%x::%x' % (i, i) for i in range(0, 3000, 5)] + [
+			'198.51.100.1', '198.51.100.2', '2001:db8::1', '2001:db9::1', '192.0.2.1', '10.0.0.0/8'
+		]:
+			ip = IPAddr(ip)
+			self.assertEqual(ip in ips, any(n.contains(ip) for n in nets), ip)
+		# index is reset by modification:
+		self.assertFalse(IPAddr('192.0.2.1') in ips)
+		ips.add('192.0.2.0/24')
+		self.assertTrue(IPAddr('192.0.2.1') in ips)
+		ips.discard(IPAddr('192.0.2.0/24'))
+		self.assertFalse(IPAddr('192.0.2.1') in ips)
+		ips.set(['192.0.2.0/28', '2001:db8::/126'])
+		self.assertTrue(IPAddr('192.0.2.15') in ips)
+		self.assertFalse(IPAddr('192.0.2.16') in ips)
+		self.assertFalse(IPAddr('10.0.0.1') in ips)
+		self.assertTrue(IPAddr('2001:db8::3') in ips)
+		self.assertFalse(IPAddr('2001:db8::4') in ips)
+
 	def test_FileIPAddrSet(self):
 		fname = os.path.join(TEST_FILES_DIR, "test-ign-ips-file")
 		ips = DNSUtils.getIPsFromFile(fname)
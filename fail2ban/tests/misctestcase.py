@@ -473,3 +473,34 @@ class MyTimeTest(unittest.TestCase):
 		self.assertEqual(sec2str(3600-10),              '59m 50s')
 		self.assertEqual(sec2str(59),                   '59s')
 		self.assertEqual(sec2str(0),                    '0')
+
+	def testCoarseClock(self):
+		import threading, time
+		t0 = MyTime.myTime
+		try:
+			MyTime.setTime(None)
+			# outside of coarse clock block - real time:
+			self.assertTrue(abs(MyTime.coarse() - time.time()) < 1)
+			with MyTime.coarseClock():
+				now = MyTime.coarse()
+				time.sleep(0.01)
+				# cached (read once per chunk):
+				self.assertEqual(MyTime.coarse(), now)
+				# other threads have own clock (not cached there):
+				other = []
+				th = threading.Thread(target=lambda: other.append(MyTime._coarse.__dict__.get('now')))
+				th.start(); th.join()
+				self.assertEqual(other, [None])
+				# refresh:
+				MyTime.refreshCoarse()
+				self.assertTrue(MyTime.coarse() > now)
+				# test override has precedence:
+				MyTime.setTime(1124013600)
+				self.assertEqual(MyTime.coarse(), 1124013600)
+				MyTime.setTime(None)
+			self.assertEqual(MyTime._coarse.now, None)
+			# refresh outside of block does nothing:
+			MyTime.refreshCoarse()
+			self.assertEqual(MyTime._coarse.now, None)
+		finally:
+			MyTime.setTime(t0)
@@ -27,6 +27,7 @@ __license__ = "GPL"
 import unittest
 import time
 import tempfile
+import shutil
 import os
 import re
 import sys
@@ -38,7 +39,7 @@ from ..server.server import Server
 from ..server.ipdns import DNSUtils, IPAddr
 from ..server.jail import Jail
 from ..server.jailthread import JailThread
-from ..server.ticket import BanTicket
+from ..server.ticket import BanTicket, FailTicket
 from ..server.utils import Utils
 from .dummyjail import DummyJail
 from .utils import LogCaptureTestCase, with_alt_time, MyTime
@@ -213,6 +214,10 @@ class Transmitter(TransmitterBase):
 		self.setGetTestNOK("dbmaxmatches", "LIZARD")
 		self.setGetTest("dbpurgeage", "600", 600)
 		self.setGetTestNOK("dbpurgeage", "LIZARD")
+		self.setGetTest("dbcheckpointbytes", "65536", 65536)
+		self.setGetTestNOK("dbcheckpointbytes", "LIZARD")
+		self.setGetTest("dbcheckpointtime", "5m", 300)
+		self.setGetTestNOK("dbcheckpointtime", "LIZARD")
 		# the same file name (again with jails / not changed):
 		self.server.addJail(self.jailName, FAST_BACKEND)
 		self.setGetTest("dbfile", tmpFilename)
@@ -237,6 +242,12 @@ class Transmitter(TransmitterBase):
 		self.assertEqual(self.transm.proceed(
 			["get", "dbpurgeage"]),
 			(0, None))
+		self.assertEqual(self.transm.proceed(
+			["set", "dbcheckpointtime", "1m"]),
+			(0, None))
+		self.assertEqual(self.transm.proceed(
+			["get", "dbcheckpointtime"]),
+			(0, None))
 		# the same (again with jails / not changed):
 		self.server.addJail(self.jailName, FAST_BACKEND)
 		self.assertEqual(self.transm.proceed(
@@ -246,6 +257,62 @@ class Transmitter(TransmitterBase):
 			os.close(tmp)
 			os.unlink(tmpFilename)
 
+	def testDatabaseMemoryStore(self):
+		tmp = tempfile.mkdtemp(prefix="f2b-temp")
+		try:
+			dbFilename = "memory:" + os.path.join(tmp, "fail2ban.bans")
+			self.server.delJail(self.jailName)
+			self.setGetTest("dbfile", dbFilename)
+			self.assertEqual(self.server.getDatabase().__class__.__name__, "MemoryBanStore")
+			self.setGetTest("dbpurgeage", "600", 600)
+			self.server.addJail(self.jailName, FAST_BACKEND)
+			self.assertEqual(self.server.getDatabase().getJailNames(), set([self.jailName]))
+			self.server.delJail(self.jailName)
+			self.server.getDatabase().close()
+			self.assertEqual(self.transm.proceed(
+				["set", "dbfile", "None"]),
+				(0, None))
+			self.assertTrue(os.path.isfile(os.path.join(tmp, "fail2ban.bans")))
+		finally:
+			shutil.rmtree(tmp)
+
+	def testDatabaseBanStats(self):
+		# no database - not available:
+		self.assertEqual(self.transm.proceed(
+			["get", self.jailName, "stats", "bans-per-day"])[0], 1)
+		self.server.delJail(self.jailName)
+		self.setGetTest("dbfile", ":memory:")
+		self.server.addJail(self.jailName, FAST_BACKEND)
+		jail = self.server._Server__jails[self.jailName]
+		db = self.server.getDatabase()
+		stime = int(MyTime.time())
+		for ip, tm in (("192.0.2.1", stime - 10), ("192.0.2.2", stime - 20),
+			("198.51.100.1", stime - 2*24*60*60)
+		):
+			db.addBan(jail, FailTicket(ip, tm))
+		self.assertEqual(self.transm.proceed(
+			["get", self.jailName, "stats", "bans-by-prefix"]),
+			(0, [("192.0.2.0/24", 2, 2), ("198.51.100.0/24", 1, 1)]))
+		self.assertEqual(self.transm.proceed(
+			["get", self.jailName, "stats", "bans-by-prefix", "32", "--since", "1d", "--limit", "1"]),
+			(0, [("192.0.2.1", 1, 1)]))
+		self.assertEqual(self.transm.proceed(
+			["get", "--all", "stats", "bans-by-prefix", "16", "--since", "1d"]),
+			(0, [("192.0.0.0/16", 2, 2)]))
+		self.assertEqual(self.transm.proceed(
+			["get", "--all", "stats", "jail-overlap"]), (0, []))
+		# invalid:
+		for cmd in (
+			["bans-per-day", "24"], ["bans-by-prefix", "--limit"],
+			["bans-by-prefix", "LIZARD"], ["unknown"],
+		):
+			self.assertEqual(self.transm.proceed(
+				["get", self.jailName, "stats"] + cmd)[0], 1)
+		self.server.delJail(self.jailName)
+		self.assertEqual(self.transm.proceed(
+			["set", "dbfile", "None"]),
+			(0, None))
+
 	def testAddJail(self):
 		jail2 = "TestJail2"
 		jail3 = "TestJail3"
@@ -512,6 +579,29 @@ class Transmitter(TransmitterBase):
 				["set", self.jailName, "addlogpath", value, value, value])[0],
 			1)
 
+	def testJailLogGlob(self):
+		pattern = os.path.join(TEST_FILES_DIR, "testcase0[12].log")
+		self.assertEqual(
+			self.transm.proceed(["set", self.jailName, "addlogglob", pattern, "tail"]),
+			(0, [pattern]))
+		self.assertEqual(
+			self.transm.proceed(["get", self.jailName, "logglob"]),
+			(0, [pattern]))
+		self.assertSortedEqual(
+			self.transm.proceed(["get", self.jailName, "logpath"])[1], [
+				os.path.join(TEST_FILES_DIR, "testcase01.log"),
+				os.path.join(TEST_FILES_DIR, "testcase02.log")])
+		self.assertEqual(
+			self.transm.proceed(["set", self.jailName, "dellogglob", pattern]),
+			(0, []))
+		self.assertEqual(
+			self.transm.proceed(["get", self.jailName, "logpath"]),
+			(0, []))
+		self.assertEqual(
+			self.transm.proceed(
+				["set", self.jailName, "addlogglob", pattern, "badger"])[0],
+			1)
+
 	def testJailLogPathInvalidFile(self):
 		# Invalid file
 		value = "this_file_shouldn't_exist"
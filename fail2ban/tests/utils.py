@@ -450,6 +450,7 @@ def gatherTests(regexps=None, opts=None):
 	tests.addTest(loadTests(misctestcase.MyTimeTest))
 	# Database
 	tests.addTest(loadTests(databasetestcase.DatabaseTest))
+	tests.addTest(loadTests(databasetestcase.MemoryBanStoreTest))
 	# Observer
 	tests.addTest(loadTests(observertestcase.ObserverTest))
 	tests.addTest(loadTests(observertestcase.BanTimeIncr))
@@ -458,6 +459,7 @@ def gatherTests(regexps=None, opts=None):
 	# Filter
 	tests.addTest(loadTests(filtertestcase.IgnoreIP))
 	tests.addTest(loadTests(filtertestcase.BasicFilter))
+	tests.addTest(loadTests(filtertestcase.JournalMockedReader))
 	tests.addTest(loadTests(filtertestcase.LogFile))
 	tests.addTest(loadTests(filtertestcase.LogFileMonitor))
 	tests.addTest(loadTests(filtertestcase.LogFileFilterPoll))
@@ -501,6 +503,11 @@ def gatherTests(regexps=None, opts=None):
 	# Additional filters available only if external modules are available
 	# yoh: Since I do not know better way for parametric tests
 	#      with good old unittest
+	try:
+		from ..server.filterinotify import FilterInotify
+		filters.append(FilterInotify)
+	except ImportError as e: # pragma: no cover
+		logSys.warning("I: Skipping inotify backend testing. Got exception '%s'" % e)
 	try:
 		from ..server.filterpyinotify import FilterPyinotify
 		filters.append(FilterPyinotify)